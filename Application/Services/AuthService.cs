@@ -2,6 +2,8 @@
 using GraceWay.AccountingSystem.Infrastructure.Data;
 using Microsoft.EntityFrameworkCore;
 using BCrypt.Net;
+using System.Security.Cryptography;
+using System.Text;
 
 namespace GraceWay.AccountingSystem.Application.Services;
 
@@ -49,11 +51,37 @@ public class AuthService : IAuthService
                 return (false, "هذا الحساب موقوف. يرجى الاتصال بالمسؤول", null);
             }
 
-            // Verify password
-            if (!BCrypt.Net.BCrypt.Verify(password, user.PasswordHash))
+            // Verify password - the stored hash decides the algorithm, the flag alone can be stale
+            if (IsLegacySha256(user.PasswordHash))
+            {
+                // كلمة مرور قديمة بـ SHA-256 (حددها provision_users.py) - تحويلها إلى BCrypt الآن
+                if (!VerifyLegacySha256(password, user.PasswordHash))
+                {
+                    return (false, "اسم المستخدم أو كلمة المرور غير صحيحة", null);
+                }
+
+                var newHash = HashPassword(password);
+                await context.Users
+                    .Where(u => u.UserId == user.UserId)
+                    .ExecuteUpdateAsync(s => s
+                        .SetProperty(u => u.PasswordHash, newHash)
+                        .SetProperty(u => u.PasswordRehashRequired, false)
+                        .SetProperty(u => u.UpdatedAt, DateTime.UtcNow));
+                user.PasswordHash = newHash;
+                user.PasswordRehashRequired = false;
+            }
+            else if (!BCrypt.Net.BCrypt.Verify(password, user.PasswordHash))
             {
                 return (false, "اسم المستخدم أو كلمة المرور غير صحيحة", null);
             }
+            else if (user.PasswordRehashRequired)
+            {
+                // الهاش أصبح BCrypt بالفعل (إعادة تعيين من المسؤول) - إزالة العلامة القديمة
+                await context.Users
+                    .Where(u => u.UserId == user.UserId)
+                    .ExecuteUpdateAsync(s => s.SetProperty(u => u.PasswordRehashRequired, false));
+                user.PasswordRehashRequired = false;
+            }
 
             _currentUser = user;
 
@@ -107,4 +135,19 @@ public class AuthService : IAuthService
     {
         return BCrypt.Net.BCrypt.HashPassword(password);
     }
+
+    // SHA-256 القديم: 64 حرف hex، بينما BCrypt يبدأ بـ $2
+    private static bool IsLegacySha256(string storedHash)
+    {
+        var hash = storedHash.Trim();
+        return hash.Length == 64 && hash.All(Uri.IsHexDigit);
+    }
+
+    private static bool VerifyLegacySha256(string password, string storedHash)
+    {
+        var hash = Convert.ToHexString(SHA256.HashData(Encoding.UTF8.GetBytes(password))).ToLowerInvariant();
+        return CryptographicOperations.FixedTimeEquals(
+            Encoding.ASCII.GetBytes(hash),
+            Encoding.ASCII.GetBytes(storedHash.Trim().ToLowerInvariant()));
+    }
 }
@@ -1,6 +1,7 @@
 using GraceWay.AccountingSystem.Domain.Entities;
 using GraceWay.AccountingSystem.Infrastructure.Data;
 using Microsoft.EntityFrameworkCore;
+using System.Text.Json;
 
 namespace GraceWay.AccountingSystem.Application.Services;
 
@@ -88,6 +89,10 @@ public class PermissionService : IPermissionService
     
     public async Task<Dictionary<string, List<PermissionType>>> GetUserPermissionsByModuleAsync(int userId)
     {
+        var snapshot = await GetSnapshotByModuleAsync(userId);
+        if (snapshot != null)
+            return snapshot;
+        
         var permissions = await GetUserPermissionsAsync(userId);
         
         // ✅ Create fresh DbContext here too
@@ -105,4 +110,34 @@ public class PermissionService : IPermissionService
                 g => g.Select(p => p.PermissionType).ToList()
             );
     }
+    
+    // ✅ صف واحد من role_permission_snapshots (role_permission_snapshot.py --setup)
+    // null = الجدول غير موجود أو لا توجد لقطة للدور، فنرجع للاستعلام الكامل
+    private async Task<Dictionary<string, List<PermissionType>>?> GetSnapshotByModuleAsync(int userId)
+    {
+        try
+        {
+            using var context = _contextFactory.CreateDbContext();
+            
+            var modulesJson = await context.Database
+                .SqlQuery<string>($@"SELECT s.modules::text AS ""Value""
+                    FROM users u
+                    JOIN role_permission_snapshots s ON s.roleid = u.roleid
+                    WHERE u.userid = {userId}")
+                .FirstOrDefaultAsync();
+            
+            if (modulesJson == null)
+                return null;
+            
+            var modules = JsonSerializer.Deserialize<Dictionary<string, List<int>>>(modulesJson);
+            return modules?.ToDictionary(
+                m => m.Key,
+                m => m.Value.Select(t => (PermissionType)t).ToList());
+        }
+        catch (Exception ex)
+        {
+            Console.WriteLine($"⚠️ Permission snapshot unavailable, using full query: {ex.Message}");
+            return null;
+        }
+    }
 }
@@ -14,6 +14,11 @@ public class User
     public string? Phone { get; set; }
     public int? RoleId { get; set; }
     public bool IsActive { get; set; } = true;
+
+    /// <summary>
+    /// كلمة المرور مخزنة بـ SHA-256 قديم - يتم تحويلها إلى BCrypt عند أول تسجيل دخول
+    /// </summary>
+    public bool PasswordRehashRequired { get; set; }
     
     [Column("CreatedAt", TypeName = "timestamp with time zone")]
     public DateTime CreatedAt { get; set; } = DateTime.UtcNow;
@@ -1857,6 +1857,7 @@ public class AppDbContext : DbContext
             entity.Property(e => e.Phone).HasColumnName("phone");
             entity.Property(e => e.RoleId).HasColumnName("roleid");
             entity.Property(e => e.IsActive).HasColumnName("isactive");
+            entity.Property(e => e.PasswordRehashRequired).HasColumnName("passwordrehashrequired");
             entity.Property(e => e.CreatedAt).HasColumnType("timestamp with time zone").HasColumnName("CreatedAt");
             entity.Property(e => e.UpdatedAt).HasColumnType("timestamp with time zone").HasColumnName("updatedat");
 
@@ -0,0 +1,45 @@
+using GraceWay.AccountingSystem.Infrastructure.Data;
+using Microsoft.EntityFrameworkCore.Infrastructure;
+using Microsoft.EntityFrameworkCore.Migrations;
+
+#nullable disable
+
+namespace GraceWay.AccountingSystem.Infrastructure.Migrations
+{
+    /// <summary>
+    /// علامة لكلمات المرور المخزنة بـ SHA-256 القديم - تتحول إلى BCrypt عند أول تسجيل دخول
+    /// </summary>
+    [DbContext(typeof(AppDbContext))]
+    [Migration("20260310000000_AddPasswordRehashRequiredToUsers")]
+    public partial class AddPasswordRehashRequiredToUsers : Migration
+    {
+        protected override void Up(MigrationBuilder migrationBuilder)
+        {
+            // إضافة العمود بحماية "IF NOT EXISTS" - قد يكون أضيف من migrate.py على قواعد قديمة
+            migrationBuilder.Sql(@"
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'users' AND column_name = 'passwordrehashrequired'
+                    ) THEN
+                        ALTER TABLE users ADD COLUMN passwordrehashrequired boolean NOT NULL DEFAULT false;
+                    END IF;
+                END $$;
+            ");
+        }
+
+        protected override void Down(MigrationBuilder migrationBuilder)
+        {
+            migrationBuilder.Sql(@"
+                DO $$
+                BEGIN
+                    IF EXISTS (SELECT 1 FROM information_schema.columns
+                               WHERE table_name = 'users' AND column_name = 'passwordrehashrequired') THEN
+                        ALTER TABLE users DROP COLUMN passwordrehashrequired;
+                    END IF;
+                END $$;
+            ");
+        }
+    }
+}
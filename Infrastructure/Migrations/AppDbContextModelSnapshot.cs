@@ -3620,6 +3620,10 @@ namespace GraceWay.AccountingSystem.Infrastructure.Migrations
                         .HasColumnType("boolean")
                         .HasColumnName("isactive");
 
+                    b.Property<bool>("PasswordRehashRequired")
+                        .HasColumnType("boolean")
+                        .HasColumnName("passwordrehashrequired");
+
                     b.Property<string>("PasswordHash")
                         .IsRequired()
                         .HasColumnType("text")
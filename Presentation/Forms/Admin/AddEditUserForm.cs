@@ -261,7 +261,10 @@ public partial class AddEditUserForm : Form
                 user.UpdatedAt = DateTime.UtcNow;
 
                 if (changePass)
+                {
                     user.PasswordHash = BCrypt.Net.BCrypt.HashPassword(txtPassword.Text);
+                    user.PasswordRehashRequired = false;
+                }
             }
 
             db.SaveChanges();
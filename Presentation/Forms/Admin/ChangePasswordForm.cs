@@ -194,6 +194,7 @@ public partial class ChangePasswordForm : Form
             if (user != null)
             {
                 user.PasswordHash = BCrypt.Net.BCrypt.HashPassword(txtNewPassword.Text);
+                user.PasswordRehashRequired = false;
                 user.UpdatedAt    = DateTime.UtcNow;
                 db.SaveChanges();
                 this.DialogResult = DialogResult.OK;
@@ -465,7 +465,7 @@ public class ForgotPasswordForm : Form
             using var conn = new NpgsqlConnection(connStr);
             conn.Open();
             using var cmd = conn.CreateCommand();
-            cmd.CommandText = @"UPDATE users SET passwordhash = @hash, updatedat = @now WHERE userid = @id";
+            cmd.CommandText = @"UPDATE users SET passwordhash = @hash, passwordrehashrequired = false, updatedat = @now WHERE userid = @id";
             cmd.Parameters.AddWithValue("hash", newHash);
             cmd.Parameters.AddWithValue("now", DateTime.UtcNow);
             cmd.Parameters.AddWithValue("id", userId);
@@ -0,0 +1,377 @@
+"""
+Cashbox Load Generator
+محاكاة مئات المستخدمين على الخزنة من عملية واحدة (asyncio + asyncpg)
+
+Replays a mix of CashBoxService-style operations against dedicated test
+cashboxes (cashboxcode LOAD-001, LOAD-002, ...) at a fixed Poisson arrival
+rate:
+
+    deposit / withdraw   SERIALIZABLE: SELECT ... FOR UPDATE on the balance,
+                         INSERT INTO cashtransactions, UPDATE the balance
+                         (AddIncomeAsync / AddExpenseAsync)
+    xmin_update          read balance + xmin, UPDATE ... WHERE xmin = $n
+                         (EF's optimistic concurrency token)
+    report               the month's totals per transaction type
+                         (GetMonthlyReportAsync)
+
+Arrivals are scheduled open-loop, so a slow database builds a queue instead
+of quietly lowering the offered load. Latency is measured from the scheduled
+arrival, pool wait included. --users caps the sessions in flight; arrivals
+beyond it are counted as dropped. Serialization failures (40001), deadlocks
+(40P01) and xmin conflicts are retried with jittered backoff.
+
+Only LOAD-* cashboxes are written to. Run it against a test database.
+
+Usage:
+    python cashbox_load.py --setup 5                          # create LOAD-001..LOAD-005
+    python cashbox_load.py --rate 200 --duration 60 --users 300
+    python cashbox_load.py --mix deposit=50,withdraw=20,xmin_update=10,report=20 --hot 0.8
+    python cashbox_load.py --output load.json
+    python cashbox_load.py --cleanup                          # drop LOAD-* cashboxes and their rows
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from db_pool import POOL_MAX_SIZE, close_async_pool, get_async_pool
+
+# TransactionType (Domain/Entities/CashTransaction.cs)
+INCOME = 1
+EXPENSE = 2
+# PaymentMethod.Cash
+CASH = 1
+
+LOAD_PREFIX = 'LOAD-'
+OPENING_BALANCE = Decimal('1000000')
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {'40001', '40P01'}
+
+DEFAULT_MIX = 'deposit=45,withdraw=20,xmin_update=15,report=20'
+
+SETUP_SQL = """
+    INSERT INTO cashboxes (cashboxcode, cashboxname, cashboxtype, openingbalance, currentbalance,
+                           currency, isactive, isdeleted, createdat, createdby)
+    SELECT code, 'Load test ' || code, 'CashBox', $2, $2, 'EGP', true, false, NOW(), $3
+    FROM (SELECT $4 || lpad(g::text, 3, '0') AS code FROM generate_series(1, $1) g) c
+    WHERE NOT EXISTS (SELECT 1 FROM cashboxes b WHERE b.cashboxcode = c.code)
+"""
+
+CLEANUP_SQL = """
+    WITH boxes AS (SELECT cashboxid FROM cashboxes WHERE cashboxcode LIKE $1 || '%'),
+         deleted AS (DELETE FROM cashtransactions WHERE cashboxid IN (SELECT cashboxid FROM boxes) RETURNING 1)
+    SELECT (SELECT COUNT(*) FROM deleted), (SELECT COUNT(*) FROM boxes)
+"""
+
+LOCK_BALANCE_SQL = "SELECT currentbalance FROM cashboxes WHERE cashboxid = $1 AND NOT isdeleted FOR UPDATE"
+
+INSERT_TRANSACTION_SQL = """
+    INSERT INTO cashtransactions (vouchernumber, transactiontype, cashboxid, amount, "TransactionCurrency",
+                                  transactiondate, month, year, category, description, paymentmethod,
+                                  balancebefore, balanceafter, createdby, createdat, isdeleted)
+    VALUES ($1, $2, $3, $4, 'EGP', NOW(), EXTRACT(MONTH FROM NOW())::int, EXTRACT(YEAR FROM NOW())::int,
+            'LoadTest', 'cashbox_load.py', $5, $6, $7, $8, NOW(), false)
+"""
+
+UPDATE_BALANCE_SQL = "UPDATE cashboxes SET currentbalance = $2, updatedat = NOW() WHERE cashboxid = $1"
+
+READ_XMIN_SQL = "SELECT currentbalance, xmin FROM cashboxes WHERE cashboxid = $1 AND NOT isdeleted"
+
+XMIN_UPDATE_SQL = "UPDATE cashboxes SET updatedat = NOW() WHERE cashboxid = $1 AND xmin = $2"
+
+REPORT_SQL = """
+    SELECT transactiontype, COUNT(*), COALESCE(SUM(amount), 0)
+    FROM cashtransactions
+    WHERE cashboxid = $1 AND month = $2 AND year = $3 AND NOT isdeleted
+    GROUP BY transactiontype
+"""
+
+
+class OptimisticConflict(Exception):
+    """The row's xmin changed between read and update"""
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def parse_mix(text):
+    """"deposit=45,report=20" -> [(operation, weight)]"""
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation '{name}' (known: {', '.join(OPERATIONS)})")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+# ============================================
+# Operations
+# ============================================
+
+class Context:
+    """What one operation needs: the target cashbox and who is acting"""
+
+    def __init__(self, cashbox_id, user_id, run_id, sequence):
+        self.cashbox_id = cashbox_id
+        self.user_id = user_id
+        self.voucher = f"{LOAD_PREFIX}{run_id}-{sequence}"
+
+
+async def _post(conn, ctx, kind):
+    amount = Decimal(random.randint(100, 50000)) / 100
+    async with conn.transaction(isolation='serializable'):
+        before = await conn.fetchval(LOCK_BALANCE_SQL, ctx.cashbox_id)
+        after = before + amount if kind == INCOME else before - amount
+        await conn.execute(INSERT_TRANSACTION_SQL, ctx.voucher, kind, ctx.cashbox_id, amount,
+                           CASH, before, after, ctx.user_id)
+        await conn.execute(UPDATE_BALANCE_SQL, ctx.cashbox_id, after)
+
+
+async def op_deposit(conn, ctx):
+    await _post(conn, ctx, INCOME)
+
+
+async def op_withdraw(conn, ctx):
+    await _post(conn, ctx, EXPENSE)
+
+
+async def op_xmin_update(conn, ctx):
+    row = await conn.fetchrow(READ_XMIN_SQL, ctx.cashbox_id)
+    # the form's edit time between loading the entity and saving it
+    await asyncio.sleep(random.uniform(0, 0.005))
+    status = await conn.execute(XMIN_UPDATE_SQL, ctx.cashbox_id, row['xmin'])
+    if status.endswith(' 0'):
+        raise OptimisticConflict()
+
+
+async def op_report(conn, ctx):
+    now = datetime.now()
+    await conn.fetch(REPORT_SQL, ctx.cashbox_id, now.month, now.year)
+
+
+OPERATIONS = {
+    'deposit': op_deposit,
+    'withdraw': op_withdraw,
+    'xmin_update': op_xmin_update,
+    'report': op_report,
+}
+
+
+# ============================================
+# Statistics
+# ============================================
+
+class OperationStats:
+    def __init__(self):
+        self.latencies = []
+        self.ok = 0
+        self.gave_up = 0
+        self.errors = 0
+        self.attempts = 0
+        self.serialization_failures = 0
+        self.deadlocks = 0
+        self.xmin_conflicts = 0
+        self.retried = 0
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        done = self.ok + self.gave_up + self.errors
+        return {
+            'ok': self.ok,
+            'gave_up': self.gave_up,
+            'errors': self.errors,
+            'throughput': round(self.ok / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            'attempts': self.attempts,
+            'serialization_failure_rate': round(self.serialization_failures / self.attempts, 4) if self.attempts else 0.0,
+            'deadlocks': self.deadlocks,
+            'xmin_conflict_rate': round(self.xmin_conflicts / self.attempts, 4) if self.attempts else 0.0,
+            'retry_rate': round(self.retried / done, 4) if done else 0.0,
+        }
+
+
+async def run_with_retry(pool, func, ctx, stats, retries, base_delay=0.005):
+    """Run one operation, retrying serialization failures, deadlocks and xmin conflicts"""
+    for attempt in range(retries + 1):
+        stats.attempts += 1
+        if attempt == 1:
+            stats.retried += 1
+        try:
+            async with pool.acquire() as conn:
+                await func(conn, ctx)
+            return True
+        except OptimisticConflict:
+            stats.xmin_conflicts += 1
+        except Exception as e:
+            sqlstate = getattr(e, 'sqlstate', None)
+            if sqlstate not in RETRYABLE_SQLSTATES:
+                raise
+            if sqlstate == '40001':
+                stats.serialization_failures += 1
+            else:
+                stats.deadlocks += 1
+        await asyncio.sleep(random.uniform(0, base_delay * 2 ** attempt))
+    return False
+
+
+# ============================================
+# Load loop
+# ============================================
+
+async def load_cashboxes(pool):
+    rows = await pool.fetch("SELECT cashboxid FROM cashboxes WHERE cashboxcode LIKE $1 || '%' "
+                            "AND NOT isdeleted ORDER BY cashboxcode", LOAD_PREFIX)
+    return [row['cashboxid'] for row in rows]
+
+
+async def first_user(pool):
+    return await pool.fetchval("SELECT MIN(userid) FROM users WHERE isactive")
+
+
+async def run_load(pool, cashboxes, user_id, mix, rate, duration, max_inflight, retries, hot=0.0):
+    """Offer `rate` operations/second for `duration` seconds; returns (stats per op, dropped, elapsed)"""
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    stats = {name: OperationStats() for name in names}
+    run_id = datetime.now().strftime('%H%M%S')
+    inflight = set()
+    dropped = 0
+
+    async def session(name, ctx, scheduled):
+        op_stats = stats[name]
+        try:
+            ok = await run_with_retry(pool, OPERATIONS[name], ctx, op_stats, retries)
+        except Exception:
+            op_stats.errors += 1
+            return
+        if ok:
+            op_stats.ok += 1
+            op_stats.latencies.append(time.perf_counter() - scheduled)
+        else:
+            op_stats.gave_up += 1
+
+    started = time.perf_counter()
+    next_at = started
+    sequence = 0
+    while True:
+        next_at += random.expovariate(rate)
+        if next_at - started >= duration:
+            break
+        # behind schedule still yields once so running sessions make progress
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        if len(inflight) >= max_inflight:
+            dropped += 1
+            continue
+        sequence += 1
+        name = random.choices(names, weights)[0]
+        box = cashboxes[0] if hot and random.random() < hot else random.choice(cashboxes)
+        task = asyncio.create_task(session(name, Context(box, user_id, run_id, sequence), next_at))
+        inflight.add(task)
+        task.add_done_callback(inflight.discard)
+    if inflight:
+        await asyncio.gather(*inflight)
+    return stats, dropped, time.perf_counter() - started
+
+
+def print_stats(stats, dropped, elapsed, rate):
+    print(f"\n{'operation':<12} {'ok':>7} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'ser.fail':>9} {'xmin':>7} {'retried':>8} {'gave up':>8}")
+    print("-" * 104)
+    total_ok = 0
+    for name, op_stats in stats.items():
+        s = op_stats.summary(elapsed)
+        total_ok += s['ok']
+        print(f"{name:<12} {s['ok']:>7} {s['throughput']:>8.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+              f"{s['p99_ms']:>8.1f} {s['max_ms']:>8.1f} {s['serialization_failure_rate']:>9.2%} "
+              f"{s['xmin_conflict_rate']:>7.2%} {s['retry_rate']:>8.2%} {s['gave_up'] + s['errors']:>8}")
+    print("-" * 104)
+    print(f"offered {rate:.0f}/s for {elapsed:.1f}s - {total_ok / elapsed:.1f} committed ops/s, "
+          f"{dropped} arrival(s) dropped at the --users cap")
+
+
+async def main_async(args):
+    pool = await get_async_pool(max_size=args.connections)
+    try:
+        if args.setup:
+            user_id = await first_user(pool)
+            status = await pool.execute(SETUP_SQL, args.setup, OPENING_BALANCE, user_id, LOAD_PREFIX)
+            print(f"✅ {status.split()[-1]} load-test cashbox(es) created")
+            return 0
+        if args.cleanup:
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    rows, boxes = await conn.fetchrow(CLEANUP_SQL, LOAD_PREFIX)
+                    await conn.execute("DELETE FROM cashboxes WHERE cashboxcode LIKE $1 || '%'", LOAD_PREFIX)
+            print(f"✅ Removed {boxes} load-test cashbox(es) and {rows} transaction(s)")
+            return 0
+
+        cashboxes = await load_cashboxes(pool)
+        if not cashboxes:
+            print("❌ No LOAD-* cashboxes - run with --setup N first")
+            return 1
+        user_id = await first_user(pool)
+        mix = parse_mix(args.mix)
+        print(f"🚀 {args.rate}/s for {args.duration}s over {len(cashboxes)} cashbox(es), "
+              f"≤{args.users} sessions on {args.connections} connection(s)")
+        stats, dropped, elapsed = await run_load(pool, cashboxes, user_id, mix, args.rate, args.duration,
+                                                 args.users, args.retries, args.hot)
+    finally:
+        await close_async_pool()
+
+    print_stats(stats, dropped, elapsed, args.rate)
+    if args.output:
+        report = {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'rate': args.rate, 'duration': args.duration, 'users': args.users,
+            'connections': args.connections, 'cashboxes': len(cashboxes), 'hot': args.hot,
+            'elapsed': round(elapsed, 3), 'dropped': dropped,
+            'operations': {name: s.summary(elapsed) for name, s in stats.items()},
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asyncio load generator for the cashbox workflow")
+    parser.add_argument('--rate', type=float, default=100, help="arrivals per second (default: 100)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds of load (default: 30)")
+    parser.add_argument('--users', type=int, default=200, help="max sessions in flight (default: 200)")
+    parser.add_argument('--connections', type=int, default=POOL_MAX_SIZE,
+                        help=f"pool size (default: {POOL_MAX_SIZE})")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--hot', type=float, default=0.0, help="share of operations on the first cashbox")
+    parser.add_argument('--retries', type=int, default=5, help="retries per operation (default: 5)")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--setup', type=int, metavar='N', help="create N LOAD-* cashboxes and exit")
+    parser.add_argument('--cleanup', action='store_true', help="delete LOAD-* cashboxes and their rows")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
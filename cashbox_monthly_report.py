@@ -0,0 +1,219 @@
+"""
+Cashbox Monthly Report
+التقرير الشهري لجميع الخزن - استعلام تجميعي واحد لأي فترة
+
+Replaces the per-cashbox loop in monthly_report_display.py. Totals per
+cashbox x month x currency x type x payment method, plus per cashbox x
+currency x type summaries for the whole period, come from one GROUPING
+SETS query, so the number of queries does not grow with the number of
+cashboxes. Expenses paid by InstaPay include the commission, the same way
+CashBoxService deducts Amount + InstaPayCommission from the balance.
+
+Usage:
+    python cashbox_monthly_report.py                       # current month
+    python cashbox_monthly_report.py --from 2026-01 --to 2026-03
+    python cashbox_monthly_report.py --month 2026-02 --details
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from db_pool import close_pool, connection
+
+# TransactionType
+INCOME = 1
+EXPENSE = 2
+# PaymentMethod
+INSTAPAY = 5
+
+PAYMENT_METHODS = {
+    1: 'نقدي',
+    2: 'شيك',
+    3: 'تحويل بنكي',
+    4: 'بطاقة ائتمان',
+    5: 'إنستا باي',
+    6: 'آخر',
+}
+
+MONTH_NAMES = ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+               'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر']
+
+CURRENCY_EXPR = """COALESCE(NULLIF(ct."TransactionCurrency", ''), 'EGP')"""
+
+REPORT_QUERY = f"""
+    SELECT cb.cashboxid, cb.cashboxname, cb.currentbalance,
+           ct.year, ct.month,
+           {CURRENCY_EXPR} AS currency,
+           ct.transactiontype, ct.paymentmethod,
+           COUNT(ct.transactionid) AS count,
+           COALESCE(SUM(ct.amount), 0) AS amount,
+           COALESCE(SUM(CASE WHEN ct.transactiontype = {EXPENSE} AND ct.paymentmethod = {INSTAPAY}
+                             THEN COALESCE(ct.instapaycommission, 0) ELSE 0 END), 0) AS commission,
+           GROUPING(ct.paymentmethod) AS is_summary
+    FROM cashboxes cb
+    LEFT JOIN cashtransactions ct
+           ON ct.cashboxid = cb.cashboxid
+          AND ct.isdeleted = false
+          AND ct.year * 12 + ct.month BETWEEN %s AND %s
+    WHERE cb.isdeleted = false
+    GROUP BY GROUPING SETS (
+        (cb.cashboxid, cb.cashboxname, cb.currentbalance, ct.year, ct.month,
+         {CURRENCY_EXPR}, ct.transactiontype, ct.paymentmethod),
+        (cb.cashboxid, cb.cashboxname, cb.currentbalance, {CURRENCY_EXPR}, ct.transactiontype)
+    )
+    ORDER BY cb.cashboxid, is_summary, ct.year, ct.month, currency, ct.transactiontype, ct.paymentmethod
+"""
+
+DETAILS_QUERY = f"""
+    SELECT ct.cashboxid, ct.transactiondate, ct.vouchernumber, ct.transactiontype,
+           ct.amount, {CURRENCY_EXPR}, ct.paymentmethod, ct.instapaycommission, ct.description
+    FROM cashtransactions ct
+    JOIN cashboxes cb ON cb.cashboxid = ct.cashboxid AND cb.isdeleted = false
+    WHERE ct.isdeleted = false
+      AND ct.year * 12 + ct.month BETWEEN %s AND %s
+    ORDER BY ct.cashboxid, ct.transactiondate, ct.transactionid
+"""
+
+
+def month_index(year, month):
+    return year * 12 + month
+
+
+def parse_month(value):
+    """'2026-02' -> (2026, 2)"""
+    year, month = value.split('-')
+    year, month = int(year), int(month)
+    if not 1 <= month <= 12:
+        raise argparse.ArgumentTypeError(f"invalid month: {value}")
+    return year, month
+
+
+def build_report(conn, start, end, details=False):
+    """
+    Run the aggregate query (and optionally the details query) and return
+    {cashbox_id: {...}} ready for rendering.
+    """
+    cur = conn.cursor()
+    period = (month_index(*start), month_index(*end))
+    cur.execute(REPORT_QUERY, period)
+
+    cashboxes = {}
+    for (box_id, name, balance, year, month, currency, tx_type, method,
+         count, amount, commission, is_summary) in cur.fetchall():
+        box = cashboxes.setdefault(box_id, {
+            'name': name,
+            'current_balance': balance,
+            'months': defaultdict(list),
+            'totals': {},
+            'transactions': [],
+        })
+        if not count:
+            continue
+        if is_summary:
+            box['totals'][(currency, tx_type)] = {
+                'count': count, 'amount': amount, 'commission': commission,
+                'total': amount + commission,
+            }
+        else:
+            box['months'][(year, month)].append({
+                'currency': currency, 'type': tx_type, 'method': method,
+                'count': count, 'amount': amount, 'commission': commission,
+                'total': amount + commission,
+            })
+
+    if details:
+        cur.execute(DETAILS_QUERY, period)
+        for box_id, *row in cur.fetchall():
+            if box_id in cashboxes:
+                cashboxes[box_id]['transactions'].append(row)
+    cur.close()
+    return cashboxes
+
+
+def period_title(start, end):
+    if start == end:
+        return f"{MONTH_NAMES[start[1] - 1]} {start[0]}"
+    return f"{MONTH_NAMES[start[1] - 1]} {start[0]} - {MONTH_NAMES[end[1] - 1]} {end[0]}"
+
+
+def render(cashboxes, start, end):
+    title = period_title(start, end)
+    print("=" * 80)
+    print(f"  تقرير شامل - التقرير الشهري لجميع الخزن ({title})")
+    print("=" * 80)
+
+    for box_id, box in cashboxes.items():
+        print(f"\n{'=' * 80}")
+        print(f"  خزنة: {box['name']} (ID: {box_id})")
+        print(f"  الرصيد الحالي: {box['current_balance']} جنيه")
+        print(f"{'=' * 80}")
+
+        if not box['totals']:
+            print(f"\n  ⚠️  لا توجد معاملات لفترة {title}")
+            continue
+
+        for (year, month), rows in sorted(box['months'].items()):
+            print(f"\n  📅 {MONTH_NAMES[month - 1]} {year}")
+            print(f"  {'-' * 76}")
+            for row in rows:
+                kind = "✅ إيراد" if row['type'] == INCOME else "❌ مصروف"
+                method = PAYMENT_METHODS.get(row['method'], str(row['method']))
+                commission_text = f" (عمولة: {row['commission']})" if row['commission'] else ""
+                print(f"    {kind:<10} {method:<14} {row['count']:>5} معاملة | "
+                      f"{row['total']:>12.2f} {row['currency']}{commission_text}")
+
+        print(f"\n  📊 الملخص - {title}")
+        print(f"  {'=' * 76}")
+        currencies = sorted({currency for currency, _ in box['totals']}, key=lambda c: (c != 'EGP', c))
+        for currency in currencies:
+            income = box['totals'].get((currency, INCOME), {}).get('total', Decimal(0))
+            expense = box['totals'].get((currency, EXPENSE), {}).get('total', Decimal(0))
+            print(f"\n  💰 إجمالي الإيرادات ({currency}):   {income:>15.2f}")
+            print(f"  💸 إجمالي المصروفات ({currency}):  {expense:>15.2f}")
+            print(f"  📈 صافي الربح/الخسارة ({currency}): {(income - expense):>15.2f}")
+
+        if box['transactions']:
+            print(f"\n  📋 المعاملات ({len(box['transactions'])})")
+            print(f"  {'-' * 76}")
+            for tx_date, voucher, tx_type, amount, currency, method, commission, desc in box['transactions']:
+                kind = "إيراد" if tx_type == INCOME else "مصروف"
+                commission_text = f" (عمولة: {commission})" if commission and method == INSTAPAY else ""
+                print(f"    [{tx_date.strftime('%Y-%m-%d')}] {voucher or 'N/A'} | {kind} | "
+                      f"{amount:>10.2f} {currency}{commission_text} | {desc}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monthly cashbox report (single aggregate query)")
+    parser.add_argument('--month', type=parse_month, help="single month, e.g. 2026-02")
+    parser.add_argument('--from', dest='start', type=parse_month, help="first month, e.g. 2026-01")
+    parser.add_argument('--to', dest='end', type=parse_month, help="last month, e.g. 2026-03")
+    parser.add_argument('--details', action='store_true', help="also list every transaction")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    now = datetime.now()
+    start = args.month or args.start or (now.year, now.month)
+    end = args.month or args.end or start
+    if month_index(*end) < month_index(*start):
+        parser.error("--to is before --from")
+
+    try:
+        with connection() as conn:
+            cashboxes = build_report(conn, start, end, args.details)
+    finally:
+        close_pool()
+
+    render(cashboxes, start, end)
+    print(f"\n{'=' * 80}")
+    print(f"  تم إنشاء التقرير بنجاح - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"{'=' * 80}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
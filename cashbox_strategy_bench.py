@@ -0,0 +1,301 @@
+"""
+Cashbox Concurrency Strategy Benchmark
+مقارنة طرق تحديث رصيد الخزنة تحت التزاحم: قفل، xmin، SERIALIZABLE، دفتر إضافة فقط
+
+Posts random income/expense amounts with N closed-loop workers per run and
+measures each way of keeping cashboxes.currentbalance right:
+
+    pessimistic    READ COMMITTED, SELECT ... FOR UPDATE, insert, update
+    xmin           read balance + xmin without a lock, insert, then
+                   UPDATE ... WHERE xmin = $n; zero rows -> retry
+                   (the EF concurrency token in AppDbContext)
+    serializable   SERIALIZABLE without FOR UPDATE, retry on 40001
+                   (TransactionScopeHelper.ExecuteInSerializableTransactionAsync)
+    ledger         append-only bench_cashbox_ledger rows, no balance row;
+                   the balance is derived with SUM() when read
+
+Every strategy runs at each worker count in two scenarios: "one" (every
+worker on LOAD-001 - the busiest cashbox) and "many" (worker i on LOAD-n,
+n = i mod the number of LOAD-* cashboxes). Results are commits/sec, abort
+rate (serialization failures, deadlocks and xmin conflicts per attempt),
+gave-up count, p50/p95/p99/max commit latency, and the cost of one balance
+read afterwards - which is where the ledger pays. For the balance-row
+strategies the run also checks every LOAD-* cashbox balance against its
+transactions, so a lost update shows up as "consistent: no".
+
+Uses the LOAD-* cashboxes from cashbox_load.py --setup; create at least as
+many as the largest worker count for a contention-free "many" scenario.
+
+Usage:
+    python cashbox_strategy_bench.py
+    python cashbox_strategy_bench.py --strategies pessimistic,xmin --workers 1,8,32 --duration 10
+    python cashbox_strategy_bench.py --scenario one --output strategies.json
+    python cashbox_strategy_bench.py --cleanup                # drop bench_cashbox_ledger
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from cashbox_load import (
+    INCOME, EXPENSE, CASH, INSERT_TRANSACTION_SQL, LOAD_PREFIX, LOCK_BALANCE_SQL, READ_XMIN_SQL,
+    UPDATE_BALANCE_SQL, Context, OperationStats, OptimisticConflict, first_user, load_cashboxes,
+    run_with_retry,
+)
+from db_pool import close_async_pool, get_async_pool
+
+DEFAULT_STRATEGIES = 'pessimistic,xmin,serializable,ledger'
+DEFAULT_WORKERS = '1,4,16,64'
+
+LEDGER_SETUP_SQL = """
+    CREATE TABLE IF NOT EXISTS bench_cashbox_ledger (
+        entryid BIGSERIAL PRIMARY KEY,
+        cashboxid INTEGER NOT NULL,
+        amount NUMERIC(18, 2) NOT NULL,
+        createdby INTEGER,
+        createdat TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS ix_bench_cashbox_ledger_cashboxid ON bench_cashbox_ledger (cashboxid) INCLUDE (amount);
+"""
+
+LEDGER_INSERT_SQL = "INSERT INTO bench_cashbox_ledger (cashboxid, amount, createdby) VALUES ($1, $2, $3)"
+
+READ_BALANCE_SQL = "SELECT currentbalance FROM cashboxes WHERE cashboxid = $1 AND NOT isdeleted"
+
+XMIN_BALANCE_SQL = "UPDATE cashboxes SET currentbalance = $2, updatedat = NOW() WHERE cashboxid = $1 AND xmin = $3"
+
+LEDGER_BALANCE_SQL = """
+    SELECT b.openingbalance + COALESCE((SELECT SUM(l.amount) FROM bench_cashbox_ledger l
+                                        WHERE l.cashboxid = b.cashboxid), 0)
+    FROM cashboxes b WHERE b.cashboxid = $1
+"""
+
+# LOAD-* cashboxes whose balance does not match their transactions (lost updates)
+INCONSISTENT_SQL = """
+    SELECT COUNT(*) FROM cashboxes b
+    WHERE b.cashboxcode LIKE $1 || '%'
+      AND b.currentbalance <> b.openingbalance + COALESCE((
+          SELECT SUM(CASE WHEN t.transactiontype = 1 THEN t.amount ELSE -t.amount END)
+          FROM cashtransactions t
+          WHERE t.cashboxid = b.cashboxid AND NOT t.isdeleted), 0)
+"""
+
+
+def _amount():
+    kind = INCOME if random.random() < 0.6 else EXPENSE
+    return kind, Decimal(random.randint(100, 50000)) / 100
+
+
+async def _insert_transaction(conn, ctx, kind, amount, before, after):
+    await conn.execute(INSERT_TRANSACTION_SQL, ctx.voucher, kind, ctx.cashbox_id, amount,
+                       CASH, before, after, ctx.user_id)
+
+
+def _apply(before, kind, amount):
+    return before + amount if kind == INCOME else before - amount
+
+
+# ============================================
+# Strategies
+# ============================================
+
+async def post_pessimistic(conn, ctx):
+    kind, amount = _amount()
+    async with conn.transaction():
+        before = await conn.fetchval(LOCK_BALANCE_SQL, ctx.cashbox_id)
+        after = _apply(before, kind, amount)
+        await _insert_transaction(conn, ctx, kind, amount, before, after)
+        await conn.execute(UPDATE_BALANCE_SQL, ctx.cashbox_id, after)
+
+
+async def post_xmin(conn, ctx):
+    kind, amount = _amount()
+    row = await conn.fetchrow(READ_XMIN_SQL, ctx.cashbox_id)
+    before = row['currentbalance']
+    after = _apply(before, kind, amount)
+    async with conn.transaction():
+        await _insert_transaction(conn, ctx, kind, amount, before, after)
+        status = await conn.execute(XMIN_BALANCE_SQL, ctx.cashbox_id, after, row['xmin'])
+        if status.endswith(' 0'):
+            # rolls the insert back with the transaction
+            raise OptimisticConflict()
+
+
+async def post_serializable(conn, ctx):
+    kind, amount = _amount()
+    async with conn.transaction(isolation='serializable'):
+        before = await conn.fetchval(READ_BALANCE_SQL, ctx.cashbox_id)
+        after = _apply(before, kind, amount)
+        await _insert_transaction(conn, ctx, kind, amount, before, after)
+        await conn.execute(UPDATE_BALANCE_SQL, ctx.cashbox_id, after)
+
+
+async def post_ledger(conn, ctx):
+    kind, amount = _amount()
+    await conn.execute(LEDGER_INSERT_SQL, ctx.cashbox_id, amount if kind == INCOME else -amount, ctx.user_id)
+
+
+# name -> (post function, balance query)
+STRATEGIES = {
+    'pessimistic': (post_pessimistic, READ_BALANCE_SQL),
+    'xmin': (post_xmin, READ_BALANCE_SQL),
+    'serializable': (post_serializable, READ_BALANCE_SQL),
+    'ledger': (post_ledger, LEDGER_BALANCE_SQL),
+}
+
+
+# ============================================
+# Runs
+# ============================================
+
+async def run_level(pool, strategy, boxes, workers, duration, retries, user_id):
+    """Closed loop: `workers` tasks post back to back for `duration` seconds"""
+    post, _ = STRATEGIES[strategy]
+    stats = OperationStats()
+    run_id = f"{strategy[:3]}{workers}-{datetime.now().strftime('%H%M%S')}"
+    deadline = time.perf_counter() + duration
+    failures = []
+
+    async def worker(i):
+        sequence = 0
+        while time.perf_counter() < deadline:
+            sequence += 1
+            ctx = Context(boxes[i % len(boxes)], user_id, f"{run_id}-{i}", sequence)
+            started = time.perf_counter()
+            try:
+                ok = await run_with_retry(pool, post, ctx, stats, retries)
+            except Exception as e:
+                stats.errors += 1
+                failures.append(e)
+                continue
+            if ok:
+                stats.ok += 1
+                stats.latencies.append(time.perf_counter() - started)
+            else:
+                stats.gave_up += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(workers)))
+    if not stats.ok:
+        # a broken post makes every level meaningless - stop instead of reporting zeros
+        cause = f": {type(failures[0]).__name__}: {failures[0]}" if failures else ''
+        raise RuntimeError(f"{strategy} with {workers} worker(s) committed nothing "
+                           f"({stats.errors} errors, {stats.gave_up} gave up){cause}")
+    return stats, time.perf_counter() - started
+
+
+async def balance_read_ms(pool, strategy, cashbox_id, samples=20):
+    """Median time of the strategy's balance read for one cashbox"""
+    _, query = STRATEGIES[strategy]
+    timings = []
+    async with pool.acquire() as conn:
+        for _ in range(samples):
+            started = time.perf_counter()
+            await conn.fetchval(query, cashbox_id)
+            timings.append(time.perf_counter() - started)
+    return round(sorted(timings)[len(timings) // 2] * 1000, 3)
+
+
+async def run_benchmark(pool, strategies, levels, scenarios, duration, retries):
+    boxes = await load_cashboxes(pool)
+    if not boxes:
+        raise RuntimeError("no LOAD-* cashboxes - run cashbox_load.py --setup N first")
+    user_id = await first_user(pool)
+    if 'ledger' in strategies:
+        await pool.execute(LEDGER_SETUP_SQL)
+
+    results = []
+    for strategy in strategies:
+        for scenario in scenarios:
+            targets = boxes[:1] if scenario == 'one' else boxes
+            for workers in levels:
+                stats, elapsed = await run_level(pool, strategy, targets, workers, duration, retries, user_id)
+                s = stats.summary(elapsed)
+                aborts = stats.serialization_failures + stats.deadlocks + stats.xmin_conflicts
+                row = {
+                    'strategy': strategy, 'scenario': scenario, 'workers': workers,
+                    'commits_per_sec': s['throughput'],
+                    'abort_rate': round(aborts / stats.attempts, 4) if stats.attempts else 0.0,
+                    'gave_up': s['gave_up'], 'errors': s['errors'],
+                    'p50_ms': s['p50_ms'], 'p95_ms': s['p95_ms'], 'p99_ms': s['p99_ms'], 'max_ms': s['max_ms'],
+                    'balance_read_ms': await balance_read_ms(pool, strategy, targets[0]),
+                    'consistent': None,
+                }
+                if strategy != 'ledger':
+                    row['consistent'] = await pool.fetchval(INCONSISTENT_SQL, LOAD_PREFIX) == 0
+                results.append(row)
+                print_row(row)
+    return results
+
+
+def print_header():
+    print(f"{'strategy':<13} {'scenario':<8} {'workers':>7} {'commits/s':>10} {'aborts':>7} {'gave up':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'read ms':>8}  consistent")
+    print("-" * 118)
+
+
+def print_row(row):
+    consistent = '-' if row['consistent'] is None else ('yes' if row['consistent'] else 'NO ❌')
+    print(f"{row['strategy']:<13} {row['scenario']:<8} {row['workers']:>7} {row['commits_per_sec']:>10.1f} "
+          f"{row['abort_rate']:>7.1%} {row['gave_up']:>8} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+          f"{row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} {row['balance_read_ms']:>8.2f}  {consistent}")
+
+
+async def main_async(args, strategies, levels, scenarios):
+    pool = await get_async_pool(min_size=1, max_size=max(levels))
+    try:
+        if args.cleanup:
+            await pool.execute("DROP TABLE IF EXISTS bench_cashbox_ledger")
+            print("✅ bench_cashbox_ledger dropped")
+            return 0
+        print_header()
+        try:
+            results = await run_benchmark(pool, strategies, levels, scenarios, args.duration, args.retries)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 1
+    finally:
+        await close_async_pool()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'generated_at': datetime.now().isoformat(timespec='seconds'),
+                       'duration': args.duration, 'retries': args.retries, 'results': results}, f, indent=2)
+    return 0 if all(r['consistent'] is not False for r in results) else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cashbox balance concurrency strategies")
+    parser.add_argument('--strategies', default=DEFAULT_STRATEGIES, help=f"default: {DEFAULT_STRATEGIES}")
+    parser.add_argument('--workers', default=DEFAULT_WORKERS, help=f"contention levels (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--scenario', choices=('one', 'many', 'both'), default='both',
+                        help="one hot cashbox, spread over all LOAD-* cashboxes, or both")
+    parser.add_argument('--duration', type=float, default=15, help="seconds per run (default: 15)")
+    parser.add_argument('--retries', type=int, default=10, help="retries per post (default: 10)")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    parser.add_argument('--cleanup', action='store_true', help="drop the ledger benchmark table")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    strategies = [s.strip() for s in args.strategies.split(',') if s.strip()]
+    unknown = [s for s in strategies if s not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(unknown)} (known: {', '.join(STRATEGIES)})")
+    try:
+        levels = sorted({int(w) for w in args.workers.split(',')})
+    except ValueError:
+        parser.error("--workers takes comma-separated integers")
+    scenarios = ['one', 'many'] if args.scenario == 'both' else [args.scenario]
+
+    return asyncio.run(main_async(args, strategies, levels, scenarios))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
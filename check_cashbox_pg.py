@@ -1,13 +1,8 @@
-import psycopg2
+# إعدادات الاتصال موحدة في db_pool.py
+from db_pool import get_connection
 
 # الاتصال بقاعدة البيانات PostgreSQL
-conn = psycopg2.connect(
-    host="localhost",
-    port=5432,
-    database="graceway_accounting",
-    user="postgres",
-    password="123456"
-)
+conn = get_connection()
 
 cursor = conn.cursor()
 
@@ -0,0 +1,803 @@
+"""
+C# Codemod Runner
+محرك واحد لتعديل ملفات الواجهة بدل سكربتات الـ regex المتفرقة
+
+Rewrite rules are plain functions registered with the @rule decorator. They
+live in plugin modules named codemod_*.py next to this file (auto-discovered)
+or in any module passed with --plugin. A rule receives a SourceFile - the
+file's text plus its tokens with comments and whitespace already dropped and
+every (), [] and {} paired - and returns (start, end, replacement) edits
+against the original text.
+
+Each file is read once, every selected rule runs on the same tokens, and the
+edits are applied together. Overlapping edits from two rules, or a result
+whose brackets no longer balance (what fix_broken_files.py had to repair
+after the regex scripts), leave the file untouched and are reported instead.
+A rule can also report a single site it recognises but will not rewrite
+(SourceFile.note); the rest of the file is still edited.
+Files are processed in a process pool, one worker per core by default.
+
+Results are cached in codemod_cache.json per (file, content hash, rule-set
+version). The rule-set version hashes this file and the plugin modules of
+the selected rules, so editing a rule invalidates its entries. Unchanged
+files are skipped without being opened, which makes a --dry-run
+verification of the whole tree close to free after the first run.
+
+--dry-run prints a unified diff. A real run is one journaled batch: every
+new file is written to a temp file and renamed over its target, retrying
+with backoff while the target is locked (Visual Studio), and the batch is
+rolled back if a file still cannot be replaced. The original bytes stay in
+codemod_journal/, so --revert undoes the whole batch in one command.
+
+Usage:
+    python codemod.py --list                       # registered rules
+    python codemod.py rtl modeless_forms           # rewrite Presentation/**/*.cs
+    python codemod.py rtl --dry-run                # unified diff, exit 1 if anything would change
+    python codemod.py modeless_forms --include "Forms/*ListForm.cs"
+    python codemod.py --plugin my_rules my_rule --workers 4
+    python codemod.py rtl --no-cache               # ignore codemod_cache.json
+    python codemod.py --history                    # journaled batches
+    python codemod.py --revert                     # undo the last batch
+    python codemod.py --revert 20260318-101500-123456 --force
+"""
+
+import argparse
+import codecs
+import difflib
+import fnmatch
+import glob
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROOT = os.path.join(SCRIPT_DIR, 'Presentation')
+DEFAULT_CACHE_PATH = os.path.join(SCRIPT_DIR, 'codemod_cache.json')
+CACHE_VERSION = 1
+DEFAULT_JOURNAL_DIR = os.path.join(SCRIPT_DIR, 'codemod_journal')
+TEMP_SUFFIX = '.codemod.tmp'
+
+# os.replace retries on a locked target: 0.2s, 0.4s, ... about 6s in total
+RETRY_ATTEMPTS = 6
+RETRY_DELAY = 0.2
+
+# name -> (function, description)
+RULES = {}
+
+
+class CodemodError(Exception):
+    pass
+
+
+def rule(name, description=''):
+    """Register a rewrite rule under the given name"""
+    def decorator(func):
+        RULES[name] = (func, description or (func.__doc__ or '').strip())
+        return func
+    return decorator
+
+
+def load_plugins(extra_modules=()):
+    """Import every codemod_*.py module next to this file plus any extra module names"""
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    names = sorted(
+        os.path.splitext(os.path.basename(path))[0]
+        for path in glob.glob(os.path.join(SCRIPT_DIR, 'codemod_*.py'))
+    )
+    for name in list(names) + list(extra_modules):
+        importlib.import_module(name)
+
+
+# ============================================
+# Tokenizer
+# ============================================
+
+TRIVIA = ('space', 'comment', 'directive')
+OPENERS = {'(': ')', '[': ']', '{': '}'}
+CLOSERS = {v: k for k, v in OPENERS.items()}
+
+_SPACE = re.compile(r'[\s\ufeff]+')
+# $"..", @"..", $@"..", @$"..", $$"""..""" and plain "..", """.."""
+_STRING_START = re.compile(r'(\$+@?|@\$*)?("""+|")')
+_CHAR = re.compile(r"'(?:\\.|[^'\\\n])*'")
+_IDENT = re.compile(r'@?[^\W\d]\w*')
+_NUMBER = re.compile(r'(?:0[xXbB][0-9a-fA-F_]+|\d[\d_]*(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?)[a-zA-Z]*')
+# '>' stays single so List<List<int>> closes correctly
+_OPERATOR = re.compile(r'\?\?=|<<=|=>|==|!=|<=|>=|&&|\|\||\?\?|\?\.|\+\+|--|[-+*/%&|^]=|<<|->|::|\.\.|[^\s\w]')
+
+
+class Token:
+    __slots__ = ('kind', 'text', 'start', 'end')
+
+    def __init__(self, kind, text, start, end):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.text!r}, {self.start})"
+
+
+def _line_start(text, i):
+    return not text[text.rfind('\n', 0, i) + 1:i].strip()
+
+
+def _scan_hole(text, i):
+    """End of an interpolation hole that starts after its '{' at i"""
+    depth = 1
+    while i < len(text):
+        c = text[i]
+        if c in '$@"' and _STRING_START.match(text, i):
+            i = _scan_string(text, i)
+            continue
+        if c == "'":
+            m = _CHAR.match(text, i)
+            if m:
+                i = m.end()
+                continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    raise CodemodError("unterminated interpolation")
+
+
+def _scan_string(text, i):
+    """End offset of the string literal starting at i"""
+    m = _STRING_START.match(text, i)
+    prefix, quotes = m.group(1) or '', m.group(2)
+    j = m.end()
+    if len(quotes) >= 3:
+        end = text.find(quotes, j)
+        if end < 0:
+            raise CodemodError(f"unterminated raw string at offset {i}")
+        return end + len(quotes)
+    verbatim = '@' in prefix
+    interpolated = '$' in prefix
+    while j < len(text):
+        c = text[j]
+        if c == '"':
+            if verbatim and text.startswith('""', j):
+                j += 2
+                continue
+            return j + 1
+        if c == '\\' and not verbatim:
+            j += 2
+            continue
+        if c == '\n' and not verbatim:
+            break
+        if interpolated and c == '{':
+            if text.startswith('{{', j):
+                j += 2
+                continue
+            j = _scan_hole(text, j + 1)
+            continue
+        j += 1
+    raise CodemodError(f"unterminated string at offset {i}")
+
+
+def tokenize(text):
+    """Split C# source into tokens, trivia included; strings and comments are single tokens"""
+    tokens = []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c.isspace() or c == '\ufeff':
+            kind, j = 'space', _SPACE.match(text, i).end()
+        elif text.startswith('//', i):
+            j = text.find('\n', i)
+            kind, j = 'comment', (n if j < 0 else j)
+        elif text.startswith('/*', i):
+            j = text.find('*/', i + 2)
+            if j < 0:
+                raise CodemodError(f"unterminated comment at offset {i}")
+            kind, j = 'comment', j + 2
+        elif c == '#' and _line_start(text, i):
+            j = text.find('\n', i)
+            kind, j = 'directive', (n if j < 0 else j)
+        elif c in '$@"' and _STRING_START.match(text, i):
+            kind, j = 'string', _scan_string(text, i)
+        elif c == "'" and _CHAR.match(text, i):
+            kind, j = 'char', _CHAR.match(text, i).end()
+        elif _IDENT.match(text, i):
+            kind, j = 'ident', _IDENT.match(text, i).end()
+        elif c.isdigit():
+            kind, j = 'number', _NUMBER.match(text, i).end()
+        else:
+            kind, j = 'op', _OPERATOR.match(text, i).end()
+        tokens.append(Token(kind, text[i:j], i, j))
+        i = j
+    return tokens
+
+
+def pair_brackets(tokens):
+    """{index: partner index} for every (), [] and {} - raises CodemodError when unbalanced"""
+    pairs = {}
+    stack = []
+    for i, token in enumerate(tokens):
+        if token.kind != 'op':
+            continue
+        if token.text in OPENERS:
+            stack.append(i)
+        elif token.text in CLOSERS:
+            if not stack or tokens[stack[-1]].text != CLOSERS[token.text]:
+                raise CodemodError(f"unbalanced '{token.text}' at offset {token.start}")
+            opener = stack.pop()
+            pairs[opener] = i
+            pairs[i] = opener
+    if stack:
+        raise CodemodError(f"unclosed '{tokens[stack[-1]].text}' at offset {tokens[stack[-1]].start}")
+    return pairs
+
+
+class SourceFile:
+    """One .cs file as rules see it: text, significant tokens and bracket pairs"""
+
+    def __init__(self, path, text):
+        self.path = path
+        self.text = text
+        self.all_tokens = tokenize(text)
+        self.tokens = [t for t in self.all_tokens if t.kind not in TRIVIA]
+        self.pairs = pair_brackets(self.tokens)
+        self.newline = '\r\n' if '\r\n' in text else '\n'
+        # sites a rule found but left alone, reported next to the edit counts
+        self.notes = []
+
+    def at(self, i, *texts):
+        """True when the tokens from i spell texts (None matches any token)"""
+        if i < 0 or i + len(texts) > len(self.tokens):
+            return False
+        return all(t is None or self.tokens[i + k].text == t for k, t in enumerate(texts))
+
+    def find(self, *texts, start=0, end=None):
+        """Indexes where the token sequence texts begins"""
+        end = len(self.tokens) if end is None else end
+        first = texts[0]
+        for i in range(start, end):
+            if (first is None or self.tokens[i].text == first) and self.at(i, *texts):
+                yield i
+
+    def partner(self, i):
+        return self.pairs[i]
+
+    def note(self, i, message):
+        """Report a site at token i that a rule did not rewrite"""
+        line = self.text.count('\n', 0, self.tokens[i].start) + 1
+        self.notes.append(f"line {line}: {message}")
+
+    def block_end(self, i):
+        """Index of the bracket closing the block (or argument list) that contains token i"""
+        while i < len(self.tokens):
+            token = self.tokens[i]
+            if token.text in OPENERS:
+                i = self.pairs[i] + 1
+                continue
+            if token.text in CLOSERS:
+                return i
+            i += 1
+        return len(self.tokens)
+
+    def source(self, i, j):
+        """Original text from token i through token j, comments included"""
+        return self.text[self.tokens[i].start:self.tokens[j].end]
+
+    def span(self, i, j):
+        return self.tokens[i].start, self.tokens[j].end
+
+    def indent(self, i):
+        """Leading whitespace of the line token i is on"""
+        line_start = self.text.rfind('\n', 0, self.tokens[i].start) + 1
+        m = _SPACE.match(self.text, line_start)
+        return self.text[line_start:m.end()].replace('\r', '').replace('\n', '') if m else ''
+
+    def reindent(self, i, j, extra):
+        """Text of tokens i..j with extra indentation after each line break outside strings"""
+        start, end = self.span(i, j)
+        parts = []
+        for token in self.all_tokens:
+            if token.end <= start or token.start >= end:
+                continue
+            parts.append(token.text.replace('\n', '\n' + extra) if token.kind == 'space' else token.text)
+        return ''.join(parts)
+
+
+# ============================================
+# Engine
+# ============================================
+
+def apply_edits(text, edits):
+    """Apply (start, end, replacement, rule) edits; CodemodError when two of them overlap"""
+    out = []
+    position = 0
+    previous = None
+    for start, end, replacement, name in sorted(edits, key=lambda e: (e[0], e[1])):
+        if start < position:
+            raise CodemodError(f"{previous} and {name} both edit offset {start}")
+        out.append(text[position:start])
+        out.append(replacement)
+        position = end
+        previous = name
+    out.append(text[position:])
+    return ''.join(out)
+
+
+def rewrite(path, text, rule_names):
+    """Run the rules over one file; returns (new text, {rule: edit count}, notes)"""
+    src = SourceFile(path, text)
+    edits = []
+    counts = {}
+    for name in rule_names:
+        found = RULES[name][0](src) or []
+        if found:
+            counts[name] = len(found)
+            edits.extend((start, end, replacement, name) for start, end, replacement in found)
+    if not edits:
+        return text, counts, src.notes
+    result = apply_edits(text, edits)
+    try:
+        SourceFile(path, result)
+    except CodemodError as e:
+        raise CodemodError(f"result would not parse ({e}) - rules: {', '.join(counts)}")
+    return result, counts, src.notes
+
+
+def read_source(full_path):
+    """(bytes, text, has BOM) - read as bytes so line endings survive"""
+    with open(full_path, 'rb') as f:
+        data = f.read()
+    bom = data.startswith(codecs.BOM_UTF8)
+    text = data[len(codecs.BOM_UTF8):].decode('utf-8') if bom else data.decode('utf-8')
+    return data, text, bom
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def encode_source(text, bom):
+    return (codecs.BOM_UTF8 if bom else b'') + text.encode('utf-8')
+
+
+def process_file(job):
+    """Worker: read one file, run the rules, return old and new bytes when anything changed"""
+    root, rel_path, rule_names, known_sha = job
+    full_path = os.path.join(root, rel_path)
+    result = {'path': rel_path, 'counts': {}, 'notes': [], 'changed': False, 'original': None, 'content': None,
+              'error': None, 'sha256': None, 'stat': None, 'cached': False}
+    try:
+        stat = os.stat(full_path)
+        data, text, bom = read_source(full_path)
+        result['sha256'] = sha256(data)
+        result['stat'] = (stat.st_mtime_ns, stat.st_size)
+        if result['sha256'] == known_sha:
+            # touched but not edited - the cached result still holds
+            result['cached'] = True
+            return result
+        new_text, result['counts'], result['notes'] = rewrite(rel_path, text, rule_names)
+        if new_text != text:
+            result['changed'] = True
+            result['original'] = data
+            result['content'] = encode_source(new_text, bom)
+    except CodemodError as e:
+        result['error'] = str(e)
+    except (UnicodeDecodeError, OSError) as e:
+        result['error'] = str(e)
+        result['sha256'] = None
+    return result
+
+
+def _init_worker(extra_modules):
+    # spawned workers import this file as __mp_main__; plugins must see its registry
+    sys.modules.setdefault('codemod', sys.modules[__name__])
+    load_plugins(extra_modules)
+
+
+def find_files(root, include=()):
+    """Relative paths (forward slashes) of the .cs files under root"""
+    paths = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith('.cs'):
+                rel = os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/')
+                if not include or any(fnmatch.fnmatch(rel, pattern) for pattern in include):
+                    paths.append(rel)
+    return sorted(paths)
+
+
+# ============================================
+# Result cache
+# ============================================
+
+def ruleset_version(rule_names):
+    """Hash of the engine and of every module defining a selected rule"""
+    digest = hashlib.sha256()
+    sources = {os.path.abspath(__file__)}
+    sources.update(os.path.abspath(inspect.getsourcefile(RULES[name][0])) for name in rule_names)
+    for name in rule_names:
+        digest.update(name.encode('utf-8') + b'\0')
+    for path in sorted(sources):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def load_cache(path=DEFAULT_CACHE_PATH):
+    """{"<ruleset>|<file>": entry}; a missing or outdated file means a full run"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != CACHE_VERSION:
+        return {}
+    return data.get('files', {})
+
+
+def save_cache(cache, path=DEFAULT_CACHE_PATH):
+    """Write the cache file atomically (temp file + rename)"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'files': cache}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _cache_key(root, rel_path, ruleset):
+    return f"{ruleset}|{os.path.abspath(os.path.join(root, rel_path)).replace(os.sep, '/')}"
+
+
+def run_rules(root, paths, rule_names, workers=None, extra_modules=(), cache=None):
+    """
+    Process every file and return the per-file results in path order.
+
+    With a cache, a file whose size and mtime match its entry for this rule
+    set is not opened at all; a file whose bytes still hash the same is read
+    but not tokenized. Only clean files and parse errors are cached - a file
+    with pending edits is always processed so its diff and new bytes exist.
+    """
+    ruleset = ruleset_version(rule_names)
+    results = {}
+    jobs = []
+    for path in paths:
+        entry = cache.get(_cache_key(root, path, ruleset)) if cache is not None else None
+        usable = entry is not None and not entry['counts']
+        if usable:
+            try:
+                stat = os.stat(os.path.join(root, path))
+            except OSError:
+                stat = None
+            if stat and (stat.st_mtime_ns, stat.st_size) == tuple(entry['stat']):
+                results[path] = {'path': path, 'counts': entry['counts'], 'notes': entry['notes'], 'changed': False,
+                                 'original': None, 'content': None, 'error': entry['error'],
+                                 'sha256': entry['sha256'], 'stat': entry['stat'], 'cached': True}
+                continue
+        jobs.append((root, path, tuple(rule_names), entry['sha256'] if usable else None))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        processed = [process_file(job) for job in jobs]
+    else:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(tuple(extra_modules),)) as pool:
+            processed = list(pool.map(process_file, jobs, chunksize=chunksize))
+
+    for result in processed:
+        key = _cache_key(root, result['path'], ruleset)
+        if result['cached']:
+            entry = cache[key]
+            result.update(counts=entry['counts'], notes=entry['notes'], error=entry['error'])
+        if cache is not None:
+            if result['sha256'] is None or result['changed']:
+                # unreadable, or has pending edits - check again next run
+                cache.pop(key, None)
+            else:
+                cache[key] = {'stat': result['stat'], 'sha256': result['sha256'],
+                              'counts': result['counts'], 'notes': result['notes'], 'error': result['error']}
+        results[result['path']] = result
+    return [results[path] for path in paths]
+
+
+def print_diff(result):
+    """Unified diff of one changed file (line endings normalised for display)"""
+    before = result['original'].decode('utf-8-sig').splitlines()
+    after = result['content'].decode('utf-8-sig').splitlines()
+    path = result['path']
+    for line in difflib.unified_diff(before, after, f"a/{path}", f"b/{path}", lineterm=''):
+        print(line)
+
+
+# ============================================
+# Transactions
+# ============================================
+
+def _write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _replace(src_path, dst_path, attempts=RETRY_ATTEMPTS, delay=RETRY_DELAY):
+    """os.replace with exponential backoff - Visual Studio keeps files open for a moment"""
+    for attempt in range(attempts):
+        try:
+            os.replace(src_path, dst_path)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+
+class Transaction:
+    """
+    One batch of rewrites, journaled under codemod_journal/<id>/.
+
+    journal.json lists every file with its hash before and after, and the
+    original bytes are kept beside it. New contents are written to temp files
+    next to their targets first, then renamed over them; a rename that still
+    fails after the retries restores the files already replaced, so a batch
+    lands completely or not at all. Retries only repeat the rename - nothing
+    is read or rewritten again.
+    """
+
+    def __init__(self, journal_dir, data):
+        self.dir = os.path.join(journal_dir, data['id'])
+        self.data = data
+
+    @property
+    def id(self):
+        return self.data['id']
+
+    @property
+    def status(self):
+        return self.data['status']
+
+    @classmethod
+    def create(cls, journal_dir, root, rule_names, changes):
+        """changes: [(relative path, old bytes, new bytes, (mtime_ns, size) when read)]"""
+        now = datetime.now()
+        tx = cls(journal_dir, {
+            'id': now.strftime('%Y%m%d-%H%M%S-%f'),
+            'root': os.path.abspath(root),
+            'rules': list(rule_names),
+            'created_at': now.isoformat(timespec='seconds'),
+            'status': 'prepared',
+            'files': [],
+        })
+        os.makedirs(tx.dir)
+        for n, (path, old, new, stat) in enumerate(changes):
+            backup = f"{n:04d}.orig"
+            _write_file(os.path.join(tx.dir, backup), old)
+            tx.data['files'].append({'path': path, 'before': sha256(old), 'after': sha256(new),
+                                     'stat': list(stat), 'backup': backup})
+        tx.save()
+        return tx
+
+    @classmethod
+    def load(cls, journal_dir, tx_id):
+        path = os.path.join(journal_dir, tx_id, 'journal.json')
+        if not os.path.exists(path):
+            raise CodemodError(f"no batch '{tx_id}' in {journal_dir}")
+        with open(path, encoding='utf-8') as f:
+            return cls(journal_dir, json.load(f))
+
+    def save(self):
+        tmp_path = os.path.join(self.dir, 'journal.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, os.path.join(self.dir, 'journal.json'))
+
+    def _target(self, entry):
+        return os.path.join(self.data['root'], entry['path'])
+
+    def _set_status(self, status):
+        self.data['status'] = status
+        self.data[f'{status}_at'] = datetime.now().isoformat(timespec='seconds')
+        self.save()
+
+    def _restore(self, entries):
+        for entry in entries:
+            with open(os.path.join(self.dir, entry['backup']), 'rb') as f:
+                data = f.read()
+            tmp_path = self._target(entry) + TEMP_SUFFIX
+            _write_file(tmp_path, data)
+            _replace(tmp_path, self._target(entry))
+
+    def commit(self, contents):
+        """Replace every file with contents[path]; all or nothing"""
+        entries = self.data['files']
+        for entry in entries:
+            stat = os.stat(self._target(entry))
+            if [stat.st_mtime_ns, stat.st_size] != entry['stat']:
+                self._set_status('aborted')
+                raise CodemodError(f"{entry['path']} was modified while the rules ran - nothing written")
+
+        temps = []
+        try:
+            for entry in entries:
+                tmp_path = self._target(entry) + TEMP_SUFFIX
+                _write_file(tmp_path, contents[entry['path']])
+                temps.append(tmp_path)
+        except OSError as e:
+            for tmp_path in temps:
+                os.remove(tmp_path)
+            self._set_status('aborted')
+            raise CodemodError(f"cannot write temp files ({e}) - nothing written")
+
+        self._set_status('applying')
+        replaced = []
+        for entry, tmp_path in zip(entries, temps):
+            try:
+                _replace(tmp_path, self._target(entry))
+            except OSError as e:
+                for leftover in temps[len(replaced):]:
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                self._restore(replaced)
+                self._set_status('rolled_back')
+                raise CodemodError(f"{entry['path']}: {e} - batch rolled back")
+            replaced.append(entry)
+        self._set_status('committed')
+
+    def revert(self, force=False):
+        """
+        Put the original bytes back; returns the restored entries.
+
+        Files edited after the batch are refused unless force=True. Files
+        still holding their original bytes (an interrupted batch) are skipped,
+        so a failed revert can simply be run again.
+        """
+        if self.status not in ('committed', 'applying'):
+            raise CodemodError(f"batch {self.id} is {self.status} - nothing to revert")
+        restore = []
+        conflicts = []
+        for entry in self.data['files']:
+            try:
+                with open(self._target(entry), 'rb') as f:
+                    current = sha256(f.read())
+            except FileNotFoundError:
+                current = None
+            if current == entry['before']:
+                continue
+            if current != entry['after'] and not force:
+                conflicts.append(entry['path'])
+                continue
+            restore.append(entry)
+        if conflicts:
+            raise CodemodError("edited after the batch, use --force to overwrite: " + ', '.join(conflicts))
+        self._restore(restore)
+        self._set_status('reverted')
+        return restore
+
+
+def list_transactions(journal_dir=DEFAULT_JOURNAL_DIR):
+    """Every journaled batch, oldest first"""
+    if not os.path.isdir(journal_dir):
+        return []
+    return [Transaction.load(journal_dir, name) for name in sorted(os.listdir(journal_dir))
+            if os.path.exists(os.path.join(journal_dir, name, 'journal.json'))]
+
+
+def revert(journal_dir, tx_id, force=False):
+    """Undo one batch (default: the newest one still applied)"""
+    if tx_id == 'last':
+        applied = [tx for tx in list_transactions(journal_dir) if tx.status in ('committed', 'applying')]
+        if not applied:
+            print("ℹ️  No applied batch to revert")
+            return 0
+        tx = applied[-1]
+    else:
+        tx = Transaction.load(journal_dir, tx_id)
+    try:
+        restored = tx.revert(force)
+    except CodemodError as e:
+        print(f"❌ {e}")
+        return 1
+    for entry in restored:
+        print(f"↩️  {entry['path']}")
+    print(f"\n✅ Batch {tx.id} reverted ({len(restored)} file(s) restored)")
+    return 0
+
+
+def print_history(journal_dir):
+    for tx in list_transactions(journal_dir):
+        print(f"{tx.id}  {tx.status:<12} {len(tx.data['files']):>4} file(s)  "
+              f"{', '.join(tx.data['rules'])}  {tx.data['root']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply token-aware rewrite rules to the C# sources")
+    parser.add_argument('rules', nargs='*', help="rule names to apply")
+    parser.add_argument('--root', default=DEFAULT_ROOT, help="source tree (default: Presentation/)")
+    parser.add_argument('--include', action='append', default=[], metavar='GLOB',
+                        help="only files matching this path pattern, relative to --root")
+    parser.add_argument('--dry-run', action='store_true', help="print a unified diff without writing")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU cores)")
+    parser.add_argument('--plugin', action='append', default=[], help="extra plugin module to import")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="result cache file")
+    parser.add_argument('--no-cache', action='store_true', help="process every file")
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL_DIR, help="batch journal directory")
+    parser.add_argument('--revert', nargs='?', const='last', metavar='BATCH', help="undo a batch (default: the last)")
+    parser.add_argument('--force', action='store_true', help="revert files edited after the batch too")
+    parser.add_argument('--history', action='store_true', help="list journaled batches")
+    parser.add_argument('--list', action='store_true', help="list registered rules and exit")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    if args.history:
+        print_history(args.journal)
+        return 0
+    if args.revert:
+        return revert(args.journal, args.revert, args.force)
+    for tx in list_transactions(args.journal):
+        if tx.status == 'applying':
+            print(f"⚠️  Batch {tx.id} was interrupted - run: python codemod.py --revert {tx.id}")
+
+    load_plugins(args.plugin)
+
+    if args.list or not args.rules:
+        for name, (_, description) in sorted(RULES.items()):
+            print(f"{name:<20} {description}")
+        return 0 if args.list else 2
+    unknown = [name for name in args.rules if name not in RULES]
+    if unknown:
+        print(f"❌ Unknown rules: {', '.join(unknown)}")
+        return 2
+
+    paths = find_files(args.root, args.include)
+    cache = None if args.no_cache else load_cache(args.cache)
+    results = run_rules(args.root, paths, args.rules, args.workers, args.plugin, cache)
+    changed = [r for r in results if r['changed'] and not r['error']]
+    failed = [r for r in results if r['error']]
+    if cache is not None:
+        save_cache(cache, args.cache)
+
+    if args.dry_run:
+        for result in changed:
+            print_diff(result)
+        if changed:
+            print()
+    for result in changed:
+        counts = ', '.join(f"{name}×{count}" for name, count in result['counts'].items())
+        print(f"{'🔎' if args.dry_run else '📝'} {result['path']}  {counts}")
+    for result in failed:
+        print(f"❌ {result['path']}: {result['error']}")
+    for result in results:
+        for note in result['notes']:
+            print(f"⚠️  {result['path']} {note} - left unchanged")
+
+    cached = sum(1 for r in results if r['cached'])
+    verb = "would change" if args.dry_run else "changed"
+    if changed and not args.dry_run:
+        tx = Transaction.create(args.journal, args.root, args.rules,
+                                [(r['path'], r['original'], r['content'], r['stat']) for r in changed])
+        try:
+            tx.commit({r['path']: r['content'] for r in changed})
+        except CodemodError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"📒 Batch {tx.id} - undo with: python codemod.py --revert {tx.id}")
+    print(f"\n{len(paths)} file(s) scanned ({cached} from cache), {len(changed)} {verb}, {len(failed)} error(s)")
+    if failed:
+        return 1
+    return 1 if args.dry_run and changed else 0
+
+
+if __name__ == "__main__":
+    # plugins import "codemod" - make them share this module's registry
+    sys.modules.setdefault('codemod', sys.modules[__name__])
+    sys.exit(main())
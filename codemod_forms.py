@@ -0,0 +1,249 @@
+"""
+Codemod rules for the WinForms sources
+قواعد تعديل الواجهة: RTL، النوافذ المستقلة، وموضع الشريط الجانبي
+
+Token-based ports of the one-off rewrite scripts:
+
+    rtl / ltr         convert_locked_rtl.py, fix_locked_python.py / revert_locked_python.py
+    modeless_forms    convert_showdialog_to_show.py, enable_multiple_windows.py, fix_all_sections.py
+    sidebar_layout    fix_sidebar_position.py
+
+Matches never look inside strings or comments, and block bodies are taken
+from the bracket pairs, so a body containing lambdas or nested braces is
+moved whole.
+"""
+
+from codemod import rule
+
+# Forms that open as independent windows instead of modal dialogs
+MODELESS_FORMS = {
+    'TripDetailsForm', 'AddEditTripForm', 'TripListForm', 'CashBoxForm',
+    'JournalEntriesForm', 'AccountsTreeForm',
+    'ReservationListForm', 'ReservationDetailsForm', 'AddEditReservationForm',
+    'AddReservationForm', 'EditReservationForm',
+    'CustomerListForm', 'CustomerDetailsForm', 'AddEditCustomerForm',
+    'SupplierListForm', 'SupplierDetailsForm', 'AddEditSupplierForm',
+    'InvoiceListForm', 'InvoiceDetailsForm', 'AddEditInvoiceForm', 'EditInvoiceForm',
+    'AddSalesInvoiceForm', 'AddPurchaseInvoiceForm',
+    'UmrahPackageListForm', 'UmrahPackageDetailsForm', 'AddEditUmrahPackageForm',
+    'FlightBookingDetailsForm', 'AddEditFlightBookingForm', 'AddFlightBookingForm',
+    'EditFlightBookingForm',
+    'CashTransactionDetailsForm', 'AddCashTransactionForm', 'EditCashTransactionForm',
+    'BankAccountDetailsForm', 'AddEditBankAccountForm', 'BankTransactionDetailsForm',
+    'AddBankTransactionForm',
+    'ReportViewerForm', 'ReportDetailsForm',
+}
+
+# MainForm's TableLayoutPanel cells (column, row): sidebar on the right in RTL
+SIDEBAR_CELLS = {'_sidebar': ('0', '0'), '_header': ('1', '0'), '_contentPanel': ('1', '1')}
+
+INDENT = '    '
+
+
+# ============================================
+# RightToLeft
+# ============================================
+
+def _property_values(src, prop):
+    """(index of the value's last token, value text) for every "prop = a.b.c" assignment"""
+    for i in src.find(prop, '='):
+        j = i + 2
+        while src.at(j + 1, '.') and j + 2 < len(src.tokens) and src.tokens[j + 2].kind == 'ident':
+            j += 2
+        yield j, src.source(i + 2, j)
+
+
+def _set_direction(src, rtl):
+    old, new = ('No', 'Yes') if rtl else ('Yes', 'No')
+    old_layout, new_layout = ('false', 'true') if rtl else ('true', 'false')
+    edits = []
+    for j, value in _property_values(src, 'RightToLeft'):
+        if value.replace(' ', '') in (f'RightToLeft.{old}', f'System.Windows.Forms.RightToLeft.{old}'):
+            edits.append((src.tokens[j].start, src.tokens[j].end, new))
+    for j, value in _property_values(src, 'RightToLeftLayout'):
+        if value == old_layout:
+            edits.append((src.tokens[j].start, src.tokens[j].end, new_layout))
+    return edits
+
+
+@rule('rtl', "RightToLeft = Yes and RightToLeftLayout = true")
+def rtl(src):
+    return _set_direction(src, rtl=True)
+
+
+@rule('ltr', "RightToLeft = No and RightToLeftLayout = false (undoes rtl)")
+def ltr(src):
+    return _set_direction(src, rtl=False)
+
+
+# ============================================
+# Modal dialogs -> independent windows
+# ============================================
+
+def _after_new(src, i):
+    """Index just past "new X(...)" or "new X(...) { ... }" starting at i, or None"""
+    if not src.at(i + 2, '('):
+        return None
+    j = src.partner(i + 2) + 1
+    if src.at(j, '{'):
+        j = src.partner(j) + 1
+    return j
+
+
+def _show_call(src, i, name):
+    """End index (the ')') of "name.ShowDialog(...)" at i, or None"""
+    if src.at(i, name, '.', 'ShowDialog', '('):
+        return src.partner(i + 3)
+    return None
+
+
+@rule('modeless_forms', "ShowDialog() -> Show() for MODELESS_FORMS, code after the dialog moved to FormClosed")
+def modeless_forms(src):
+    edits = []
+    for i in src.find('new'):
+        form_class = src.tokens[i + 1].text if i + 1 < len(src.tokens) else None
+        if form_class not in MODELESS_FORMS:
+            continue
+        end = _after_new(src, i)
+        if end is None:
+            continue
+
+        # new X(...).ShowDialog(); as a statement of its own
+        if src.at(end, '.', 'ShowDialog', '(') and src.at(src.partner(end + 2) + 1, ';'):
+            token = src.tokens[end + 1]
+            edits.append((token.start, token.end, 'Show'))
+            continue
+
+        # [using] var form = new X(...); ... form.ShowDialog()
+        if not src.at(end, ';') or not src.at(i - 2, None, '=') or src.tokens[i - 2].kind != 'ident':
+            continue
+        name = src.tokens[i - 2].text
+        declaration = i - 3
+        converted = _convert_show(src, name, end + 1, src.block_end(end + 1), edits)
+        if converted and src.at(declaration - 1, 'using'):
+            using = src.tokens[declaration - 1]
+            edits.append((using.start, src.tokens[declaration].start, ''))
+    return edits
+
+
+# Statements that mean something else once moved into a FormClosed lambda
+_JUMPS = {'return', 'break', 'continue', 'yield', 'goto'}
+
+
+def _trailing(src, i):
+    """
+    Last index of the statements from i to the end of their block, -1 when
+    there are none, or None when they jump out of the block and cannot move
+    into a lambda.
+    """
+    stop = src.block_end(i)
+    if stop == i:
+        return -1
+    if any(t.text in _JUMPS for t in src.tokens[i:stop]):
+        return None
+    return stop - 1
+
+
+def _closed_handler(src, name, k, end, parts, call_args):
+    """name.FormClosed += (s, args) => { parts }; name.Show(call_args); indented like token k"""
+    indent = src.indent(k)
+    nl = src.newline
+    is_async = 'async ' if any(t.text == 'await' for t in src.tokens[k:end + 1]) else ''
+    body = ''.join(f"{indent}{INDENT}{part}{nl}" for part in parts)
+    return (
+        f"{name}.FormClosed += {is_async}(s, args) =>{nl}"
+        f"{indent}{{{nl}"
+        f"{body}"
+        f"{indent}}};{nl}"
+        f"{indent}{name}.Show{call_args};"
+    )
+
+
+def _convert_show(src, name, start, stop, edits):
+    """
+    Rewrite the first ShowDialog on name between start and stop; True when one
+    was converted. Statements after the dialog ran once it had closed, so they
+    move into the FormClosed handler; a site whose following statements jump
+    (return, break, ...) is reported and left modal.
+    """
+    for k in range(start, stop):
+        # name.ShowDialog(); [statements...]
+        close = _show_call(src, k, name)
+        if close is not None and src.at(close + 1, ';') and not src.at(k - 1, '.'):
+            last = _trailing(src, close + 2)
+            if last is None:
+                src.note(k, f"{name}.ShowDialog() is followed by return/break/continue")
+                return False
+            if last < 0:
+                token = src.tokens[k + 2]
+                edits.append((token.start, token.end, 'Show'))
+                return True
+            parts = [src.reindent(close + 2, last, INDENT)]
+            replacement = _closed_handler(src, name, k, last, parts, src.source(k + 3, close))
+            edits.append((src.tokens[k].start, src.tokens[last].end, replacement))
+            return True
+
+        # if (name.ShowDialog() == DialogResult.OK) { ... } [statements...] with no else
+        if not src.at(k, 'if', '('):
+            continue
+        close = _show_call(src, k + 2, name)
+        if close is None or not src.at(close + 1, '==', 'DialogResult', '.', 'OK', ')', '{'):
+            continue
+        body_open = close + 6
+        body_close = src.partner(body_open)
+        if src.at(body_close + 1, 'else'):
+            src.note(k, f"{name}.ShowDialog() result has an else branch")
+            return False
+        last = _trailing(src, body_close + 1)
+        if last is None:
+            src.note(k, f"{name}.ShowDialog() is followed by return/break/continue")
+            return False
+        parts = [f"if ({name}.DialogResult == DialogResult.OK)",
+                 src.reindent(body_open, body_close, INDENT)]
+        end = body_close
+        if last >= 0:
+            parts.append(src.reindent(body_close + 1, last, INDENT))
+            end = last
+        replacement = _closed_handler(src, name, k, end, parts, src.source(k + 5, close))
+        edits.append((src.tokens[k].start, src.tokens[end].end, replacement))
+        return True
+    return False
+
+
+# ============================================
+# MainForm layout
+# ============================================
+
+def _statement_end(src, i):
+    """Index of the ';' ending the call statement starting at i"""
+    j = i
+    while not src.at(j, '('):
+        j += 1
+    return src.partner(j) + 1
+
+
+@rule('sidebar_layout', "MainForm: sidebar column first, header/content in column 1")
+def sidebar_layout(src):
+    if not src.path.endswith('MainForm.cs'):
+        return []
+    edits = []
+    for i in src.find('mainLayout', '.', 'Controls', '.', 'Add', '(', None, ',', None, ',', None, ')'):
+        cell = SIDEBAR_CELLS.get(src.tokens[i + 6].text)
+        if cell is None:
+            continue
+        for token, value in zip((src.tokens[i + 8], src.tokens[i + 10]), cell):
+            if token.text != value:
+                edits.append((token.start, token.end, value))
+
+    # Percent (content) before Absolute (sidebar) -> swap the two ColumnStyles.Add statements
+    styles = list(src.find('mainLayout', '.', 'ColumnStyles', '.', 'Add', '('))
+    for first, second in zip(styles, styles[1:]):
+        first_end, second_end = _statement_end(src, first), _statement_end(src, second)
+        if second != first_end + 1:
+            continue
+        first_text, second_text = src.source(first, first_end), src.source(second, second_end)
+        if 'SizeType.Percent' in first_text and 'SizeType.Absolute' in second_text:
+            between = src.text[src.tokens[first_end].end:src.tokens[second].start]
+            edits.append((src.tokens[first].start, src.tokens[second_end].end,
+                          second_text + between + first_text))
+    return edits
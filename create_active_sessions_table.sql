@@ -19,3 +19,5 @@ CREATE INDEX IF NOT EXISTS idx_active_sessions_session_id ON active_sessions (se
 
 -- Cleanup any old stale sessions (optional - run on first setup)
 -- UPDATE active_sessions SET is_active = false, logout_time = NOW() WHERE is_active = true;
+
+-- Sessions left active by crashed clients are expired by session_reaper.py (safe to run every minute)
@@ -0,0 +1,89 @@
+-- Pre-aggregated monthly cashbox totals, maintained by refresh_cashbox_summary.py
+CREATE TABLE IF NOT EXISTS cashbox_monthly_summary (
+    cashboxid INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    transactiontype INTEGER NOT NULL,
+    transaction_count INTEGER NOT NULL DEFAULT 0,
+    total_amount NUMERIC NOT NULL DEFAULT 0,
+    -- InstaPay commission on expenses (CashBoxService deducts Amount + Commission)
+    total_commission NUMERIC NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (cashboxid, year, month, currency, transactiontype)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cashbox_monthly_summary_period ON cashbox_monthly_summary (year, month);
+
+-- Refresh state (single row); NULL until the first refresh builds every bucket
+CREATE TABLE IF NOT EXISTS cashbox_monthly_summary_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    last_refreshed_at TIMESTAMP WITH TIME ZONE
+);
+
+INSERT INTO cashbox_monthly_summary_state (id, last_refreshed_at) VALUES (1, NULL)
+ON CONFLICT (id) DO NOTHING;
+
+-- (cashbox, year, month) buckets written since the last refresh - both the old
+-- and the new bucket of every changed row, so soft deletes and moves to another
+-- month/cashbox are caught even when updatedat is not touched.
+-- No unique key on purpose: each writer queues its own rows and the refresh only
+-- takes the rows it can see, so a transaction still in flight is picked up next time.
+-- Every write statement adds rows until the next refresh empties the queue, so
+-- refresh_cashbox_summary.py has to run on a schedule.
+CREATE TABLE IF NOT EXISTS cashbox_monthly_summary_changes (
+    cashboxid INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION cashbox_monthly_summary_queue() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        INSERT INTO cashbox_monthly_summary_changes (cashboxid, year, month)
+        SELECT DISTINCT cashboxid, year, month FROM cashbox_monthly_summary;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO cashbox_monthly_summary_changes (cashboxid, year, month)
+        SELECT DISTINCT cashboxid, year, month FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO cashbox_monthly_summary_changes (cashboxid, year, month)
+        SELECT DISTINCT cashboxid, year, month FROM old_rows;
+    ELSE
+        INSERT INTO cashbox_monthly_summary_changes (cashboxid, year, month)
+        SELECT cashboxid, year, month FROM old_rows
+        UNION
+        SELECT cashboxid, year, month FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Changes made before the triggers existed were never queued: on first install
+-- the next refresh rebuilds every bucket (re-running this file keeps the queue)
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_cashtransactions_summary_insert') THEN
+        UPDATE cashbox_monthly_summary_state SET last_refreshed_at = NULL WHERE id = 1;
+    END IF;
+END $$;
+
+-- One queue insert per statement (transition tables need one trigger per event)
+DROP TRIGGER IF EXISTS trg_cashtransactions_summary_insert ON cashtransactions;
+CREATE TRIGGER trg_cashtransactions_summary_insert
+    AFTER INSERT ON cashtransactions REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cashbox_monthly_summary_queue();
+
+DROP TRIGGER IF EXISTS trg_cashtransactions_summary_update ON cashtransactions;
+CREATE TRIGGER trg_cashtransactions_summary_update
+    AFTER UPDATE ON cashtransactions REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cashbox_monthly_summary_queue();
+
+DROP TRIGGER IF EXISTS trg_cashtransactions_summary_delete ON cashtransactions;
+CREATE TRIGGER trg_cashtransactions_summary_delete
+    AFTER DELETE ON cashtransactions REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION cashbox_monthly_summary_queue();
+
+DROP TRIGGER IF EXISTS trg_cashtransactions_summary_truncate ON cashtransactions;
+CREATE TRIGGER trg_cashtransactions_summary_truncate
+    AFTER TRUNCATE ON cashtransactions
+    FOR EACH STATEMENT EXECUTE FUNCTION cashbox_monthly_summary_queue();
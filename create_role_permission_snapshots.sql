@@ -0,0 +1,80 @@
+-- Precomputed module -> permission map per role, read by PermissionService at login.
+-- Maintained by triggers on roles/permissions/rolepermissions; see role_permission_snapshot.py
+CREATE TABLE IF NOT EXISTS role_permission_snapshots (
+    roleid INTEGER PRIMARY KEY,
+    rolename TEXT NOT NULL,
+    -- {"Trips": [1, 2, 3], "Tools": [30]}
+    modules JSONB NOT NULL,
+    fingerprint CHAR(32) NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    built_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE VIEW role_permission_snapshot_source AS
+SELECT r.roleid, r.rolename,
+       COALESCE(m.modules, '{}'::jsonb) AS modules,
+       md5(COALESCE(m.modules, '{}'::jsonb)::text) AS fingerprint
+FROM roles r
+LEFT JOIN (
+    SELECT roleid, jsonb_object_agg(module, types) AS modules
+    FROM (
+        SELECT rp.roleid, p."Module" AS module,
+               jsonb_agg(DISTINCT p."PermissionType" ORDER BY p."PermissionType") AS types
+        FROM rolepermissions rp
+        JOIN permissions p ON p.permissionid = rp.permissionid
+        WHERE p."Module" IS NOT NULL
+        GROUP BY rp.roleid, p."Module"
+    ) per_module
+    GROUP BY roleid
+) m ON m.roleid = r.roleid;
+
+-- Rebuild only the roles whose map changed; their version goes up by one
+CREATE OR REPLACE FUNCTION refresh_role_permission_snapshots() RETURNS INTEGER AS $$
+DECLARE
+    changed INTEGER;
+    removed INTEGER;
+BEGIN
+    INSERT INTO role_permission_snapshots (roleid, rolename, modules, fingerprint)
+    SELECT roleid, rolename, modules, fingerprint FROM role_permission_snapshot_source
+    ON CONFLICT (roleid) DO UPDATE
+    SET rolename = EXCLUDED.rolename,
+        modules = EXCLUDED.modules,
+        fingerprint = EXCLUDED.fingerprint,
+        version = role_permission_snapshots.version + 1,
+        built_at = NOW()
+    WHERE (role_permission_snapshots.fingerprint, role_permission_snapshots.rolename)
+          IS DISTINCT FROM (EXCLUDED.fingerprint, EXCLUDED.rolename);
+    GET DIAGNOSTICS changed = ROW_COUNT;
+
+    DELETE FROM role_permission_snapshots s
+    WHERE NOT EXISTS (SELECT 1 FROM roles r WHERE r.roleid = s.roleid);
+    GET DIAGNOSTICS removed = ROW_COUNT;
+
+    RETURN changed + removed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION role_permission_snapshots_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_role_permission_snapshots();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One refresh per statement, so seed_permissions.py's set-based writes cost one rebuild each
+DROP TRIGGER IF EXISTS trg_rolepermissions_snapshot ON rolepermissions;
+CREATE TRIGGER trg_rolepermissions_snapshot
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON rolepermissions
+    FOR EACH STATEMENT EXECUTE FUNCTION role_permission_snapshots_trigger();
+
+DROP TRIGGER IF EXISTS trg_permissions_snapshot ON permissions;
+CREATE TRIGGER trg_permissions_snapshot
+    AFTER UPDATE OF "Module", "PermissionType" OR DELETE ON permissions
+    FOR EACH STATEMENT EXECUTE FUNCTION role_permission_snapshots_trigger();
+
+DROP TRIGGER IF EXISTS trg_roles_snapshot ON roles;
+CREATE TRIGGER trg_roles_snapshot
+    AFTER INSERT OR UPDATE OF rolename OR DELETE ON roles
+    FOR EACH STATEMENT EXECUTE FUNCTION role_permission_snapshots_trigger();
+
+SELECT refresh_role_permission_snapshots();
@@ -0,0 +1,225 @@
+"""
+Shared PostgreSQL access layer for the ops scripts
+طبقة اتصال مشتركة بقاعدة البيانات لكل السكريبتات
+
+Configuration is resolved once, in this order:
+  1. GRACEWAY_DB_* environment variables (HOST, PORT, NAME, USER, PASSWORD)
+  2. ConnectionStrings.DefaultConnection in appsettings.json (same file the app reads)
+  3. The DB_CONFIG defaults the scripts have always used
+
+The legacy SQLite database (accountant.db) is located via GRACEWAY_SQLITE_PATH,
+falling back to accountant.db next to the scripts.
+
+Usage:
+    from db_pool import connection
+
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+
+Connections are borrowed from a process-wide ThreadedConnectionPool, so a
+batch of checks run back to back (or from several threads) reuses warm
+connections instead of paying the connect/auth round trip every time.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+APPSETTINGS_PATH = os.path.join(SCRIPT_DIR, 'appsettings.json')
+
+# Database connection settings (fallback)
+DB_CONFIG = {
+    'host': 'localhost',
+    'port': 5432,
+    'database': 'graceway_accounting',
+    'user': 'postgres',
+    'password': '123456'
+}
+
+SQLITE_PATH = os.environ.get('GRACEWAY_SQLITE_PATH') or os.path.join(SCRIPT_DIR, 'accountant.db')
+
+POOL_MIN_SIZE = int(os.environ.get('GRACEWAY_DB_POOL_MIN', 1))
+POOL_MAX_SIZE = int(os.environ.get('GRACEWAY_DB_POOL_MAX', 10))
+
+# Npgsql connection string keys -> psycopg2 keyword arguments
+_NPGSQL_KEYS = {
+    'host': 'host',
+    'server': 'host',
+    'port': 'port',
+    'database': 'database',
+    'username': 'user',
+    'user id': 'user',
+    'userid': 'user',
+    'password': 'password',
+}
+
+_ENV_KEYS = {
+    'GRACEWAY_DB_HOST': 'host',
+    'GRACEWAY_DB_PORT': 'port',
+    'GRACEWAY_DB_NAME': 'database',
+    'GRACEWAY_DB_USER': 'user',
+    'GRACEWAY_DB_PASSWORD': 'password',
+}
+
+_lock = threading.Lock()
+_pool = None
+_config = None
+
+
+def parse_connection_string(conn_str):
+    """Convert an Npgsql connection string into psycopg2 keyword arguments"""
+    params = {}
+    for part in conn_str.split(';'):
+        if '=' not in part:
+            continue
+        key, value = part.split('=', 1)
+        target = _NPGSQL_KEYS.get(key.strip().lower())
+        if target:
+            params[target] = value.strip()
+    if 'port' in params:
+        params['port'] = int(params['port'])
+    return params
+
+
+def _load_appsettings():
+    """Read ConnectionStrings.DefaultConnection from appsettings.json, if present"""
+    if not os.path.exists(APPSETTINGS_PATH):
+        return {}
+    try:
+        with open(APPSETTINGS_PATH, encoding='utf-8-sig') as f:
+            settings = json.load(f)
+        conn_str = settings.get('ConnectionStrings', {}).get('DefaultConnection')
+    except (OSError, ValueError):
+        return {}
+    if not conn_str:
+        return {}
+    params = parse_connection_string(conn_str)
+    # appsettings.json بدون كلمة مرور لا يلغي الافتراضي
+    if not params.get('password'):
+        params.pop('password', None)
+    return params
+
+
+def load_config():
+    """Return the resolved connection settings (cached after the first call)"""
+    global _config
+    if _config is None:
+        config = dict(DB_CONFIG)
+        config.update(_load_appsettings())
+        for env_key, target in _ENV_KEYS.items():
+            if os.environ.get(env_key):
+                config[target] = os.environ[env_key]
+        config['port'] = int(config['port'])
+        _config = config
+    return dict(_config)
+
+
+def get_pool():
+    """Return the process-wide thread-safe connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = pg_pool.ThreadedConnectionPool(
+                    POOL_MIN_SIZE, POOL_MAX_SIZE, **load_config()
+                )
+    return _pool
+
+
+@contextmanager
+def connection(autocommit=False):
+    """
+    Borrow a pooled connection for the duration of a with-block.
+    Commits on success, rolls back on error, and always returns the
+    connection to the pool.
+    """
+    db_pool = get_pool()
+    conn = db_pool.getconn()
+    broken = False
+    try:
+        conn.autocommit = autocommit
+        yield conn
+        if not autocommit:
+            conn.commit()
+    except Exception:
+        if conn.closed:
+            broken = True
+        else:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        raise
+    finally:
+        db_pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def get_connection():
+    """Open a dedicated (unpooled) connection - for code that manages its own lifetime"""
+    return psycopg2.connect(**load_config())
+
+
+def get_sqlite_connection(path=None):
+    """Open the legacy SQLite database (accountant.db)"""
+    import sqlite3
+
+    return sqlite3.connect(path or SQLITE_PATH)
+
+
+def close_pool():
+    """Close every pooled connection (call once at the end of a batch run)"""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+# ============================================
+# asyncio variant
+# ============================================
+
+_async_pool = None
+
+
+async def get_async_pool(min_size=None, max_size=None):
+    """Return the process-wide asyncpg pool, creating it on first use"""
+    global _async_pool
+    if _async_pool is None:
+        import asyncpg
+
+        config = load_config()
+        _async_pool = await asyncpg.create_pool(
+            host=config['host'],
+            port=config['port'],
+            database=config['database'],
+            user=config['user'],
+            password=config['password'],
+            min_size=min_size or POOL_MIN_SIZE,
+            max_size=max_size or POOL_MAX_SIZE,
+        )
+    return _async_pool
+
+
+async def close_async_pool():
+    """Close the asyncpg pool"""
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+if __name__ == "__main__":
+    config = load_config()
+    print(f"Host: {config['host']}:{config['port']}  Database: {config['database']}  User: {config['user']}")
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT version()")
+        print(f"✅ Connected: {cur.fetchone()[0]}")
+    close_pool()
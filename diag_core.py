@@ -0,0 +1,234 @@
+"""
+Core diagnostics plugin
+نسخة قراءة فقط من فحوصات check_*.py للتشغيل عبر diagnostics.py
+
+Ported from check_cashbox_pg.py, check_db_permissions.py, check_umrah.py,
+check_flight_bookings.py and check_currencies.py. Nothing here writes to
+the database; fixes stay in the original scripts.
+"""
+
+from diagnostics import check
+
+# TransactionType: Income = 1, Expense = 2
+# PaymentMethod: InstaPay = 5
+
+
+def _rows(cursor):
+    """Fetch all rows as a list of dicts keyed by column name"""
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+@check('cashbox_monthly', "Transactions, income and expense per month (last 12 months)")
+def cashbox_monthly(conn):
+    from refresh_cashbox_summary import summary_exists
+
+    cur = conn.cursor()
+    # الملخص الشهري المجمع مسبقاً (refresh_cashbox_summary.py) إن وجد
+    if summary_exists(conn):
+        cur.execute("""
+            SELECT
+                year || '-' || LPAD(month::text, 2, '0') AS month,
+                SUM(transaction_count) AS count,
+                SUM(CASE WHEN transactiontype = 1 THEN total_amount ELSE 0 END) AS income,
+                SUM(CASE WHEN transactiontype = 2 THEN total_amount ELSE 0 END) AS expense
+            FROM cashbox_monthly_summary
+            GROUP BY year, month
+            ORDER BY year DESC, month DESC
+            LIMIT 12
+        """)
+        return {'source': 'cashbox_monthly_summary', 'months': _rows(cur)}
+    cur.execute("""
+        SELECT
+            TO_CHAR(transactiondate, 'YYYY-MM') AS month,
+            COUNT(*) AS count,
+            SUM(CASE WHEN transactiontype = 1 THEN amount ELSE 0 END) AS income,
+            SUM(CASE WHEN transactiontype = 2 THEN amount ELSE 0 END) AS expense
+        FROM cashtransactions
+        WHERE isdeleted = false
+        GROUP BY month
+        ORDER BY month DESC
+        LIMIT 12
+    """)
+    return {'source': 'cashtransactions', 'months': _rows(cur)}
+
+
+@check('cashbox_balances', "CashBoxes whose currentbalance differs from the last balanceafter")
+def cashbox_balances(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT cb.cashboxid, cb.cashboxname, cb.currentbalance,
+               last_tx.balanceafter AS last_balance_after,
+               COALESCE(stats.transaction_count, 0) AS transaction_count
+        FROM cashboxes cb
+        LEFT JOIN LATERAL (
+            SELECT balanceafter
+            FROM cashtransactions ct
+            WHERE ct.cashboxid = cb.cashboxid AND ct.isdeleted = false
+            ORDER BY ct.transactiondate DESC, ct.transactionid DESC
+            LIMIT 1
+        ) last_tx ON true
+        LEFT JOIN (
+            SELECT cashboxid, COUNT(*) AS transaction_count
+            FROM cashtransactions
+            WHERE isdeleted = false
+            GROUP BY cashboxid
+        ) stats ON stats.cashboxid = cb.cashboxid
+        WHERE cb.isdeleted = false
+        ORDER BY cb.cashboxid
+    """)
+    cashboxes = _rows(cur)
+    issues = [
+        f"cashbox {cb['cashboxid']}: currentbalance {cb['currentbalance']} != last balanceafter {cb['last_balance_after']}"
+        for cb in cashboxes
+        if cb['last_balance_after'] is not None
+        and abs(cb['currentbalance'] - cb['last_balance_after']) >= 0.01
+    ]
+    return {'cashboxes': cashboxes, 'issues': issues}
+
+
+@check('role_permissions', "Permission count per role and roles with no permissions")
+def role_permissions(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT r.roleid, r.rolename, COUNT(rp.permissionid) AS permission_count,
+               ARRAY_AGG(DISTINCT p."Module") FILTER (WHERE p."Module" IS NOT NULL) AS modules
+        FROM roles r
+        LEFT JOIN rolepermissions rp ON rp.roleid = r.roleid
+        LEFT JOIN permissions p ON p.permissionid = rp.permissionid
+        GROUP BY r.roleid, r.rolename
+        ORDER BY r.roleid
+    """)
+    roles = _rows(cur)
+    issues = [f"role {r['rolename']} has no permissions" for r in roles if not r['permission_count']]
+    return {'roles': roles, 'issues': issues}
+
+
+@check('umrah_schema', "umrahpackages columns and foreign keys")
+def umrah_schema(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_name = 'umrahpackages'
+        ORDER BY ordinal_position
+    """)
+    columns = _rows(cur)
+    cur.execute("""
+        SELECT
+            kcu.column_name,
+            ccu.table_name AS foreign_table_name,
+            ccu.column_name AS foreign_column_name
+        FROM information_schema.table_constraints AS tc
+        JOIN information_schema.key_column_usage AS kcu
+          ON tc.constraint_name = kcu.constraint_name
+        JOIN information_schema.constraint_column_usage AS ccu
+          ON ccu.constraint_name = tc.constraint_name
+        WHERE tc.constraint_type = 'FOREIGN KEY'
+          AND tc.table_name = 'umrahpackages'
+    """)
+    issues = [] if columns else ["table umrahpackages not found"]
+    return {'columns': columns, 'foreign_keys': _rows(cur), 'issues': issues}
+
+
+@check('flight_bookings', "Flight bookings with a missing CreatedByUserId")
+def flight_bookings(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE createdbyuserid IS NULL OR createdbyuserid = 0) AS missing_user
+        FROM flightbookings
+    """)
+    counts = _rows(cur)[0]
+    cur.execute("""
+        SELECT flightbookingid, bookingnumber, clientname
+        FROM flightbookings
+        WHERE createdbyuserid IS NULL OR createdbyuserid = 0
+        ORDER BY flightbookingid
+        LIMIT 5
+    """)
+    examples = _rows(cur)
+    issues = [f"{counts['missing_user']} bookings with missing CreatedByUserId"] if counts['missing_user'] else []
+    return {'counts': counts, 'examples': examples, 'issues': issues}
+
+
+@check('currencies', "Currency table contents and trips with an invalid currency")
+def currencies(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT currencyid, currencycode, exchangerate, isbasecurrency, isactive
+        FROM currencies
+        ORDER BY currencyid
+    """)
+    rows = _rows(cur)
+    cur.execute("""
+        SELECT tripid, tripname, currencyid
+        FROM trips
+        WHERE currencyid IS NULL OR currencyid NOT IN (SELECT currencyid FROM currencies)
+        ORDER BY tripid
+        LIMIT 10
+    """)
+    invalid_trips = _rows(cur)
+    issues = []
+    if not rows:
+        issues.append("currencies table is empty")
+    issues.extend(f"trip {t['tripid']} has invalid currencyid {t['currencyid']}" for t in invalid_trips)
+    return {'currencies': rows, 'invalid_trips': invalid_trips, 'issues': issues}
+
+
+@check('ledger_chain', "Full BalanceBefore/BalanceAfter chain verification (verify_cash_ledger.py)")
+def ledger_chain(conn):
+    from verify_cash_ledger import LedgerVerifier, verify_ledger
+
+    verifier = LedgerVerifier()
+    breaks = list(verify_ledger(conn, verifier=verifier))
+    issues = [
+        f"{b['kind']} break in cashbox {b['cashbox_id']} at transaction {b['transaction_id']}: "
+        f"expected {b['expected']}, got {b['actual']}"
+        for b in breaks[:50]
+    ]
+    if len(breaks) > 50:
+        issues.append(f"... and {len(breaks) - 50} more")
+    return {'rows': verifier.rows, 'breaks': len(breaks), 'issues': issues}
+
+
+@check('schema_drift', "Live schema vs the EF migrations (schema_snapshot.py)")
+def schema_drift(conn):
+    from schema_snapshot import diff_snapshots, ef_snapshot, take_snapshot
+
+    changes = diff_snapshots(ef_snapshot(), take_snapshot(conn), compare_defaults=False)
+    return {'differences': len(changes), 'issues': [f"{kind}: {obj} {detail}".strip() for kind, obj, detail in changes]}
+
+
+@check('table_inventory', "Estimated rows and sizes per table (table_inventory.py)")
+def table_inventory(conn):
+    from table_inventory import fetch_inventory
+
+    tables = fetch_inventory(conn)
+    issues = [
+        f"{t['table_name']}: {t['dead_rows']} dead rows vs {t['estimated_rows']} live - needs VACUUM"
+        for t in tables
+        if t['dead_rows'] > 1000 and t['dead_rows'] > 0.2 * max(t['estimated_rows'], 1)
+    ]
+    return {'tables': tables, 'issues': issues}
+
+
+@check('permission_rules', "Forbidden role/permission combinations (permission_rules.json)")
+def permission_rules(conn):
+    from permission_resolver import PermissionIndex, load_rules
+
+    index = PermissionIndex.load(conn)
+    violations = index.check_rules(load_rules())
+    return {
+        'roles': {role: sorted(index.modules(role)) for role in index.roles},
+        'issues': [f"{role}: {rule}" for rule, role, _ in violations],
+    }
+
+
+@check('permission_snapshot', "Per-role permission snapshots match rolepermissions (role_permission_snapshot.py)")
+def permission_snapshot(conn):
+    from role_permission_snapshot import check_snapshots, snapshot_exists
+
+    if not snapshot_exists(conn):
+        return {'installed': False, 'issues': []}
+    return {'installed': True, 'issues': check_snapshots(conn)}
@@ -0,0 +1,167 @@
+"""
+Diagnostics Runner
+يشغل كل الفحوصات في عملية واحدة وعلى نفس الـ connection pool
+
+Checks are plain functions registered with the @check decorator. They live
+in plugin modules named diag_*.py next to this file (auto-discovered), or
+in any module passed with --plugin. Each check receives a pooled
+connection and returns a JSON-serializable dict; a non-empty "issues"
+list in that dict marks the check as a warning.
+
+Usage:
+    python diagnostics.py                      # run every check
+    python diagnostics.py --list               # list registered checks
+    python diagnostics.py cashbox_monthly umrah_schema
+    python diagnostics.py --workers 8 --output report.json
+"""
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from db_pool import POOL_MAX_SIZE, close_pool, connection, load_config
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (function, description)
+CHECKS = {}
+
+
+def check(name, description=''):
+    """Register a diagnostic check under the given name"""
+    def decorator(func):
+        CHECKS[name] = (func, description or (func.__doc__ or '').strip())
+        return func
+    return decorator
+
+
+def load_plugins(extra_modules=()):
+    """Import every diag_*.py module next to this file plus any extra module names"""
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    names = sorted(
+        os.path.splitext(os.path.basename(path))[0]
+        for path in glob.glob(os.path.join(SCRIPT_DIR, 'diag_*.py'))
+    )
+    for name in list(names) + list(extra_modules):
+        importlib.import_module(name)
+
+
+def run_one(name):
+    """Run a single registered check on a pooled read-only connection"""
+    func, _ = CHECKS[name]
+    started = time.perf_counter()
+    try:
+        with connection() as conn:
+            conn.set_session(readonly=True)
+            try:
+                data = func(conn) or {}
+            finally:
+                conn.rollback()
+                conn.set_session(readonly=False)
+        status = 'warn' if data.get('issues') else 'ok'
+        error = None
+    except Exception as e:
+        data = {}
+        status = 'error'
+        error = f"{type(e).__name__}: {e}"
+    return {
+        'name': name,
+        'status': status,
+        'wall_time_ms': round((time.perf_counter() - started) * 1000, 2),
+        'error': error,
+        'result': data,
+    }
+
+
+def run_checks(names=None, workers=4):
+    """Run the selected checks concurrently and return the combined report"""
+    names = list(names or CHECKS)
+    unknown = [n for n in names if n not in CHECKS]
+    if unknown:
+        raise KeyError(f"Unknown checks: {', '.join(unknown)}")
+
+    # لا يمكن تشغيل فحوصات أكثر من عدد اتصالات الـ pool في نفس الوقت
+    workers = max(1, min(workers, POOL_MAX_SIZE))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_one, names))
+
+    config = load_config()
+    summary = {'ok': 0, 'warn': 0, 'error': 0}
+    for result in results:
+        summary[result['status']] += 1
+
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'database': f"{config['host']}:{config['port']}/{config['database']}",
+        'total_wall_time_ms': round((time.perf_counter() - started) * 1000, 2),
+        'summary': summary,
+        'checks': results,
+    }
+
+
+def print_report(report):
+    """Print a short human-readable summary to stderr"""
+    icons = {'ok': '✅', 'warn': '⚠️ ', 'error': '❌'}
+    print("=" * 60, file=sys.stderr)
+    print(f"DIAGNOSTICS - {report['database']}", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+    for result in report['checks']:
+        line = f"{icons[result['status']]} {result['name']:<30} {result['wall_time_ms']:>9.1f} ms"
+        if result['error']:
+            line += f"  {result['error']}"
+        elif result['result'].get('issues'):
+            line += f"  {len(result['result']['issues'])} issue(s)"
+        print(line, file=sys.stderr)
+    summary = report['summary']
+    print("-" * 60, file=sys.stderr)
+    print(f"ok: {summary['ok']}  warn: {summary['warn']}  error: {summary['error']}  "
+          f"total: {report['total_wall_time_ms']:.1f} ms", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run database diagnostics in one process")
+    parser.add_argument('checks', nargs='*', help="check names (default: all)")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent checks (default: 4)")
+    parser.add_argument('--plugin', action='append', default=[], help="extra plugin module to import")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    parser.add_argument('--list', action='store_true', help="list registered checks and exit")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+        sys.stderr.reconfigure(encoding='utf-8')
+
+    load_plugins(args.plugin)
+
+    if args.list:
+        for name, (_, description) in sorted(CHECKS.items()):
+            print(f"{name:<30} {description}")
+        return 0
+
+    try:
+        report = run_checks(args.checks, workers=args.workers)
+    finally:
+        close_pool()
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+    print_report(report)
+    return 1 if report['summary']['error'] else 0
+
+
+if __name__ == "__main__":
+    # plugins import "diagnostics" - make them share this module's registry
+    sys.modules.setdefault('diagnostics', sys.modules[__name__])
+    sys.exit(main())
@@ -5,7 +5,6 @@
 يقوم بتحديث البيانات الموجودة بدلاً من حذفها
 """
 
-import psycopg2
 import bcrypt
 from datetime import datetime
 import sys
@@ -15,18 +14,8 @@ if sys.platform == 'win32':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-# معلومات الاتصال بقاعدة البيانات
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'graceway_accounting',
-    'user': 'postgres',
-    'password': '123456'
-}
-
-def get_connection():
-    """إنشاء اتصال مع قاعدة البيانات"""
-    return psycopg2.connect(**DB_CONFIG)
+# إعدادات الاتصال موحدة في db_pool.py
+from db_pool import get_connection
 
 def fix_permissions_system(cursor):
     """إصلاح نظام الصلاحيات بالكامل"""
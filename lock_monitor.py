@@ -0,0 +1,410 @@
+"""
+Lock Contention Monitor
+مراقبة انتظار الأقفال وسلاسل الحجب لحظياً على graceway_accounting
+
+Samples pg_locks joined with pg_stat_activity every --interval seconds (0.5
+by default) on one dedicated autocommit connection. Each sample:
+
+  - rebuilds the blocking chains from pg_blocking_pids(): the session at the
+    root holds the lock, everything under it waits, with the locked row
+    (table, ctid and its cashboxcode / vouchernumber) when PostgreSQL
+    exposes a tuple lock for the wait
+  - charges the time since the previous sample to every waiting session's
+    query fingerprint (literals and $n parameters folded to ?) and table
+
+Every --window seconds one JSON line with the totals, the longest single
+wait per fingerprint, and the chains at the window's peak is appended to
+the time-series file, which rolls over at --max-bytes keeping --keep old
+files. pg_blocking_pids() only runs for sessions that are actually waiting,
+so an idle database costs one small query per sample. Seeing other users'
+queries needs superuser or pg_read_all_stats.
+
+log_lock_waits (configure_postgres_multiuser.sql) only reports waits longer
+than deadlock_timeout, after the fact; this shows them while they happen.
+
+Usage:
+    python lock_monitor.py                         # run until Ctrl+C
+    python lock_monitor.py --interval 0.25 --window 30 --file locks.jsonl
+    python lock_monitor.py --once                  # print current chains and exit
+    python lock_monitor.py --report                # top fingerprints/tables from the file
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+
+from db_pool import get_connection
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FILE = os.path.join(SCRIPT_DIR, 'lock_monitor.jsonl')
+
+QUERY_CHARS = 2000
+
+# Tables whose locked rows are worth naming: table -> business key column
+KEY_COLUMNS = {
+    'cashboxes': 'cashboxcode',
+    'cashtransactions': 'vouchernumber',
+}
+
+# One row per waiting session and per session blocking one. A waiter that
+# queued on the row itself holds a granted tuple lock while it waits for the
+# holder's transactionid; the later ones wait on the tuple lock directly.
+SAMPLE_SQL = """
+    WITH locks AS (
+        SELECT pid, locktype, mode, granted, relation, page, tuple
+        FROM pg_locks
+        WHERE NOT granted OR locktype = 'tuple'
+    ),
+    waiting AS (
+        SELECT l.pid, l.locktype, l.mode,
+               COALESCE(l.relation, t.relation) AS relation,
+               COALESCE(l.page, t.page) AS page,
+               COALESCE(l.tuple, t.tuple) AS tuple,
+               pg_blocking_pids(l.pid) AS blocked_by
+        FROM locks l
+        LEFT JOIN locks t ON t.pid = l.pid AND t.granted AND t.locktype = 'tuple'
+        WHERE NOT l.granted AND l.pid <> pg_backend_pid()
+    )
+    SELECT a.pid, a.usename, a.application_name, host(a.client_addr), a.state,
+           EXTRACT(EPOCH FROM now() - a.xact_start), left(a.query, %s),
+           w.locktype, w.mode, w.relation::regclass::text, w.page, w.tuple, w.blocked_by
+    FROM pg_stat_activity a
+    LEFT JOIN waiting w ON w.pid = a.pid
+    WHERE a.datname = current_database()
+      AND (w.pid IS NOT NULL OR a.pid IN (SELECT unnest(blocked_by) FROM waiting))
+"""
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"--[^\n]*|/\*.*?\*/", re.S), ' '),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r"\$\d+"), '?'),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), '?'),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), '(?)'),
+    (re.compile(r"\s+"), ' '),
+]
+
+
+def fingerprint(query):
+    """(id, normalized text) - the same statement with different values maps to one id"""
+    text = query or ''
+    for pattern, replacement in _FINGERPRINT_RULES:
+        text = pattern.sub(replacement, text)
+    text = text.strip().lower()
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:12], text
+
+
+# ============================================
+# Sampling
+# ============================================
+
+class Session:
+    """One backend in a sample; lock fields are None for a pure blocker"""
+
+    def __init__(self, row):
+        (self.pid, self.user, self.application, self.client, self.state, xact_s, self.query,
+         self.locktype, self.mode, self.table, page, tuple_, blocked_by) = row
+        self.xact_s = round(float(xact_s), 3) if xact_s is not None else None
+        self.ctid = f"({page},{tuple_})" if page is not None and tuple_ is not None else None
+        self.blocked_by = list(blocked_by or [])
+        self.row_key = None
+        self.fingerprint, self.normalized = fingerprint(self.query)
+
+    @property
+    def waiting(self):
+        return self.locktype is not None
+
+    def describe(self):
+        info = {'pid': self.pid, 'user': self.user, 'application': self.application,
+                'state': self.state, 'xact_s': self.xact_s, 'fingerprint': self.fingerprint,
+                'query': (self.query or '')[:200]}
+        if self.waiting:
+            info.update(lock=f"{self.mode} {self.locktype}", table=self.table, ctid=self.ctid, row=self.row_key)
+        return info
+
+
+def sample(cur):
+    """Return {pid: Session} for every waiting or blocking backend right now"""
+    cur.execute(SAMPLE_SQL, (QUERY_CHARS,))
+    sessions = {row[0]: Session(row) for row in cur.fetchall()}
+    keys = {}
+    for s in sessions.values():
+        table = (s.table or '').split('.')[-1].strip('"').lower()
+        if s.ctid is None or table not in KEY_COLUMNS:
+            continue
+        if (table, s.ctid) not in keys:
+            cur.execute(f"SELECT {KEY_COLUMNS[table]} FROM {table} WHERE ctid = %s::tid", (s.ctid,))
+            row = cur.fetchone()
+            keys[(table, s.ctid)] = row[0] if row else None
+        s.row_key = keys[(table, s.ctid)]
+    return sessions
+
+
+def blocking_chains(sessions):
+    """Trees rooted at sessions that block others without waiting themselves"""
+    waiters = {}
+    for s in sessions.values():
+        for blocker in s.blocked_by:
+            waiters.setdefault(blocker, []).append(s.pid)
+
+    def tree(pid, seen):
+        node = sessions[pid].describe() if pid in sessions else {'pid': pid}
+        node['waiters'] = [tree(w, seen | {pid}) for w in sorted(waiters.get(pid, [])) if w not in seen]
+        return node
+
+    roots = [pid for pid in waiters if not (pid in sessions and sessions[pid].waiting)]
+    if not roots and waiters:
+        # every blocker also waits: a lock cycle the deadlock detector has not broken yet
+        roots = [min(waiters)]
+    return [tree(pid, set()) for pid in sorted(roots)]
+
+
+def print_chain(node, depth=0):
+    pad = '    ' * depth
+    if node.get('lock'):
+        target = ' '.join(str(part) for part in (node['table'] or '-', node['ctid'], node['row']) if part)
+        lock = f"  waits {node['lock']} on {target}"
+    else:
+        lock = f"  holds, xact {node.get('xact_s')}s"
+    print(f"{pad}{'└─ ' if depth else ''}pid {node['pid']} {node.get('user') or ''} "
+          f"[{node.get('application') or ''}]{lock}")
+    if node.get('query'):
+        print(f"{pad}   {' '.join(node['query'].split())[:120]}")
+    for child in node['waiters']:
+        print_chain(child, depth + 1)
+
+
+# ============================================
+# Windows and the rolling file
+# ============================================
+
+class Window:
+    """Wait totals between two writes to the time-series file"""
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.samples = 0
+        self.sample_ms = []
+        self.max_waiting = 0
+        self.peak_chains = []
+        self.tables = {}
+        self.fingerprints = {}
+
+    def add(self, sessions, elapsed, sample_ms, episodes):
+        self.samples += 1
+        self.sample_ms.append(sample_ms)
+        waiting = [s for s in sessions.values() if s.waiting]
+        if waiting and len(waiting) >= self.max_waiting:
+            self.max_waiting = len(waiting)
+            self.peak_chains = blocking_chains(sessions)
+        for s in waiting:
+            new = (s.pid, s.fingerprint) not in episodes
+            table = self.tables.setdefault(s.table or '(transaction)', {'wait_s': 0.0, 'waits': 0})
+            table['wait_s'] += elapsed
+            table['waits'] += new
+            fp = self.fingerprints.setdefault(s.fingerprint, {'wait_s': 0.0, 'waits': 0, 'max_wait_s': 0.0,
+                                                              'query': s.normalized[:300]})
+            fp['wait_s'] += elapsed
+            fp['waits'] += new
+            fp['max_wait_s'] = max(fp['max_wait_s'], episodes.get((s.pid, s.fingerprint), 0.0) + elapsed)
+
+    def record(self):
+        timings = sorted(self.sample_ms)
+        for totals in list(self.tables.values()) + list(self.fingerprints.values()):
+            for key in ('wait_s', 'max_wait_s'):
+                if key in totals:
+                    totals[key] = round(totals[key], 3)
+        return {
+            'ts': self.started.isoformat(timespec='seconds'),
+            'window_s': round((datetime.now() - self.started).total_seconds(), 1),
+            'samples': self.samples,
+            'sample_ms_p50': round(timings[len(timings) // 2], 2) if timings else 0.0,
+            'sample_ms_max': round(timings[-1], 2) if timings else 0.0,
+            'max_waiting': self.max_waiting,
+            'tables': self.tables,
+            'fingerprints': self.fingerprints,
+            'chains': self.peak_chains,
+        }
+
+
+class RollingFile:
+    """Append-only JSON lines; path -> path.1 -> ... -> path.keep once it passes max_bytes"""
+
+    def __init__(self, path, max_bytes, keep):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep = keep
+
+    def append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        if os.path.getsize(self.path) >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        for n in range(self.keep - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{n}"):
+                os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+        if self.keep:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def files(self):
+        """Oldest first"""
+        rotated = [f"{self.path}.{n}" for n in range(self.keep, 0, -1)]
+        return [p for p in rotated + [self.path] if os.path.exists(p)]
+
+
+# ============================================
+# Commands
+# ============================================
+
+def open_monitor_connection():
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SET application_name = 'lock_monitor'")
+    cur.execute("SET statement_timeout = '2s'")
+    return conn, cur
+
+
+def monitor(args, out):
+    conn, cur = open_monitor_connection()
+    window = Window()
+    episodes = {}   # (pid, fingerprint) -> seconds waited so far
+    last = time.monotonic()
+    next_sample = last
+    print(f"Sampling every {args.interval}s, writing {args.window}s windows to {out.path} (Ctrl+C to stop)")
+    try:
+        while True:
+            next_sample += args.interval
+            started = time.monotonic()
+            try:
+                sessions = sample(cur)
+            except psycopg2.OperationalError as e:
+                print(f"⚠️  {str(e).strip()} - reconnecting")
+                time.sleep(max(args.interval, 1))
+                conn.close()
+                conn, cur = open_monitor_connection()
+                last = next_sample = time.monotonic()
+                episodes.clear()
+                continue
+            now = time.monotonic()
+            elapsed = now - last
+            last = now
+            window.add(sessions, elapsed, (now - started) * 1000, episodes)
+            episodes = {(s.pid, s.fingerprint): episodes.get((s.pid, s.fingerprint), 0.0) + elapsed
+                        for s in sessions.values() if s.waiting}
+
+            if (datetime.now() - window.started).total_seconds() >= args.window:
+                record = window.record()
+                out.append(record)
+                print_window(record)
+                window = Window()
+            time.sleep(max(0, next_sample - time.monotonic()))
+    except KeyboardInterrupt:
+        if window.samples:
+            out.append(window.record())
+    finally:
+        conn.close()
+    return 0
+
+
+def print_window(record):
+    if not record['fingerprints']:
+        print(f"{record['ts']}  no lock waits ({record['samples']} samples, p50 {record['sample_ms_p50']}ms)")
+        return
+    table, totals = max(record['tables'].items(), key=lambda item: item[1]['wait_s'])
+    print(f"{record['ts']}  ⚠️  peak {record['max_waiting']} waiting, "
+          f"{sum(t['wait_s'] for t in record['tables'].values()):.1f}s waited, most on {table} ({totals['wait_s']}s)")
+
+
+def once():
+    conn, cur = open_monitor_connection()
+    try:
+        chains = blocking_chains(sample(cur))
+    finally:
+        conn.close()
+    if not chains:
+        print("✅ No session is waiting on a lock")
+        return 0
+    for chain in chains:
+        print_chain(chain)
+        print()
+    return 1
+
+
+def report(out, top):
+    tables, fingerprints = {}, {}
+    first = last = None
+    windows = 0
+    for path in out.files():
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                windows += 1
+                first = first or record['ts']
+                last = record['ts']
+                for name, totals in record['tables'].items():
+                    t = tables.setdefault(name, {'wait_s': 0.0, 'waits': 0})
+                    t['wait_s'] += totals['wait_s']
+                    t['waits'] += totals['waits']
+                for fp, totals in record['fingerprints'].items():
+                    t = fingerprints.setdefault(fp, {'wait_s': 0.0, 'waits': 0, 'max_wait_s': 0.0,
+                                                     'query': totals['query']})
+                    t['wait_s'] += totals['wait_s']
+                    t['waits'] += totals['waits']
+                    t['max_wait_s'] = max(t['max_wait_s'], totals['max_wait_s'])
+    if not windows:
+        print(f"❌ No samples in {out.path}")
+        return 1
+
+    print(f"{windows} windows, {first} .. {last}\n")
+    print(f"{'table':<30} {'wait s':>10} {'waits':>7}")
+    for name, t in sorted(tables.items(), key=lambda item: -item[1]['wait_s'])[:top]:
+        print(f"{name:<30} {t['wait_s']:>10.1f} {t['waits']:>7}")
+    print(f"\n{'fingerprint':<13} {'wait s':>10} {'waits':>7} {'max s':>7}  query")
+    for fp, t in sorted(fingerprints.items(), key=lambda item: -item[1]['wait_s'])[:top]:
+        print(f"{fp:<13} {t['wait_s']:>10.1f} {t['waits']:>7} {t['max_wait_s']:>7.1f}  {t['query'][:90]}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sample lock waits and blocking chains")
+    parser.add_argument('--interval', type=float, default=0.5, help="seconds between samples (default: 0.5)")
+    parser.add_argument('--window', type=float, default=10, help="seconds per time-series record (default: 10)")
+    parser.add_argument('--file', default=DEFAULT_FILE, help="time-series file (JSON lines)")
+    parser.add_argument('--max-bytes', type=int, default=10 * 1024 * 1024, help="roll the file at this size")
+    parser.add_argument('--keep', type=int, default=5, help="rolled files to keep (default: 5)")
+    parser.add_argument('--once', action='store_true', help="print the current blocking chains and exit")
+    parser.add_argument('--report', action='store_true', help="summarize the time-series file")
+    parser.add_argument('--top', type=int, default=15, help="rows per table in --report")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    out = RollingFile(args.file, args.max_bytes, args.keep)
+    if args.report:
+        return report(out, args.top)
+    try:
+        if args.once:
+            return once()
+        return monitor(args, out)
+    except psycopg2.Error as e:
+        print(f"❌ {str(e).strip()}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,696 @@
+"""
+Migration Runner
+تطبيق تعديلات قاعدة البيانات بالترتيب مع تسجيل ما تم تطبيقه
+
+Migrations are declared once in migrations.py as an ordered list of steps
+and applied to either database through a small dialect layer:
+
+    python migrate.py                   # PostgreSQL (graceway_accounting)
+    python migrate.py --sqlite          # accountant.db (or --sqlite PATH)
+
+Each migration is recorded in schema_migrations once every step has
+finished, so it runs exactly once per database.
+
+Steps
+  AddColumn         add a column if it is missing
+  DropColumn        drop a column if it exists
+  AlterColumnType   change a column's type
+  Backfill          UPDATE existing rows
+  CreateIndex       create an index if it is missing
+  Sql               raw statement, optionally for one dialect only
+
+Types are written in PostgreSQL spelling (TEXT, NUMERIC, VARCHAR(20),
+TIMESTAMP WITH TIME ZONE, BOOLEAN); SQLite gets the affinity the legacy
+scripts always used (TEXT, REAL, INTEGER).
+
+PostgreSQL keeps the desktop clients responsive while a migration runs:
+  - ADD COLUMN is metadata-only: nullable, or with a constant default
+    (PostgreSQL 11+ stores it in the catalog without rewriting the table).
+    Volatile defaults are rejected - add the column bare and backfill it.
+  - Backfills run in keyset batches (the next --batch-size keys after the
+    last one), one short transaction per batch with --pause in between.
+  - Indexes are built CONCURRENTLY.
+  - DDL runs under a short lock_timeout and is retried, so an ALTER that
+    cannot get its lock gives up instead of queueing everyone behind it.
+  - Backfills must be idempotent (their WHERE skips rows already done):
+    an interrupted migration is not recorded and simply runs again.
+
+SQLite has transactional DDL, so every pending migration runs inside one
+BEGIN IMMEDIATE ... COMMIT: a site either gets the whole batch or nothing.
+Changes ALTER TABLE cannot make (DropColumn on old SQLite, AlterColumnType,
+ADD COLUMN with a non-constant default) rebuild the table: create the new
+definition, copy the rows, drop, rename, and recreate indexes and triggers.
+The rebuilt definition comes from PRAGMA table_info / foreign_key_list /
+index_list, so CHECK constraints are not carried over.
+
+Usage:
+    python migrate.py --status
+    python migrate.py --dry-run
+    python migrate.py --batch-size 2000 --pause 0.5
+    python migrate.py --sqlite C:\\sites\\branch2\\accountant.db
+"""
+
+import argparse
+import re
+import sqlite3
+import sys
+import time
+
+import psycopg2
+from psycopg2 import errors
+
+from db_pool import SQLITE_PATH, get_connection, get_sqlite_connection
+from schema_resolver import quote_ident
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PAUSE = 0.2
+DEFAULT_LOCK_TIMEOUT = '3s'
+LOCK_RETRIES = 5
+
+# Defaults that force a table rewrite on ADD COLUMN in PostgreSQL
+_VOLATILE_DEFAULT = re.compile(r'\b(random|clock_timestamp|timeofday|nextval|gen_random_uuid|uuid_generate_v\d)\s*\(',
+                               re.I)
+
+# Defaults SQLite accepts without parentheses; PRAGMA table_info drops the
+# parentheses around any other (expression) default
+_SQLITE_LITERAL_DEFAULT = re.compile(
+    r"[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?|[+-]?0[xX][0-9a-fA-F]+|'([^']|'')*'|[xX]'[0-9a-fA-F]*'"
+    r"|NULL|TRUE|FALSE|CURRENT_TIME|CURRENT_DATE|CURRENT_TIMESTAMP", re.I)
+
+
+class MigrationError(Exception):
+    pass
+
+
+# ============================================
+# Steps
+# ============================================
+
+class AddColumn:
+    def __init__(self, table, column, col_type, default=None, not_null=False):
+        if default is not None and _VOLATILE_DEFAULT.search(default):
+            raise MigrationError(f"{table}.{column}: volatile default {default!r} rewrites the table; "
+                                 f"add the column without a default and backfill it")
+        if not_null and default is None:
+            raise MigrationError(f"{table}.{column}: NOT NULL needs a constant default")
+        self.table = table
+        self.column = column
+        self.col_type = col_type
+        self.default = default
+        self.not_null = not_null
+
+    def describe(self, dialect):
+        return dialect.add_column_sql(self)
+
+    def apply(self, dialect):
+        dialect.add_column(self)
+
+
+class DropColumn:
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+
+    def describe(self, dialect):
+        return f"ALTER TABLE {quote_ident(self.table)} DROP COLUMN {quote_ident(self.column)}"
+
+    def apply(self, dialect):
+        dialect.drop_column(self)
+
+
+class AlterColumnType:
+    """Change a column's type; `using` converts existing values (PostgreSQL only)"""
+
+    def __init__(self, table, column, col_type, using=None):
+        self.table = table
+        self.column = column
+        self.col_type = col_type
+        self.using = using
+
+    def describe(self, dialect):
+        return dialect.alter_column_type_sql(self)
+
+    def apply(self, dialect):
+        dialect.alter_column_type(self)
+
+
+class Backfill:
+    def __init__(self, table, key, assignments, where=None):
+        self.table = table
+        self.key = key
+        self.assignments = assignments
+        self.where = where
+
+    def describe(self, dialect):
+        sql = f"UPDATE {quote_ident(self.table)} SET {self.assignments}"
+        if self.where:
+            sql += f" WHERE {self.where}"
+        return sql + dialect.backfill_note(self)
+
+    def apply(self, dialect):
+        dialect.backfill(self)
+
+
+class CreateIndex:
+    def __init__(self, table, name, columns, unique=False):
+        self.table = table
+        self.name = name
+        self.columns = columns
+        self.unique = unique
+
+    def describe(self, dialect):
+        return dialect.create_index_sql(self)
+
+    def apply(self, dialect):
+        dialect.create_index(self)
+
+
+class Sql:
+    """Raw statement; `only='postgres'` or `only='sqlite'` limits it to one dialect"""
+
+    def __init__(self, statement, only=None):
+        self.statement = statement
+        self.only = only
+
+    def describe(self, dialect):
+        if self.only and self.only != dialect.name:
+            return f"(skipped: {self.only} only)"
+        return ' '.join(self.statement.split())
+
+    def apply(self, dialect):
+        if not self.only or self.only == dialect.name:
+            dialect.execute(self.statement)
+
+
+class Migration:
+    def __init__(self, version, description, steps):
+        self.version = version
+        self.description = description
+        self.steps = steps
+
+
+def progress(message, done=False):
+    print(f"    {message}", end='\n' if done else '\r')
+
+
+# ============================================
+# PostgreSQL
+# ============================================
+
+class PostgresDialect:
+    name = 'postgres'
+
+    VERSION_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(100) PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            duration_ms INTEGER
+        )
+    """
+
+    def __init__(self, conn, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE,
+                 lock_timeout=DEFAULT_LOCK_TIMEOUT):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lock_timeout = lock_timeout
+
+    def execute(self, sql, prepare=None):
+        """
+        Run one statement under lock_timeout, retrying when the lock is busy.
+        prepare(cursor), if given, runs before the statement on every attempt.
+        """
+        cur = self.conn.cursor()
+        for attempt in range(1, LOCK_RETRIES + 1):
+            try:
+                cur.execute("SET lock_timeout = %s", (self.lock_timeout,))
+                if prepare:
+                    prepare(cur)
+                cur.execute(sql)
+                cur.execute("RESET lock_timeout")
+                if not self.conn.autocommit:
+                    self.conn.commit()
+                return
+            except errors.LockNotAvailable:
+                if not self.conn.autocommit:
+                    self.conn.rollback()
+                if attempt == LOCK_RETRIES:
+                    raise
+                print(f"    lock busy, retry {attempt}/{LOCK_RETRIES - 1}...")
+                time.sleep(attempt)
+
+    # --- steps ---
+
+    def add_column_sql(self, step):
+        sql = (f"ALTER TABLE {quote_ident(step.table)} "
+               f"ADD COLUMN IF NOT EXISTS {quote_ident(step.column)} {step.col_type}")
+        if step.default is not None:
+            sql += f" DEFAULT {step.default}"
+        if step.not_null:
+            sql += " NOT NULL"
+        return sql
+
+    def add_column(self, step):
+        self.execute(self.add_column_sql(step))
+
+    def drop_column(self, step):
+        self.execute(f"ALTER TABLE {quote_ident(step.table)} DROP COLUMN IF EXISTS {quote_ident(step.column)}")
+
+    def alter_column_type_sql(self, step):
+        sql = (f"ALTER TABLE {quote_ident(step.table)} ALTER COLUMN {quote_ident(step.column)} "
+               f"TYPE {step.col_type}")
+        if step.using:
+            sql += f" USING {step.using}"
+        return sql
+
+    def alter_column_type(self, step):
+        self.execute(self.alter_column_type_sql(step))
+
+    def backfill_note(self, step):
+        return f"  -- in batches of {self.batch_size} by {step.key}"
+
+    def backfill(self, step):
+        table, key = quote_ident(step.table), quote_ident(step.key)
+        bound_sql = (f"SELECT MAX({key}) FROM (SELECT {key} FROM {table} "
+                     f"WHERE {key} > %s ORDER BY {key} LIMIT %s) batch")
+        update_sql = f"UPDATE {table} SET {step.assignments} WHERE {key} > %s AND {key} <= %s"
+        if step.where:
+            update_sql += f" AND ({step.where})"
+
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT MIN({key}) FROM {table}")
+        low = cur.fetchone()[0]
+        if low is None:
+            self.conn.commit()
+            return
+        # MIN - 1 works for integer keys, which is all the tables here use
+        low -= 1
+        updated = 0
+        while True:
+            cur.execute(bound_sql, (low, self.batch_size))
+            high = cur.fetchone()[0]
+            if high is None:
+                break
+            cur.execute(update_sql, (low, high))
+            updated += cur.rowcount
+            self.conn.commit()
+            progress(f"{step.table}: {updated} rows updated (up to {step.key} {high})")
+            low = high
+            time.sleep(self.pause)
+        self.conn.commit()
+        progress(f"{step.table}: {updated} rows updated", done=True)
+
+    def create_index_sql(self, step):
+        columns = ', '.join(quote_ident(c) for c in step.columns)
+        unique = 'UNIQUE ' if step.unique else ''
+        return (f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {quote_ident(step.name)} "
+                f"ON {quote_ident(step.table)} ({columns})")
+
+    INDEX_INVALID_SQL = """
+        SELECT NOT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    """
+
+    def create_index(self, step):
+        def drop_invalid(cur):
+            # a failed CONCURRENTLY build - including a lock timeout on the
+            # previous attempt - leaves an invalid index that IF NOT EXISTS would keep
+            cur.execute(self.INDEX_INVALID_SQL, (step.name,))
+            row = cur.fetchone()
+            if row and row[0]:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {quote_ident(step.name)}")
+
+        self.conn.commit()
+        self.conn.autocommit = True
+        try:
+            self.execute(self.create_index_sql(step), prepare=drop_invalid)
+            cur = self.conn.cursor()
+            cur.execute(self.INDEX_INVALID_SQL, (step.name,))
+            row = cur.fetchone()
+        finally:
+            self.conn.autocommit = False
+        if row is None or row[0]:
+            raise MigrationError(f"index {step.name} is missing or invalid after CREATE INDEX CONCURRENTLY")
+
+    # --- version table ---
+
+    def applied(self):
+        cur = self.conn.cursor()
+        cur.execute(self.VERSION_TABLE_SQL)
+        cur.execute("SELECT version, to_char(applied_at, 'YYYY-MM-DD HH24:MI') FROM schema_migrations")
+        applied = dict(cur.fetchall())
+        self.conn.commit()
+        return applied
+
+    def record(self, migration, duration_ms):
+        cur = self.conn.cursor()
+        cur.execute("INSERT INTO schema_migrations (version, description, duration_ms) VALUES (%s, %s, %s)",
+                    (migration.version, migration.description, duration_ms))
+        self.conn.commit()
+
+    def run(self, migrations):
+        """Apply pending migrations one by one; each step commits on its own"""
+        cur = self.conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(hashtext('schema_migrations'))")
+        if not cur.fetchone()[0]:
+            raise MigrationError("another migration runner is active")
+        self.conn.commit()
+        try:
+            return apply_pending(self, migrations)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(hashtext('schema_migrations'))")
+            self.conn.commit()
+
+
+# ============================================
+# SQLite
+# ============================================
+
+class SqliteDialect:
+    name = 'sqlite'
+
+    VERSION_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INTEGER
+        )
+    """
+
+    def __init__(self, conn):
+        # transactions are managed explicitly (BEGIN IMMEDIATE ... COMMIT)
+        conn.isolation_level = None
+        self.conn = conn
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    @staticmethod
+    def column_type(col_type):
+        """PostgreSQL type -> the affinity the SQLite schema uses"""
+        upper = col_type.upper()
+        if upper.startswith(('TIMESTAMP', 'DATE', 'TIME', 'VARCHAR', 'CHARACTER', 'TEXT', 'UUID')):
+            return 'TEXT'
+        if upper.startswith(('NUMERIC', 'DECIMAL', 'REAL', 'DOUBLE')):
+            return 'REAL'
+        if upper in ('INTEGER', 'BIGINT', 'SMALLINT', 'BOOLEAN'):
+            return 'INTEGER'
+        return col_type
+
+    @staticmethod
+    def column_default(default):
+        if default is None:
+            return None
+        return {'true': '1', 'false': '0', 'now()': 'CURRENT_TIMESTAMP'}.get(default.strip().lower(), default)
+
+    def columns(self, table):
+        """PRAGMA table_info as dicts, in column order"""
+        return [{'name': name, 'type': col_type, 'notnull': bool(notnull), 'default': default, 'pk': pk}
+                for _, name, col_type, notnull, default, pk
+                in self.execute(f"PRAGMA table_info({quote_ident(table)})").fetchall()]
+
+    def has_column(self, table, column):
+        return any(c['name'].lower() == column.lower() for c in self.columns(table))
+
+    # --- steps ---
+
+    def add_column_sql(self, step):
+        sql = (f"ALTER TABLE {quote_ident(step.table)} "
+               f"ADD COLUMN {quote_ident(step.column)} {self.column_type(step.col_type)}")
+        default = self.column_default(step.default)
+        if default is not None:
+            sql += f" DEFAULT {default}"
+        if step.not_null:
+            sql += " NOT NULL"
+        return sql
+
+    def add_column(self, step):
+        if self.has_column(step.table, step.column):
+            return
+        try:
+            self.execute(self.add_column_sql(step))
+        except sqlite3.OperationalError as e:
+            # e.g. "Cannot add a column with non-constant default"
+            if 'cannot add' not in str(e).lower():
+                raise
+            new_column = {'name': step.column, 'type': self.column_type(step.col_type),
+                          'notnull': step.not_null, 'default': self.column_default(step.default), 'pk': 0}
+            self.rebuild(step.table, lambda cols: cols + [new_column])
+
+    def drop_column(self, step):
+        if not self.has_column(step.table, step.column):
+            return
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            try:
+                self.execute(f"ALTER TABLE {quote_ident(step.table)} DROP COLUMN {quote_ident(step.column)}")
+                return
+            except sqlite3.OperationalError:
+                pass  # indexed / constrained columns need a rebuild
+        self.rebuild(step.table, lambda cols: [c for c in cols if c['name'].lower() != step.column.lower()])
+
+    def alter_column_type_sql(self, step):
+        return f"-- rebuild {step.table} with {step.column} {self.column_type(step.col_type)}"
+
+    def alter_column_type(self, step):
+        new_type = self.column_type(step.col_type)
+
+        def retype(cols):
+            return [dict(c, type=new_type) if c['name'].lower() == step.column.lower() else c for c in cols]
+        self.rebuild(step.table, retype)
+
+    def backfill_note(self, step):
+        return "  -- single UPDATE inside the migration transaction"
+
+    def backfill(self, step):
+        # the write lock is held for the whole transaction anyway, batching gains nothing
+        sql = f"UPDATE {quote_ident(step.table)} SET {step.assignments}"
+        if step.where:
+            sql += f" WHERE {step.where}"
+        updated = self.execute(sql).rowcount
+        progress(f"{step.table}: {updated} rows updated", done=True)
+
+    def create_index_sql(self, step):
+        columns = ', '.join(quote_ident(c) for c in step.columns)
+        unique = 'UNIQUE ' if step.unique else ''
+        return f"CREATE {unique}INDEX IF NOT EXISTS {quote_ident(step.name)} ON {quote_ident(step.table)} ({columns})"
+
+    def create_index(self, step):
+        self.execute(self.create_index_sql(step))
+
+    # --- table rebuild ---
+
+    def rebuild(self, table, transform):
+        """
+        Recreate `table` with the column list returned by transform(columns),
+        copying the rows of every column that survives. Must run inside the
+        migration transaction with foreign_keys off (see run()).
+        """
+        old_columns = self.columns(table)
+        new_columns = transform([dict(c) for c in old_columns])
+        kept = {c['name'].lower() for c in old_columns}
+        copied = [c['name'] for c in new_columns if c['name'].lower() in kept]
+
+        create_sql = self.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (table,)).fetchone()[0]
+        autoincrement = 'AUTOINCREMENT' in create_sql.upper()
+        removed = kept - {c['name'].lower() for c in new_columns}
+        dependents = []
+        for name, sql in self.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? "
+                "AND sql IS NOT NULL", (table,)).fetchall():
+            if self._references(sql, removed):
+                # an index or trigger on a dropped column cannot be recreated
+                progress(f"{table}: dropping {name} (uses a removed column)", done=True)
+            else:
+                dependents.append(sql)
+
+        pk_columns = sorted((c for c in new_columns if c['pk']), key=lambda c: c['pk'])
+        definitions = []
+        for c in new_columns:
+            definition = f"{quote_ident(c['name'])} {c['type']}".rstrip()
+            if len(pk_columns) == 1 and c['pk']:
+                definition += " PRIMARY KEY" + (" AUTOINCREMENT" if autoincrement else "")
+            if c['notnull']:
+                definition += " NOT NULL"
+            if c['default'] is not None:
+                default = c['default']
+                if not _SQLITE_LITERAL_DEFAULT.fullmatch(default.strip()):
+                    default = f"({default})"
+                definition += f" DEFAULT {default}"
+            definitions.append(definition)
+        if len(pk_columns) > 1:
+            definitions.append(f"PRIMARY KEY ({', '.join(quote_ident(c['name']) for c in pk_columns)})")
+        definitions += self._unique_constraints(table, new_columns)
+        definitions += self._foreign_keys(table, new_columns)
+
+        temp = f"_new_{table}"
+        self.execute(f"CREATE TABLE {quote_ident(temp)} ({', '.join(definitions)})")
+        column_list = ', '.join(quote_ident(c) for c in copied)
+        self.execute(f"INSERT INTO {quote_ident(temp)} ({column_list}) SELECT {column_list} FROM {quote_ident(table)}")
+        self.execute(f"DROP TABLE {quote_ident(table)}")
+        self.execute(f"ALTER TABLE {quote_ident(temp)} RENAME TO {quote_ident(table)}")
+        for sql in dependents:
+            try:
+                self.execute(sql)
+            except sqlite3.OperationalError as e:
+                raise MigrationError(f"{table}: could not recreate after rebuild ({e}): {sql}") from None
+        progress(f"{table}: rebuilt ({len(new_columns)} columns)", done=True)
+
+    @staticmethod
+    def _references(sql, columns):
+        """True when `sql` names any of `columns` outside a string literal"""
+        if not columns:
+            return False
+        sql = re.sub(r"'([^']|'')*'", "''", sql)
+        names = '|'.join(re.escape(c) for c in columns)
+        return re.search(rf"(?<![\w$])({names})(?![\w$])", sql, re.I) is not None
+
+    def _unique_constraints(self, table, columns):
+        names = {c['name'].lower() for c in columns}
+        constraints = []
+        for _, index, unique, origin, _ in self.execute(f"PRAGMA index_list({quote_ident(table)})").fetchall():
+            if origin != 'u':
+                continue
+            index_columns = [row[2] for row in self.execute(f"PRAGMA index_info({quote_ident(index)})").fetchall()]
+            if all(c.lower() in names for c in index_columns):
+                constraints.append(f"UNIQUE ({', '.join(quote_ident(c) for c in index_columns)})")
+        return constraints
+
+    def _foreign_keys(self, table, columns):
+        names = {c['name'].lower() for c in columns}
+        keys = {}
+        for fk_id, _, ref_table, from_col, to_col, on_update, on_delete, _ in self.execute(
+                f"PRAGMA foreign_key_list({quote_ident(table)})").fetchall():
+            key = keys.setdefault(fk_id, {'table': ref_table, 'from': [], 'to': [],
+                                          'on_update': on_update, 'on_delete': on_delete})
+            key['from'].append(from_col)
+            key['to'].append(to_col)
+        constraints = []
+        for key in keys.values():
+            if not all(c.lower() in names for c in key['from']):
+                continue
+            sql = (f"FOREIGN KEY ({', '.join(quote_ident(c) for c in key['from'])}) "
+                   f"REFERENCES {quote_ident(key['table'])}")
+            if all(key['to']):
+                sql += f" ({', '.join(quote_ident(c) for c in key['to'])})"
+            if key['on_update'] != 'NO ACTION':
+                sql += f" ON UPDATE {key['on_update']}"
+            if key['on_delete'] != 'NO ACTION':
+                sql += f" ON DELETE {key['on_delete']}"
+            constraints.append(sql)
+        return constraints
+
+    # --- version table ---
+
+    def applied(self):
+        self.execute(self.VERSION_TABLE_SQL)
+        return dict(self.execute("SELECT version, substr(applied_at, 1, 16) FROM schema_migrations").fetchall())
+
+    def record(self, migration, duration_ms):
+        self.execute("INSERT INTO schema_migrations (version, description, duration_ms) VALUES (?, ?, ?)",
+                     (migration.version, migration.description, duration_ms))
+
+    def run(self, migrations):
+        """Apply every pending migration in one transaction"""
+        foreign_keys = self.execute("PRAGMA foreign_keys").fetchone()[0]
+        # table rebuilds drop the old table; must be set outside the transaction
+        self.execute("PRAGMA foreign_keys = OFF")
+        try:
+            self.execute("BEGIN IMMEDIATE")
+            try:
+                applied = apply_pending(self, migrations)
+                violations = self.execute("PRAGMA foreign_key_check").fetchall()
+                if violations:
+                    raise MigrationError(f"foreign key violations after migration: {violations[:5]}")
+                self.execute("COMMIT")
+            except BaseException:
+                self.execute("ROLLBACK")
+                raise
+            return applied
+        finally:
+            self.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+
+
+# ============================================
+# Runner
+# ============================================
+
+def pending(dialect, migrations):
+    applied = dialect.applied()
+    return [m for m in migrations if m.version not in applied]
+
+
+def apply_pending(dialect, migrations):
+    applied = []
+    for migration in pending(dialect, migrations):
+        print(f"\n📦 {migration.version}: {migration.description}")
+        started = time.perf_counter()
+        for step in migration.steps:
+            print(f"  → {step.describe(dialect)}")
+            step.apply(dialect)
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        dialect.record(migration, duration_ms)
+        print(f"✅ {migration.version} done in {duration_ms} ms")
+        applied.append(migration.version)
+    return applied
+
+
+def check_versions(migrations):
+    versions = [m.version for m in migrations]
+    if versions != sorted(versions) or len(set(versions)) != len(versions):
+        raise MigrationError("migration versions must be unique and in ascending order")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply pending database migrations")
+    parser.add_argument('--sqlite', nargs='?', const=SQLITE_PATH, metavar='PATH',
+                        help=f"migrate a SQLite database instead (default: {SQLITE_PATH})")
+    parser.add_argument('--status', action='store_true', help="list applied and pending migrations")
+    parser.add_argument('--dry-run', action='store_true', help="print the steps without running them")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="rows per backfill batch")
+    parser.add_argument('--pause', type=float, default=DEFAULT_PAUSE, help="seconds to sleep between batches")
+    parser.add_argument('--lock-timeout', default=DEFAULT_LOCK_TIMEOUT, help="lock_timeout for DDL, e.g. 3s")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    from migrations import MIGRATIONS
+    check_versions(MIGRATIONS)
+
+    if args.sqlite:
+        conn = get_sqlite_connection(args.sqlite)
+        dialect = SqliteDialect(conn)
+    else:
+        conn = get_connection()
+        dialect = PostgresDialect(conn, args.batch_size, args.pause, args.lock_timeout)
+    try:
+        if args.status:
+            applied = dialect.applied()
+            for m in MIGRATIONS:
+                mark = f"✅ {applied[m.version]}" if m.version in applied else "⏳ pending"
+                print(f"{mark:<20} {m.version}  {m.description}")
+            return 0
+        if args.dry_run:
+            for m in pending(dialect, MIGRATIONS):
+                print(f"\n📦 {m.version}: {m.description}")
+                for step in m.steps:
+                    print(f"  → {step.describe(dialect)}")
+            return 0
+        applied = dialect.run(MIGRATIONS)
+        print(f"\n✅ {len(applied)} migration(s) applied" if applied else "✅ Database is up to date")
+        return 0
+    except (MigrationError, psycopg2.Error, sqlite3.Error) as e:
+        print(f"\n❌ {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # migrations.py imports "migrate" - make it share this module's classes
+    sys.modules.setdefault('migrate', sys.modules[__name__])
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Database migrations, applied in order by migrate.py
+قائمة التعديلات على قاعدة البيانات - أضف الجديد في آخر القائمة فقط
+
+Each migration is written once and runs on both PostgreSQL and accountant.db
+(python migrate.py / python migrate.py --sqlite). Use PostgreSQL type names;
+the SQLite dialect maps them. Never edit a migration that has been applied
+somewhere; add a new one.
+"""
+
+from migrate import AddColumn, Backfill, CreateIndex, Migration, Sql
+
+MIGRATIONS = [
+    # Replaces apply_currency_migration.py
+    Migration('20260201_cashtransactions_currency', "Currency support for cash transactions", [
+        AddColumn('cashtransactions', 'TransactionCurrency', 'TEXT', default="'EGP'", not_null=True),
+        AddColumn('cashtransactions', 'ExchangeRateUsed', 'NUMERIC'),
+        AddColumn('cashtransactions', 'OriginalAmount', 'NUMERIC'),
+        AddColumn('cashtransactions', 'UpdatedBy', 'INTEGER'),
+        AddColumn('cashtransactions', 'updatedat', 'TIMESTAMP WITH TIME ZONE'),
+        Backfill('cashtransactions', 'transactionid', """"TransactionCurrency" = 'EGP'""",
+                 where=""""TransactionCurrency" = ''"""),
+    ]),
+
+    # Replaces migrate_flight_bookings.py (existing rows belong to the admin user)
+    Migration('20260205_flightbookings_created_by', "Track who created each flight booking", [
+        AddColumn('flightbookings', 'createdbyuserid', 'INTEGER', default='1', not_null=True),
+        CreateIndex('flightbookings', 'ix_flightbookings_createdbyuserid', ['createdbyuserid']),
+    ]),
+
+    # Replaces apply_room_migration.py (SQLite) and add_room_columns_to_umrahpilgrims.sql /
+    # the AddRoomFieldsToUmrahPilgrim EF migration (PostgreSQL)
+    Migration('20260218_umrahpilgrims_room_fields', "Room type and shared room number for pilgrims", [
+        AddColumn('umrahpilgrims', 'roomtype', 'INTEGER'),
+        AddColumn('umrahpilgrims', 'sharedroomnumber', 'VARCHAR(20)'),
+        CreateIndex('umrahpilgrims', 'ix_umrahpilgrims_sharedroomnumber', ['sharedroomnumber']),
+    ]),
+
+    # Natural keys for seed_permissions.py (INSERT ... ON CONFLICT); duplicates left
+    # by earlier fix scripts are merged into the lowest id first
+    Migration('20260301_permission_natural_keys', "Unique permission type, role name and role/permission pair", [
+        Sql("""
+            UPDATE rolepermissions SET permissionid = (
+                SELECT MIN(p2.permissionid) FROM permissions p1
+                JOIN permissions p2 ON p2."PermissionType" = p1."PermissionType"
+                WHERE p1.permissionid = rolepermissions.permissionid)
+        """),
+        Sql("""
+            DELETE FROM permissions WHERE permissionid NOT IN (
+                SELECT MIN(permissionid) FROM permissions GROUP BY "PermissionType")
+        """),
+        Sql("""
+            UPDATE users SET roleid = (
+                SELECT MIN(r2.roleid) FROM roles r1
+                JOIN roles r2 ON r2.rolename = r1.rolename
+                WHERE r1.roleid = users.roleid)
+            WHERE roleid IS NOT NULL
+        """),
+        Sql("""
+            UPDATE rolepermissions SET roleid = (
+                SELECT MIN(r2.roleid) FROM roles r1
+                JOIN roles r2 ON r2.rolename = r1.rolename
+                WHERE r1.roleid = rolepermissions.roleid)
+        """),
+        Sql("DELETE FROM roles WHERE roleid NOT IN (SELECT MIN(roleid) FROM roles GROUP BY rolename)"),
+        Sql("""
+            DELETE FROM rolepermissions WHERE rolepermissionid NOT IN (
+                SELECT MIN(rolepermissionid) FROM rolepermissions GROUP BY roleid, permissionid)
+        """),
+        CreateIndex('permissions', 'ux_permissions_permissiontype', ['PermissionType'], unique=True),
+        CreateIndex('roles', 'ux_roles_rolename', ['rolename'], unique=True),
+        CreateIndex('rolepermissions', 'ux_rolepermissions_roleid_permissionid', ['roleid', 'permissionid'],
+                    unique=True),
+    ]),
+]
@@ -1,19 +1,16 @@
-import psycopg2
 from datetime import datetime
 import sys
 
+# إعدادات الاتصال موحدة في db_pool.py
+from db_pool import get_connection
+
 # Fix encoding for Windows console
 if sys.platform == 'win32':
     import codecs
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
 
 try:
-    conn = psycopg2.connect(
-        host="localhost",
-        database="graceway_accounting",
-        user="postgres",
-        password="123456"
-    )
+    conn = get_connection()
     
     c = conn.cursor()
     
@@ -0,0 +1,279 @@
+"""
+Permission Resolver
+تحليل صلاحيات الأدوار باستخدام bitsets - تحميل واحد لكل الأسئلة
+
+Loads roles, permissions and rolepermissions once and keeps each role's
+permissions as a Python int with bit N set for PermissionType N. Every
+question is then bitwise arithmetic instead of another COUNT(*) JOIN:
+
+    which roles have X      bits >> X & 1
+    modules per role        bits & module_mask != 0
+    overlap of two roles    a & b
+    diff of two roles       a & ~b, b & ~a
+
+permission_rules.json lists forbidden combinations, all checked in one pass.
+A rule fires for a role that holds something from every entry of "all_of"
+(an entry is a PermissionType member, a number, or "module:<Module>" meaning
+any permission in that module), optionally limited to "roles" or skipping
+"except_roles".
+
+Usage:
+    python permission_resolver.py                          # roles x modules + rules
+    python permission_resolver.py --who-has ViewTrips
+    python permission_resolver.py --modules "Aviation and Umrah"
+    python permission_resolver.py --diff Administrator "Operations Department"
+    python permission_resolver.py --conflicts
+    python permission_resolver.py --seed                   # check permissions_seed.json instead
+    python permission_resolver.py --sqlite                 # read accountant.db
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from db_pool import SQLITE_PATH, close_pool, connection, get_sqlite_connection
+from schema_resolver import parse_enums
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RULES_PATH = os.path.join(SCRIPT_DIR, 'permission_rules.json')
+
+PERMISSIONS_QUERY = 'SELECT "PermissionType", permissionname, "Module" FROM permissions'
+
+ROLE_PERMISSIONS_QUERY = """
+    SELECT r.rolename, p."PermissionType"
+    FROM roles r
+    LEFT JOIN rolepermissions rp ON rp.roleid = r.roleid
+    LEFT JOIN permissions p ON p.permissionid = rp.permissionid
+"""
+
+
+def bit_count(bits):
+    return bin(bits).count('1')
+
+
+def iter_bits(bits):
+    """Set bit positions (PermissionType values), lowest first"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class PermissionIndex:
+    def __init__(self, permissions, role_types, enum=None):
+        """
+        permissions: {permission type: (name, module)}
+        role_types:  {role name: iterable of permission types}
+        """
+        self.permissions = permissions
+        self.enum = enum if enum is not None else parse_enums().get('PermissionType', {})
+        self.type_names = {value: name for name, value in self.enum.items()}
+        self.module_masks = {}
+        for perm_type, (_, module) in permissions.items():
+            self.module_masks[module] = self.module_masks.get(module, 0) | (1 << perm_type)
+        self.roles = {}
+        for role, types in role_types.items():
+            bits = 0
+            for perm_type in types:
+                if perm_type is not None:
+                    bits |= 1 << perm_type
+            self.roles[role] = bits
+
+    @classmethod
+    def load(cls, conn):
+        """Two queries for the whole permission model (PostgreSQL or SQLite connection)"""
+        cur = conn.cursor()
+        cur.execute(PERMISSIONS_QUERY)
+        permissions = {perm_type: (name, module) for perm_type, name, module in cur.fetchall()}
+        cur.execute(ROLE_PERMISSIONS_QUERY)
+        role_types = {}
+        for role, perm_type in cur.fetchall():
+            role_types.setdefault(role, []).append(perm_type)
+        cur.close()
+        return cls(permissions, role_types)
+
+    @classmethod
+    def from_seed(cls, path=None):
+        """Build the index from permissions_seed.json (before it is applied)"""
+        from seed_permissions import DEFAULT_SEED_PATH, load_seed
+
+        permissions, roles = load_seed(path or DEFAULT_SEED_PATH)
+        return cls({p[0]: (p[1], p[3]) for p in permissions},
+                   {name: types for name, (_, types) in roles.items()})
+
+    # --- lookups ---
+
+    def mask(self, ref):
+        """Bits for a PermissionType member/number or "module:<Module>" """
+        if isinstance(ref, str) and ref.startswith('module:'):
+            module = ref.split(':', 1)[1]
+            if module not in self.module_masks:
+                raise KeyError(f"unknown module '{module}'")
+            return self.module_masks[module]
+        if isinstance(ref, str) and not ref.isdigit():
+            if ref not in self.enum:
+                raise KeyError(f"unknown PermissionType '{ref}'")
+            return 1 << self.enum[ref]
+        return 1 << int(ref)
+
+    def role_bits(self, role):
+        if role not in self.roles:
+            raise KeyError(f"unknown role '{role}'")
+        return self.roles[role]
+
+    def label(self, perm_type):
+        name = self.permissions.get(perm_type, ('?', None))[0]
+        return f"{self.type_names.get(perm_type, perm_type)} ({name})"
+
+    def roles_with(self, ref):
+        """Roles holding any permission in ref"""
+        mask = self.mask(ref)
+        return [role for role, bits in self.roles.items() if bits & mask]
+
+    def modules(self, role):
+        """{module: (granted, total)} for every module the role touches"""
+        bits = self.role_bits(role)
+        return {module: (bit_count(bits & mask), bit_count(mask))
+                for module, mask in sorted(self.module_masks.items()) if bits & mask}
+
+    def permissions_by_module(self, role):
+        """{module: [permission types]} - the map SidebarControl works from"""
+        return self._by_module(self.role_bits(role))
+
+    def overlap(self, role_a, role_b):
+        """{module: [permission types]} held by both roles"""
+        return self._by_module(self.role_bits(role_a) & self.role_bits(role_b))
+
+    def diff(self, role_a, role_b):
+        """(only in a, only in b), each {module: [permission types]}"""
+        a, b = self.role_bits(role_a), self.role_bits(role_b)
+        return self._by_module(a & ~b), self._by_module(b & ~a)
+
+    def _by_module(self, bits):
+        grouped = {}
+        for module, mask in sorted(self.module_masks.items()):
+            if bits & mask:
+                grouped[module] = list(iter_bits(bits & mask))
+        return grouped
+
+    # --- rules ---
+
+    def check_rules(self, rules):
+        """Return [(rule name, role, offending permission types)] for every violation"""
+        violations = []
+        for rule in rules:
+            masks = [self.mask(ref) for ref in rule['all_of']]
+            candidates = rule.get('roles') or list(self.roles)
+            exempt = set(rule.get('except_roles', []))
+            for role in candidates:
+                if role in exempt or role not in self.roles:
+                    continue
+                bits = self.roles[role]
+                if all(bits & mask for mask in masks):
+                    offending = 0
+                    for mask in masks:
+                        offending |= bits & mask
+                    violations.append((rule['name'], role, list(iter_bits(offending))))
+        return violations
+
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    with open(path, encoding='utf-8-sig') as f:
+        return json.load(f)['forbidden']
+
+
+# ============================================
+# Output
+# ============================================
+
+def print_matrix(index):
+    modules = sorted(index.module_masks)
+    width = max(len(role) for role in index.roles) if index.roles else 10
+    print(f"{'Role':<{width}}  " + '  '.join(f"{m[:10]:>10}" for m in modules))
+    print("-" * (width + 12 * len(modules)))
+    for role in sorted(index.roles):
+        granted = index.modules(role)
+        cells = [f"{'%d/%d' % granted[m] if m in granted else '-':>10}" for m in modules]
+        print(f"{role:<{width}}  " + '  '.join(cells))
+
+
+def print_grouped(index, grouped, indent="  "):
+    if not grouped:
+        print(f"{indent}(none)")
+    for module, types in grouped.items():
+        print(f"{indent}[{module}] " + ', '.join(index.label(t) for t in types))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Role/permission analysis on bitsets")
+    parser.add_argument('--who-has', metavar='PERMISSION', help="roles holding a permission or module:<Module>")
+    parser.add_argument('--modules', metavar='ROLE', help="modules granted to a role")
+    parser.add_argument('--diff', nargs=2, metavar=('ROLE_A', 'ROLE_B'), help="permissions in one role only")
+    parser.add_argument('--conflicts', action='store_true', help="shared permissions for every role pair")
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH, help="forbidden combinations file")
+    parser.add_argument('--seed', nargs='?', const='', metavar='PATH', help="analyse permissions_seed.json")
+    parser.add_argument('--sqlite', nargs='?', const=SQLITE_PATH, metavar='PATH', help="read a SQLite database")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    if args.seed is not None:
+        index = PermissionIndex.from_seed(args.seed or None)
+    elif args.sqlite:
+        conn = get_sqlite_connection(args.sqlite)
+        try:
+            index = PermissionIndex.load(conn)
+        finally:
+            conn.close()
+    else:
+        try:
+            with connection() as conn:
+                index = PermissionIndex.load(conn)
+        finally:
+            close_pool()
+
+    try:
+        if args.who_has:
+            roles = index.roles_with(args.who_has)
+            print(f"{args.who_has}: {', '.join(roles) if roles else '(no role)'}")
+            return 0
+        if args.modules:
+            for module, (granted, total) in index.modules(args.modules).items():
+                print(f"  {module:<16} {granted}/{total}")
+            return 0
+        if args.diff:
+            only_a, only_b = index.diff(*args.diff)
+            print(f"Only in {args.diff[0]}:")
+            print_grouped(index, only_a)
+            print(f"Only in {args.diff[1]}:")
+            print_grouped(index, only_b)
+            return 0
+        if args.conflicts:
+            roles = sorted(index.roles)
+            for i, role_a in enumerate(roles):
+                for role_b in roles[i + 1:]:
+                    shared = index.overlap(role_a, role_b)
+                    if shared:
+                        print(f"{role_a} ∩ {role_b}:")
+                        print_grouped(index, shared, indent="    ")
+            return 0
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        return 1
+
+    print_matrix(index)
+    if not os.path.exists(args.rules):
+        return 0
+    violations = index.check_rules(load_rules(args.rules))
+    print(f"\nRules ({os.path.basename(args.rules)}):")
+    for rule_name, role, types in violations:
+        print(f"  ❌ {role}: {rule_name} -> " + ', '.join(index.label(t) for t in types))
+    if not violations:
+        print("  ✅ No forbidden combinations")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
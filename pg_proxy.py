@@ -0,0 +1,465 @@
+"""
+PostgreSQL Transaction-Pooling Proxy
+وسيط اتصالات: عدد ثابت من الاتصالات بالخادم تتشارك فيه كل نسخ البرنامج
+
+Listens on --listen and speaks the PostgreSQL wire protocol to the clients.
+Client sessions are multiplexed onto --pool-size server connections opened
+with the db_pool settings. A client gets a server connection when it sends
+a message. It keeps that connection until the server reports ReadyForQuery
+'I' (no transaction open) with every Sync/Query it sent answered. The
+connection then goes back to the pool, so the idle connections each
+WinForms client holds cost no backend.
+
+Clients authenticate with the configured database user and password
+(cleartext over the wire - keep the proxy on the LAN or on the database
+host). The server side supports trust, md5 and SCRAM-SHA-256. SSL is
+declined on the client side and not used to the server.
+
+Startup parameters other than user and database are not passed on; every
+server connection uses client_encoding UTF8.
+
+Transaction pooling caveats, as with any such pooler: session state does
+not follow a client from one transaction to the next. That covers SET,
+LISTEN, advisory locks taken outside a transaction, temporary tables, and
+WITH HOLD cursors. A client that prepares a named statement is pinned to
+its server connection for the rest of its session, so explicit Prepare()
+keeps working but gives up the multiplexing. Point the app at the proxy
+with e.g. "Host=dbserver;Port=6432;...;No Reset On Close=true".
+
+Usage:
+    python pg_proxy.py                                     # 127.0.0.1:6432, 10 server connections
+    python pg_proxy.py --listen 0.0.0.0:6432 --pool-size 20
+    python pg_proxy_bench.py                               # backends and latency with/without the proxy
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import itertools
+import os
+import struct
+import sys
+import time
+
+from db_pool import load_config
+
+DEFAULT_LISTEN = '127.0.0.1:6432'
+
+PROTOCOL_3 = 196608
+SSL_REQUEST = 80877103
+GSSENC_REQUEST = 80877104
+CANCEL_REQUEST = 80877102
+
+# Client messages that the server answers with ReadyForQuery
+# (Query, Sync, FunctionCall)
+SYNCING = {b'Q', b'S', b'F'}
+
+# CopyData/CopyDone/CopyFail belong to a COPY the client already started:
+# inside a Query they end with its ReadyForQuery, inside an extended batch
+# the Execute already marked it unsynced
+COPY_MESSAGES = {b'd', b'c', b'f'}
+
+INT32 = struct.Struct('!i')
+HEADER = struct.Struct('!ci')
+
+
+class ProtocolError(Exception):
+    """The peer sent something this proxy does not handle"""
+
+
+def message(kind, body=b''):
+    return kind + INT32.pack(len(body) + 4) + body
+
+
+def error_response(code, text, severity='FATAL'):
+    fields = [b'S' + severity.encode(), b'V' + severity.encode(), b'C' + code.encode(), b'M' + text.encode()]
+    return message(b'E', b'\0'.join(fields) + b'\0\0')
+
+
+async def read_message(reader):
+    kind, length = HEADER.unpack(await reader.readexactly(5))
+    return kind, await reader.readexactly(length - 4)
+
+
+async def read_startup(reader):
+    length = INT32.unpack(await reader.readexactly(4))[0]
+    return await reader.readexactly(length - 4)
+
+
+def parse_params(data):
+    parts = data.split(b'\0')
+    return {parts[i].decode(): parts[i + 1].decode() for i in range(0, len(parts) - 1, 2) if parts[i]}
+
+
+# ============================================
+# Server connections
+# ============================================
+
+def _scram_proof(password, client_first_bare, server_first, channel_binding='biws'):
+    attrs = dict(item.split('=', 1) for item in server_first.split(','))
+    salted = hashlib.pbkdf2_hmac('sha256', password.encode(), base64.b64decode(attrs['s']), int(attrs['i']))
+    client_key = hmac.new(salted, b'Client Key', hashlib.sha256).digest()
+    without_proof = f"c={channel_binding},r={attrs['r']}"
+    auth_message = f"{client_first_bare},{server_first},{without_proof}".encode()
+    signature = hmac.new(hashlib.sha256(client_key).digest(), auth_message, hashlib.sha256).digest()
+    proof = bytes(a ^ b for a, b in zip(client_key, signature))
+    server_key = hmac.new(salted, b'Server Key', hashlib.sha256).digest()
+    server_signature = base64.b64encode(hmac.new(server_key, auth_message, hashlib.sha256).digest()).decode()
+    return f"{without_proof},p={base64.b64encode(proof).decode()}", server_signature
+
+
+class ServerConnection:
+    """One authenticated backend connection owned by the pool"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pid = None
+        self.secret_key = None
+        self.params = {}
+
+    @classmethod
+    async def open(cls, config):
+        reader, writer = await asyncio.open_connection(config['host'], config['port'])
+        conn = cls(reader, writer)
+        try:
+            await conn._startup(config)
+        except BaseException:
+            writer.close()
+            raise
+        return conn
+
+    async def _startup(self, config):
+        user, password = config['user'], str(config.get('password') or '')
+        params = {'user': user, 'database': config['database'],
+                  'client_encoding': 'UTF8', 'application_name': 'pg_proxy'}
+        body = INT32.pack(PROTOCOL_3) + b''.join(f"{k}\0{v}\0".encode() for k, v in params.items()) + b'\0'
+        self.writer.write(INT32.pack(len(body) + 4) + body)
+        scram = None
+        while True:
+            kind, body = await read_message(self.reader)
+            if kind == b'E':
+                raise ProtocolError(_error_text(body))
+            if kind == b'S':
+                name, value = body.rstrip(b'\0').split(b'\0', 1)
+                self.params[name.decode()] = value.decode()
+            elif kind == b'K':
+                self.pid, self.secret_key = struct.unpack('!ii', body[:8])
+            elif kind == b'Z':
+                return
+            elif kind == b'R':
+                code = INT32.unpack(body[:4])[0]
+                if code == 3:
+                    self.writer.write(message(b'p', password.encode() + b'\0'))
+                elif code == 5:
+                    inner = hashlib.md5((password + user).encode()).hexdigest()
+                    digest = 'md5' + hashlib.md5(inner.encode() + body[4:8]).hexdigest()
+                    self.writer.write(message(b'p', digest.encode() + b'\0'))
+                elif code == 10:
+                    if b'SCRAM-SHA-256' not in body[4:].split(b'\0'):
+                        raise ProtocolError("server offers no SASL mechanism this proxy supports")
+                    bare = f"n=,r={base64.b64encode(os.urandom(18)).decode()}"
+                    first = f"n,,{bare}".encode()
+                    self.writer.write(message(b'p', b'SCRAM-SHA-256\0' + INT32.pack(len(first)) + first))
+                    scram = bare
+                elif code == 11:
+                    final, expected = _scram_proof(password, scram, body[4:].decode())
+                    scram = expected
+                    self.writer.write(message(b'p', final.encode()))
+                elif code == 12:
+                    attrs = dict(item.split('=', 1) for item in body[4:].decode().split(','))
+                    if attrs.get('v') != scram:
+                        raise ProtocolError("SCRAM server signature mismatch")
+                elif code != 0:
+                    raise ProtocolError(f"unsupported authentication request {code}")
+                await self.writer.drain()
+
+    @property
+    def broken(self):
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    def close(self):
+        if not self.writer.is_closing():
+            self.writer.write(message(b'X'))
+            self.writer.close()
+
+
+def _error_text(body):
+    fields = {f[:1]: f[1:].decode(errors='replace') for f in body.split(b'\0') if f}
+    return f"{fields.get(b'C', '')} {fields.get(b'M', '')}".strip()
+
+
+class ServerPool:
+    """Fixed set of server connections handed out one transaction at a time"""
+
+    def __init__(self, config, size, acquire_timeout):
+        self.config = config
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.idle = asyncio.Queue()
+        self.params = {}
+        self.waiting = 0
+        self.busy = 0
+        self.transactions = 0
+        self.wait_total = 0.0
+
+    async def start(self):
+        conns = await asyncio.gather(*(ServerConnection.open(self.config) for _ in range(self.size)))
+        self.params = dict(conns[0].params)
+        for conn in conns:
+            self.idle.put_nowait(conn)
+
+    async def acquire(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            while True:
+                conn = await asyncio.wait_for(self.idle.get(), self.acquire_timeout)
+                if not conn.broken:
+                    break
+                self.discard(conn)
+        finally:
+            self.waiting -= 1
+        self.busy += 1
+        self.transactions += 1
+        self.wait_total += time.perf_counter() - started
+        return conn
+
+    def release(self, conn):
+        self.busy -= 1
+        if conn.broken:
+            self.discard(conn, counted=False)
+        else:
+            self.idle.put_nowait(conn)
+
+    def discard(self, conn, counted=False):
+        """Drop a connection that is broken or left mid-transaction, and open its replacement"""
+        if counted:
+            self.busy -= 1
+        conn.close()
+        asyncio.ensure_future(self._replace())
+
+    async def _replace(self):
+        delay = 0.5
+        while True:
+            try:
+                self.idle.put_nowait(await ServerConnection.open(self.config))
+                return
+            except (OSError, ProtocolError) as e:
+                print(f"⚠️  Reconnecting to the server failed: {e} - retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def cancel(self, conn):
+        reader, writer = await asyncio.open_connection(self.config['host'], self.config['port'])
+        writer.write(struct.pack('!iiii', 16, CANCEL_REQUEST, conn.pid, conn.secret_key))
+        await writer.drain()
+        writer.close()
+
+
+# ============================================
+# Client sessions
+# ============================================
+
+class ClientSession:
+    """One client connection; borrows a server connection per transaction"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, proxy, reader, writer):
+        self.proxy = proxy
+        self.reader = reader
+        self.writer = writer
+        self.pid = next(self._ids)
+        self.secret_key = int.from_bytes(os.urandom(4), 'big', signed=True)
+        self.server = None
+        self.pump = None
+        self.pending = 0        # Query/Sync messages the server has not answered yet
+        self.unsynced = False   # extended-protocol messages sent since the last Sync
+        self.status = b'I'
+        self.pinned = False
+
+    async def run(self):
+        try:
+            if not await self.handshake():
+                return
+            self.proxy.sessions[self.pid] = self
+            await self.relay_client()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ProtocolError as e:
+            self.writer.write(error_response('08P01', str(e)))
+        finally:
+            self.proxy.sessions.pop(self.pid, None)
+            self.finish()
+            self.writer.close()
+
+    async def handshake(self):
+        while True:
+            data = await read_startup(self.reader)
+            code = INT32.unpack(data[:4])[0]
+            if code in (SSL_REQUEST, GSSENC_REQUEST):
+                self.writer.write(b'N')
+                await self.writer.drain()
+                continue
+            if code == CANCEL_REQUEST:
+                await self.proxy.forward_cancel(*struct.unpack('!ii', data[4:12]))
+                return False
+            if code >> 16 != 3:
+                raise ProtocolError(f"unsupported protocol version {code >> 16}.{code & 0xFFFF}")
+            break
+        params = parse_params(data[4:])
+        if code & 0xFFFF:
+            # newer minor version: tell the client we speak 3.0 only
+            self.writer.write(message(b'v', INT32.pack(PROTOCOL_3) + INT32.pack(0)))
+
+        config = self.proxy.config
+        if params.get('user') != config['user'] or params.get('database', params.get('user')) != config['database']:
+            self.writer.write(error_response('28000', f"pg_proxy serves only {config['user']}@{config['database']}"))
+            await self.writer.drain()
+            return False
+        self.writer.write(message(b'R', INT32.pack(3)))
+        await self.writer.drain()
+        kind, body = await read_message(self.reader)
+        if kind != b'p' or body.rstrip(b'\0').decode(errors='replace') != str(config.get('password') or ''):
+            self.writer.write(error_response('28P01', f"password authentication failed for user \"{config['user']}\""))
+            await self.writer.drain()
+            return False
+
+        out = [message(b'R', INT32.pack(0))]
+        out += [message(b'S', f"{k}\0{v}\0".encode()) for k, v in self.proxy.pool.params.items()]
+        out += [message(b'K', struct.pack('!ii', self.pid, self.secret_key)), message(b'Z', b'I')]
+        self.writer.write(b''.join(out))
+        await self.writer.drain()
+        return True
+
+    async def relay_client(self):
+        while True:
+            kind, body = await read_message(self.reader)
+            if kind == b'X':
+                return
+            if self.server is None:
+                try:
+                    self.server = await self.proxy.pool.acquire()
+                except asyncio.TimeoutError:
+                    self.writer.write(error_response('53300', "pg_proxy: no server connection became free"))
+                    await self.writer.drain()
+                    return
+                self.pump = asyncio.ensure_future(self.relay_server(self.server))
+            if kind == b'P' and body[:1] != b'\0' and not self.pinned:
+                # named prepared statement: it only exists on this server connection
+                self.pinned = True
+                self.proxy.pinned += 1
+            if kind in SYNCING:
+                self.pending += 1
+                self.unsynced = False
+            elif kind not in COPY_MESSAGES:
+                self.unsynced = True
+            self.server.writer.write(message(kind, body))
+            await self.server.writer.drain()
+
+    async def relay_server(self, server):
+        """Copy server messages to the client until the transaction ends"""
+        try:
+            while True:
+                kind, body = await read_message(server.reader)
+                self.writer.write(message(kind, body))
+                if kind == b'Z':
+                    self.pending -= 1
+                    self.status = body[:1]
+                    await self.writer.drain()
+                    if self.pending <= 0 and not self.unsynced and self.status == b'I' and not self.pinned:
+                        self.pending = 0
+                        self.server = None
+                        self.pump = None
+                        self.proxy.pool.release(server)
+                        return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # the server went away, or the client did while we were writing
+            if self.server is server:
+                self.server = None
+                self.pump = None
+                self.proxy.pool.discard(server, counted=True)
+            self.writer.close()
+
+    def finish(self):
+        """Client is gone: hand its server connection back, or drop it if mid-transaction"""
+        server, self.server = self.server, None
+        if self.pump is not None:
+            self.pump.cancel()
+        if server is None:
+            return
+        if self.pending or self.unsynced or self.status != b'I' or self.pinned:
+            self.proxy.pool.discard(server, counted=True)
+        else:
+            self.proxy.pool.release(server)
+
+
+class Proxy:
+    def __init__(self, config, pool_size, acquire_timeout):
+        self.config = config
+        self.pool = ServerPool(config, pool_size, acquire_timeout)
+        self.sessions = {}
+        self.pinned = 0
+
+    async def handle(self, reader, writer):
+        await ClientSession(self, reader, writer).run()
+
+    async def forward_cancel(self, pid, secret_key):
+        session = self.sessions.get(pid)
+        if session and session.secret_key == secret_key and session.server is not None:
+            await self.pool.cancel(session.server)
+
+    async def report(self, every):
+        while True:
+            await asyncio.sleep(every)
+            pool = self.pool
+            avg_wait = pool.wait_total / pool.transactions * 1000 if pool.transactions else 0.0
+            print(f"{time.strftime('%H:%M:%S')}  clients {len(self.sessions)}  server busy {pool.busy}/{pool.size}  "
+                  f"waiting {pool.waiting}  transactions {pool.transactions}  avg wait {avg_wait:.1f}ms  "
+                  f"pinned {self.pinned}")
+
+
+async def serve(config, host, port, pool_size, acquire_timeout, stats_every, ready=None):
+    proxy = Proxy(config, pool_size, acquire_timeout)
+    await proxy.pool.start()
+    server = await asyncio.start_server(proxy.handle, host, port)
+    print(f"✅ pg_proxy on {host}:{port} -> {config['host']}:{config['port']}/{config['database']} "
+          f"with {pool_size} server connections")
+    sys.stdout.flush()
+    if ready is not None:
+        ready.set()
+    if stats_every:
+        asyncio.ensure_future(proxy.report(stats_every))
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transaction-pooling proxy for the PostgreSQL wire protocol")
+    parser.add_argument('--listen', default=DEFAULT_LISTEN, help=f"host:port to accept clients on (default: {DEFAULT_LISTEN})")
+    parser.add_argument('--pool-size', type=int, default=10, help="server connections (default: 10)")
+    parser.add_argument('--acquire-timeout', type=float, default=30,
+                        help="seconds a client may wait for a server connection (default: 30)")
+    parser.add_argument('--stats', type=float, default=60, help="print pool stats every N seconds, 0 = never")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    host, _, port = args.listen.rpartition(':')
+    try:
+        asyncio.run(serve(load_config(), host or '127.0.0.1', int(port), args.pool_size,
+                          args.acquire_timeout, args.stats))
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ProtocolError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Proxy Benchmark: backends and latency with and without pg_proxy
+قياس عدد اتصالات الخادم وزمن الاستجابة مباشرة ومن خلال pg_proxy
+
+Simulates --clients desktop clients. Like the WinForms app, each one opens
+its connection up front and keeps it, then loops: think for an exponential
+--think seconds, then run one short transaction (read the cashboxes
+totals). The same workload runs twice, first straight against PostgreSQL
+and then through a pg_proxy.py subprocess with --pool-size server
+connections. A separate direct connection counts client backends in
+pg_stat_activity every 0.25s while each run is going.
+
+Reports average and peak backends, transactions/sec, and p50/p95/p99/max
+transaction latency (including the time a client waits for a pooled server
+connection). Clients use statement_cache_size=0, as transaction pooling
+requires.
+
+Usage:
+    python pg_proxy_bench.py
+    python pg_proxy_bench.py --clients 150 --pool-size 15 --duration 60
+    python pg_proxy_bench.py --think 0.05 --output proxy_bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from cashbox_load import percentile
+from db_pool import load_config
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WORK_SQL = "SELECT COUNT(*), COALESCE(SUM(currentbalance), 0) FROM cashboxes WHERE NOT isdeleted"
+
+BACKENDS_SQL = """
+    SELECT COUNT(*) FROM pg_stat_activity
+    WHERE datname = current_database() AND backend_type = 'client backend' AND pid <> pg_backend_pid()
+"""
+
+
+async def connect(host, port, config):
+    import asyncpg
+
+    return await asyncpg.connect(host=host, port=port, user=config['user'], password=config['password'],
+                                 database=config['database'], statement_cache_size=0)
+
+
+async def count_backends(config, stop, samples):
+    conn = await connect(config['host'], config['port'], config)
+    try:
+        while not stop.is_set():
+            samples.append(await conn.fetchval(BACKENDS_SQL))
+            try:
+                await asyncio.wait_for(stop.wait(), 0.25)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await conn.close()
+
+
+async def run_clients(host, port, config, clients, think, duration):
+    """Returns (latencies, committed, errors, elapsed, backend samples)"""
+    conns = await asyncio.gather(*(connect(host, port, config) for _ in range(clients)))
+    latencies = []
+    errors = 0
+    stop = asyncio.Event()
+    samples = []
+    monitor = asyncio.ensure_future(count_backends(config, stop, samples))
+    deadline = time.perf_counter() + duration
+
+    async def client(conn):
+        nonlocal errors
+        while True:
+            await asyncio.sleep(random.expovariate(1 / think) if think else 0)
+            if time.perf_counter() >= deadline:
+                return
+            started = time.perf_counter()
+            try:
+                async with conn.transaction():
+                    await conn.fetchrow(WORK_SQL)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(client(conn) for conn in conns))
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        await asyncio.gather(*(conn.close() for conn in conns), return_exceptions=True)
+    return sorted(latencies), len(latencies), errors, elapsed, samples
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_proxy(port, pool_size):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(SCRIPT_DIR, 'pg_proxy.py'), '--listen', f"127.0.0.1:{port}",
+         '--pool-size', str(pool_size), '--stats', '0'],
+        stdout=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"pg_proxy exited with code {proc.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("pg_proxy did not start listening within 15s")
+
+
+def summarize(mode, clients, latencies, committed, errors, elapsed, samples):
+    return {
+        'mode': mode,
+        'clients': clients,
+        'backends_avg': round(sum(samples) / len(samples), 1) if samples else 0.0,
+        'backends_peak': max(samples) if samples else 0,
+        'tps': round(committed / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        'errors': errors,
+    }
+
+
+def print_results(results):
+    print(f"\n{'mode':<18} {'clients':>7} {'backends avg':>12} {'peak':>5} {'tx/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>6}")
+    print("-" * 98)
+    for r in results:
+        print(f"{r['mode']:<18} {r['clients']:>7} {r['backends_avg']:>12} {r['backends_peak']:>5} {r['tps']:>8} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['max_ms']:>8} {r['errors']:>6}")
+
+
+async def main_async(args, config):
+    results = []
+    print(f"▶ direct: {args.clients} clients for {args.duration}s")
+    run = await run_clients(config['host'], config['port'], config, args.clients, args.think, args.duration)
+    results.append(summarize('direct', args.clients, *run))
+
+    port = free_port()
+    proxy = start_proxy(port, args.pool_size)
+    try:
+        print(f"▶ pg_proxy ({args.pool_size} server connections): {args.clients} clients for {args.duration}s")
+        run = await run_clients('127.0.0.1', port, config, args.clients, args.think, args.duration)
+        results.append(summarize(f"proxy (pool {args.pool_size})", args.clients, *run))
+    finally:
+        proxy.terminate()
+        proxy.wait()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare backends and latency with and without pg_proxy")
+    parser.add_argument('--clients', type=int, default=50, help="simulated desktop clients (default: 50)")
+    parser.add_argument('--pool-size', type=int, default=10, help="pg_proxy server connections (default: 10)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds per run (default: 30)")
+    parser.add_argument('--think', type=float, default=0.2, help="mean think time between transactions (default: 0.2)")
+    parser.add_argument('--output', help="write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    config = load_config()
+    try:
+        results = asyncio.run(main_async(args, config))
+    except (OSError, RuntimeError) as e:
+        print(f"❌ {e}")
+        return 1
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'generated_at': datetime.now().isoformat(timespec='seconds'), 'duration': args.duration,
+                       'think': args.think, 'results': results}, f, indent=2)
+    return 0 if all(r['errors'] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+User Provisioning
+إنشاء مستخدمي الفرع دفعة واحدة مع تشفير كلمات المرور بـ BCrypt على كل الأنوية
+
+Reads users from a CSV file (username, password, fullname, email, phone,
+role), hashes the passwords with bcrypt in a process pool sized to the
+machine's cores, and inserts every new user with one multi-row INSERT.
+Usernames that already exist are skipped before hashing, so re-running the
+same file costs nothing.
+
+The bcrypt cost defaults to 11, the work factor BCrypt.Net uses in
+AuthService.HashPassword.
+
+It also flags legacy unsalted SHA-256 hashes (64 hex characters, written by
+setup_permissions.py) with users.passwordrehashrequired; AuthService checks
+those against SHA-256 once and replaces them with BCrypt on the next
+successful login. The column comes from the EF migration
+20260310000000_AddPasswordRehashRequiredToUsers (applied by the app on startup).
+
+Usage:
+    python provision_users.py branch_users.csv
+    python provision_users.py branch_users.csv --cost 12 --workers 4
+    python provision_users.py --flag-legacy          # only scan for SHA-256 hashes
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import bcrypt
+from psycopg2.extras import execute_values
+
+from db_pool import close_pool, connection
+
+DEFAULT_COST = 11
+
+CSV_COLUMNS = ('username', 'password', 'fullname', 'email', 'phone', 'role')
+
+INSERT_SQL = """
+    INSERT INTO users (username, passwordhash, fullname, email, phone, roleid, isactive, "CreatedAt", updatedat)
+    VALUES %s
+"""
+
+FLAG_LEGACY_SQL = r"""
+    UPDATE users SET passwordrehashrequired = true
+    WHERE passwordhash ~ '^[0-9a-fA-F]{64}$' AND NOT passwordrehashrequired
+"""
+
+
+def hash_password(password, cost=DEFAULT_COST):
+    """bcrypt hash in the $2a$ form BCrypt.Net writes (runs in a worker process)"""
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cost, prefix=b'2a'))
+    return hashed.decode('ascii')
+
+
+def hash_passwords(passwords, cost=DEFAULT_COST, workers=None):
+    """Hash in parallel; bcrypt is CPU-bound, so one process per core"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < 2:
+        return [hash_password(p, cost) for p in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_password, passwords, [cost] * len(passwords), chunksize=chunksize))
+
+
+def read_users(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        missing = [c for c in ('username', 'password', 'fullname', 'role') if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"missing CSV columns: {', '.join(missing)}")
+        users = []
+        for line, row in enumerate(reader, start=2):
+            user = {c: (row.get(c) or '').strip() for c in CSV_COLUMNS}
+            if not user['username'] or not user['password']:
+                raise ValueError(f"line {line}: username and password are required")
+            users.append(user)
+    names = [u['username'].lower() for u in users]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate usernames in file")
+    return users
+
+
+def new_users(conn, users):
+    """Drop users whose username already exists and resolve role names to ids"""
+    cur = conn.cursor()
+    cur.execute("SELECT lower(username) FROM users WHERE lower(username) = ANY(%s)",
+                ([u['username'].lower() for u in users],))
+    existing = {row[0] for row in cur.fetchall()}
+    cur.execute("SELECT rolename, roleid FROM roles")
+    roles = dict(cur.fetchall())
+    cur.close()
+
+    unknown = sorted({u['role'] for u in users if u['role'] not in roles})
+    if unknown:
+        raise ValueError(f"unknown roles: {', '.join(unknown)}")
+    pending = [dict(u, roleid=roles[u['role']]) for u in users if u['username'].lower() not in existing]
+    return pending, len(users) - len(pending)
+
+
+def insert_users(conn, users, hashes):
+    now = datetime.now(timezone.utc)
+    rows = [(u['username'], h, u['fullname'], u['email'] or None, u['phone'] or None, u['roleid'], True, now, now)
+            for u, h in zip(users, hashes)]
+    cur = conn.cursor()
+    execute_values(cur, INSERT_SQL, rows, page_size=1000)
+    cur.close()
+    return len(rows)
+
+
+def flag_legacy_hashes(conn):
+    """Mark SHA-256 hashes for rehash on next login; returns the number flagged"""
+    cur = conn.cursor()
+    cur.execute(FLAG_LEGACY_SQL)
+    flagged = cur.rowcount
+    cur.close()
+    return flagged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-provision users with bcrypt passwords")
+    parser.add_argument('csv', nargs='?', help="users file: " + ','.join(CSV_COLUMNS))
+    parser.add_argument('--cost', type=int, default=DEFAULT_COST, help=f"bcrypt cost (default: {DEFAULT_COST})")
+    parser.add_argument('--workers', type=int, help="hashing processes (default: CPU cores)")
+    parser.add_argument('--flag-legacy', action='store_true', help="only flag legacy SHA-256 hashes")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    if not args.csv and not args.flag_legacy:
+        parser.error("give a users CSV file or --flag-legacy")
+
+    try:
+        users = read_users(args.csv) if args.csv else []
+    except (OSError, ValueError) as e:
+        print(f"❌ {args.csv}: {e}")
+        return 1
+
+    try:
+        inserted = skipped = 0
+        if users:
+            with connection() as conn:
+                pending, skipped = new_users(conn, users)
+            if pending:
+                started = time.perf_counter()
+                hashes = hash_passwords([u['password'] for u in pending], args.cost, args.workers)
+                elapsed = time.perf_counter() - started
+                print(f"🔐 Hashed {len(hashes)} password(s) in {elapsed:.1f}s "
+                      f"(cost {args.cost}, {args.workers or os.cpu_count()} process(es))")
+                with connection() as conn:
+                    inserted = insert_users(conn, pending, hashes)
+        with connection() as conn:
+            flagged = flag_legacy_hashes(conn)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        close_pool()
+
+    if users:
+        print(f"✅ {inserted} user(s) created, {skipped} already existed")
+    print(f"⚠️  {flagged} legacy SHA-256 password(s) flagged for rehash on next login" if flagged
+          else "✅ No unflagged legacy SHA-256 passwords")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Cashbox Monthly Summary Refresh
+تحديث جدول الملخص الشهري للخزن من الحركات المعدلة فقط
+
+Maintains cashbox_monthly_summary (see create_cashbox_monthly_summary.sql),
+keyed by (cashbox, year, month, currency, type). Statement triggers on
+cashtransactions queue the old and new (cashbox, year, month) bucket of
+every inserted, updated or deleted row in cashbox_monthly_summary_changes,
+so soft deletes, raw fix scripts and moves to another month or cashbox all
+mark the right buckets whether or not they set updatedat. Each run takes
+the queued buckets and rebuilds only those in one transaction; rebuilding
+whole buckets keeps the refresh idempotent.
+
+The queue has no key and grows with every write statement until the next
+refresh empties it, so schedule the refresh (Task Scheduler / cron, e.g.
+every few minutes).
+
+--full rebuilds every bucket; only needed after changes made with the
+triggers disabled (session_replication_role = replica, restores).
+
+Usage:
+    python refresh_cashbox_summary.py --setup     # create the tables and triggers once
+    python refresh_cashbox_summary.py             # incremental refresh
+    python refresh_cashbox_summary.py --full      # rebuild everything
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from db_pool import close_pool, connection
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SETUP_SQL_PATH = os.path.join(SCRIPT_DIR, 'create_cashbox_monthly_summary.sql')
+
+# TransactionType.Expense / PaymentMethod.InstaPay
+EXPENSE = 2
+INSTAPAY = 5
+
+# Take the queued buckets; rows queued by transactions still in flight are
+# not visible here and stay for the next run
+CHANGED_BUCKETS_SQL = """
+    CREATE TEMP TABLE changed_buckets (cashboxid INTEGER, year INTEGER, month INTEGER) ON COMMIT DROP;
+    WITH taken AS (
+        DELETE FROM cashbox_monthly_summary_changes RETURNING cashboxid, year, month
+    )
+    INSERT INTO changed_buckets SELECT DISTINCT cashboxid, year, month FROM taken
+"""
+
+CLEAR_CHANGES_SQL = "DELETE FROM cashbox_monthly_summary_changes"
+
+ALL_BUCKETS_SQL = """
+    CREATE TEMP TABLE changed_buckets ON COMMIT DROP AS
+    SELECT DISTINCT cashboxid, year, month FROM cashtransactions
+"""
+
+DELETE_SQL = """
+    DELETE FROM cashbox_monthly_summary s
+    USING changed_buckets c
+    WHERE s.cashboxid = c.cashboxid AND s.year = c.year AND s.month = c.month
+"""
+
+INSERT_SQL = f"""
+    INSERT INTO cashbox_monthly_summary
+        (cashboxid, year, month, currency, transactiontype,
+         transaction_count, total_amount, total_commission, refreshed_at)
+    SELECT ct.cashboxid, ct.year, ct.month,
+           COALESCE(NULLIF(ct."TransactionCurrency", ''), 'EGP'),
+           ct.transactiontype,
+           COUNT(*),
+           SUM(ct.amount),
+           SUM(CASE WHEN ct.transactiontype = {EXPENSE} AND ct.paymentmethod = {INSTAPAY}
+                    THEN COALESCE(ct.instapaycommission, 0) ELSE 0 END),
+           NOW()
+    FROM cashtransactions ct
+    JOIN changed_buckets c
+      ON c.cashboxid = ct.cashboxid AND c.year = ct.year AND c.month = ct.month
+    WHERE ct.isdeleted = false
+    GROUP BY ct.cashboxid, ct.year, ct.month,
+             COALESCE(NULLIF(ct."TransactionCurrency", ''), 'EGP'), ct.transactiontype
+"""
+
+
+def setup(conn):
+    """Create the summary and state tables"""
+    with open(SETUP_SQL_PATH, encoding='utf-8') as f:
+        conn.cursor().execute(f.read())
+
+
+def summary_exists(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('public.cashbox_monthly_summary') IS NOT NULL")
+    exists = cur.fetchone()[0]
+    cur.close()
+    return exists
+
+
+def changes_exist(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('public.cashbox_monthly_summary_changes') IS NOT NULL")
+    exists = cur.fetchone()[0]
+    cur.close()
+    return exists
+
+
+def refresh(conn, full=False):
+    """
+    Rebuild the queued buckets (all buckets with full=True or on the first
+    run). Returns (bucket count, rows written).
+    """
+    cur = conn.cursor()
+    # منع تشغيل تحديثين في نفس الوقت
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('cashbox_monthly_summary'))")
+    cur.execute("SELECT last_refreshed_at, NOW() FROM cashbox_monthly_summary_state WHERE id = 1 FOR UPDATE")
+    last_refreshed_at, started_at = cur.fetchone()
+
+    if full:
+        cur.execute("TRUNCATE cashbox_monthly_summary")
+    if full or last_refreshed_at is None:
+        cur.execute(CLEAR_CHANGES_SQL)
+        cur.execute(ALL_BUCKETS_SQL)
+    else:
+        cur.execute(CHANGED_BUCKETS_SQL)
+
+    cur.execute("SELECT COUNT(*) FROM changed_buckets")
+    buckets = cur.fetchone()[0]
+    if not full:
+        cur.execute(DELETE_SQL)
+    cur.execute(INSERT_SQL)
+    rows = cur.rowcount
+    cur.execute("UPDATE cashbox_monthly_summary_state SET last_refreshed_at = %s WHERE id = 1", (started_at,))
+    cur.close()
+    return buckets, rows
+
+
+def read_summary(conn, start=None, end=None):
+    """
+    Pre-aggregated rows for an optional (year, month) range:
+    (cashboxid, year, month, currency, transactiontype, count, amount, commission)
+    """
+    cur = conn.cursor()
+    query = """
+        SELECT cashboxid, year, month, currency, transactiontype,
+               transaction_count, total_amount, total_commission
+        FROM cashbox_monthly_summary
+    """
+    params = ()
+    if start and end:
+        query += " WHERE year * 12 + month BETWEEN %s AND %s"
+        params = (start[0] * 12 + start[1], end[0] * 12 + end[1])
+    query += " ORDER BY cashboxid, year, month, currency, transactiontype"
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the monthly cashbox summary table")
+    parser.add_argument('--setup', action='store_true', help="create the summary tables")
+    parser.add_argument('--full', action='store_true', help="rebuild every bucket")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    started = time.perf_counter()
+    try:
+        with connection() as conn:
+            if args.setup:
+                setup(conn)
+                print("✅ Summary tables created")
+            elif not summary_exists(conn):
+                print("❌ cashbox_monthly_summary not found - run with --setup first")
+                return 1
+            elif not changes_exist(conn):
+                print("❌ cashbox_monthly_summary_changes not found - run with --setup to install the change triggers")
+                return 1
+        with connection() as conn:
+            buckets, rows = refresh(conn, full=args.full)
+    finally:
+        close_pool()
+
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"✅ Refreshed {buckets} month bucket(s), {rows} summary row(s) in {elapsed:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Role Permission Snapshots
+لقطة جاهزة لصلاحيات كل دور حسب القسم - قراءة صف واحد عند تسجيل الدخول
+
+role_permission_snapshots holds one row per role with the module ->
+PermissionType map that SidebarControl.ApplyPermissionsSync works from, as
+JSONB, plus an md5 fingerprint and a version that goes up whenever the map
+changes. Statement-level triggers on roles, permissions and rolepermissions
+call refresh_role_permission_snapshots(), which rewrites only the roles
+whose fingerprint changed (see create_role_permission_snapshots.sql).
+PermissionService reads the user's row at login and falls back to the
+Include() query when the table is missing.
+
+--check rebuilds the expected maps independently from the live tables
+(permission_resolver.PermissionIndex) and compares them with the stored rows.
+
+Usage:
+    python role_permission_snapshot.py --setup     # table, function, triggers
+    python role_permission_snapshot.py             # manual refresh
+    python role_permission_snapshot.py --check
+"""
+
+import argparse
+import os
+import sys
+
+from db_pool import close_pool, connection
+from permission_resolver import PermissionIndex
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SETUP_SQL_PATH = os.path.join(SCRIPT_DIR, 'create_role_permission_snapshots.sql')
+
+TRIGGERS = ('trg_rolepermissions_snapshot', 'trg_permissions_snapshot', 'trg_roles_snapshot')
+
+
+def setup(conn):
+    with open(SETUP_SQL_PATH, encoding='utf-8') as f:
+        conn.cursor().execute(f.read())
+
+
+def snapshot_exists(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('public.role_permission_snapshots') IS NOT NULL")
+    exists = cur.fetchone()[0]
+    cur.close()
+    return exists
+
+
+def refresh(conn):
+    """Rebuild changed snapshots; returns the number of rows written or removed"""
+    cur = conn.cursor()
+    cur.execute("SELECT refresh_role_permission_snapshots()")
+    changed = cur.fetchone()[0]
+    cur.close()
+    return changed
+
+
+def check_snapshots(conn):
+    """Return a list of problems; empty when every snapshot matches the live tables"""
+    index = PermissionIndex.load(conn)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT rolename, modules, fingerprint = md5(modules::text), version
+        FROM role_permission_snapshots
+    """)
+    stored = {name: (modules, fingerprint_ok, version) for name, modules, fingerprint_ok, version in cur.fetchall()}
+    cur.execute("SELECT tgname FROM pg_trigger WHERE tgname = ANY(%s) AND tgenabled <> 'D'", (list(TRIGGERS),))
+    enabled = {row[0] for row in cur.fetchall()}
+    cur.close()
+
+    issues = [f"trigger {name} is missing or disabled" for name in TRIGGERS if name not in enabled]
+    for role in sorted(index.roles):
+        if role not in stored:
+            issues.append(f"{role}: no snapshot")
+            continue
+        modules, fingerprint_ok, version = stored[role]
+        expected = index.permissions_by_module(role)
+        actual = {module: sorted(types) for module, types in modules.items()}
+        if actual != expected:
+            missing = sorted(set(expected) - set(actual))
+            extra = sorted(set(actual) - set(expected))
+            changed = sorted(m for m in set(expected) & set(actual) if expected[m] != actual[m])
+            issues.append(f"{role}: stale snapshot v{version} (missing {missing}, extra {extra}, changed {changed})")
+        elif not fingerprint_ok:
+            issues.append(f"{role}: fingerprint does not match modules")
+    issues.extend(f"{role}: snapshot for a role that no longer exists" for role in sorted(set(stored) - set(index.roles)))
+    return issues
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain and verify per-role permission snapshots")
+    parser.add_argument('--setup', action='store_true', help="create the table, refresh function and triggers")
+    parser.add_argument('--check', action='store_true', help="verify snapshots against the live tables")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    try:
+        with connection() as conn:
+            if args.setup:
+                setup(conn)
+                print("✅ Snapshot table and triggers created")
+                return 0
+            if not snapshot_exists(conn):
+                print("❌ role_permission_snapshots not found - run with --setup first")
+                return 1
+            if args.check:
+                issues = check_snapshots(conn)
+                for issue in issues:
+                    print(f"  ❌ {issue}")
+                print("✅ Snapshots in sync" if not issues else f"\n{len(issues)} problem(s)")
+                return 1 if issues else 0
+            changed = refresh(conn)
+    finally:
+        close_pool()
+
+    print(f"✅ {changed} snapshot(s) updated")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+Schema Resolver
+يحول أسماء الجداول والأعمدة المنطقية إلى الأسماء الفعلية في PostgreSQL
+
+The database mixes casing: most columns are lowercase (transactiontype,
+cashboxid) while a few were created PascalCase ("TransactionCurrency",
+"UpdatedBy"). Instead of guessing, write queries against logical names and
+let the resolver rewrite them:
+
+    {CashTransactions}                  -> "cashtransactions"
+    {CashTransactions.Type}             -> "transactiontype"   (EF property)
+    {cashtransactions.transactioncurrency} -> "TransactionCurrency"
+    {TransactionType.Income}            -> 1                   (C# enum value)
+
+Names are matched against the live catalog (case-insensitively) and against
+the EF mapping in Infrastructure/Data/AppDbContext.cs, so entity and property
+names from the C# code work too. Enum values come from Domain/Entities.
+
+The catalog is introspected once and cached in schema_cache.json, keyed by a
+cheap schema version (latest EF migration, table/column counts from pg_class
+and an md5 of the table and column names, so renames count too). Later runs
+cost one tiny query, or none with offline=True.
+
+Usage:
+    python schema_resolver.py "SELECT {CashTransactions.Type} FROM {CashTransactions}"
+    python schema_resolver.py --show CashTransactions
+    python schema_resolver.py --refresh
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(SCRIPT_DIR, 'schema_cache.json')
+DBCONTEXT_PATH = os.path.join(SCRIPT_DIR, 'Infrastructure', 'Data', 'AppDbContext.cs')
+ENTITIES_DIR = os.path.join(SCRIPT_DIR, 'Domain', 'Entities')
+
+PLACEHOLDER = re.compile(r'\{([A-Za-z_]\w*)(?:\.([A-Za-z_]\w*))?\}')
+
+# Counts alone miss a renamed table or column, so the names are hashed too
+NAMES_HASH_SQL = """
+        SELECT md5(COALESCE(string_agg(c.relname || '.' || a.attname, ',' ORDER BY c.relname, a.attnum), ''))
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v')
+"""
+
+VERSION_QUERY = f"""
+    SELECT
+        (SELECT MAX("MigrationId") FROM "__EFMigrationsHistory"),
+        COUNT(*),
+        COALESCE(SUM(c.relnatts), 0),
+        ({NAMES_HASH_SQL})
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v')
+"""
+
+VERSION_QUERY_NO_EF = f"""
+    SELECT NULL, COUNT(*), COALESCE(SUM(c.relnatts), 0), ({NAMES_HASH_SQL})
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v')
+"""
+
+CATALOG_QUERY = """
+    SELECT table_name, column_name
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+    ORDER BY table_name, ordinal_position
+"""
+
+
+class SchemaError(KeyError):
+    """Raised when a logical name cannot be resolved"""
+
+
+def quote_ident(name):
+    """Double-quote a PostgreSQL identifier"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+# ============================================
+# C# source parsing (EF mapping + enums)
+# ============================================
+
+def parse_ef_mapping(path=DBCONTEXT_PATH):
+    """
+    Read AppDbContext.cs and return
+    {logical table name (lowercase): (table, {property (lowercase): column})}
+    with entries for both the entity class and its DbSet name.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8-sig') as f:
+        source = f.read()
+
+    dbsets = {entity: name for entity, name in re.findall(r'DbSet<(\w+)>\s+(\w+)', source)}
+    mapping = {}
+    blocks = re.split(r'modelBuilder\.Entity<', source)[1:]
+    for block in blocks:
+        entity = re.match(r'(\w+)>', block).group(1)
+        table = re.search(r'ToTable\("([^"]+)"\)', block)
+        columns = {
+            prop.lower(): column
+            for prop, column in re.findall(r'Property\(\w+ => \w+\.(\w+)\)[^;]*?HasColumnName\("([^"]+)"\)', block)
+        }
+        if entity.lower() in mapping:
+            mapping[entity.lower()][1].update(columns)
+            continue
+        if not table:
+            continue
+        entry = (table.group(1), columns)
+        mapping[entity.lower()] = entry
+        if entity in dbsets:
+            mapping[dbsets[entity].lower()] = entry
+    return mapping
+
+
+def parse_enums(directory=ENTITIES_DIR):
+    """Return {enum name: {member: int value}} for every enum in Domain/Entities"""
+    enums = {}
+    for path in glob.glob(os.path.join(directory, '*.cs')):
+        with open(path, encoding='utf-8-sig') as f:
+            source = f.read()
+        for name, body in re.findall(r'public enum (\w+)\s*\{(.*?)\}', source, re.S):
+            body = re.sub(r'//[^\n]*|/\*.*?\*/', '', body, flags=re.S)
+            members = {}
+            value = -1
+            for item in body.split(','):
+                item = item.strip()
+                if not item:
+                    continue
+                match = re.match(r'(\w+)\s*(?:=\s*(-?\d+))?', item)
+                if not match:
+                    continue
+                value = int(match.group(2)) if match.group(2) is not None else value + 1
+                members[match.group(1)] = value
+            enums[name] = members
+    return enums
+
+
+# ============================================
+# Resolver
+# ============================================
+
+class SchemaResolver:
+    """Maps logical table/column/enum names to real identifiers"""
+
+    def __init__(self, tables, version=None):
+        # {actual table: [actual columns]}
+        self.tables = tables
+        self.version = version
+        self._tables_ci = {t.lower(): t for t in tables}
+        self._columns_ci = {t: {c.lower(): c for c in cols} for t, cols in tables.items()}
+        self.ef = parse_ef_mapping()
+        self.enums = parse_enums()
+
+    @classmethod
+    def load(cls, conn=None, cache_path=DEFAULT_CACHE_PATH, refresh=False, offline=False):
+        """
+        Load from the disk cache when its version matches the database,
+        otherwise introspect information_schema and rewrite the cache.
+        With offline=True the cache is used as-is without touching the database.
+        """
+        cached = None
+        if not refresh and os.path.exists(cache_path):
+            with open(cache_path, encoding='utf-8') as f:
+                cached = json.load(f)
+        if offline:
+            if cached is None:
+                raise SchemaError(f"No schema cache at {cache_path}")
+            return cls(cached['tables'], cached['version'])
+
+        version = fetch_schema_version(conn)
+        if cached and cached.get('version') == version:
+            return cls(cached['tables'], version)
+
+        tables = fetch_catalog(conn)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'tables': tables}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, cache_path)
+        return cls(tables, version)
+
+    def table(self, logical):
+        """Actual table name for a table, entity or DbSet name"""
+        key = logical.lower()
+        if key in self._tables_ci:
+            return self._tables_ci[key]
+        if key in self.ef and self.ef[key][0].lower() in self._tables_ci:
+            return self._tables_ci[self.ef[key][0].lower()]
+        raise SchemaError(f"Unknown table '{logical}'")
+
+    def column(self, logical_table, logical_column):
+        """Actual column name for a column or EF property name"""
+        table = self.table(logical_table)
+        columns = self._columns_ci[table]
+        key = logical_column.lower()
+        if key in columns:
+            return columns[key]
+        for ef_table, ef_columns in self._ef_entries(logical_table, table):
+            mapped = ef_columns.get(key)
+            if mapped and mapped.lower() in columns:
+                return columns[mapped.lower()]
+        raise SchemaError(f"Unknown column '{logical_column}' in table '{table}'")
+
+    def _ef_entries(self, logical_table, table):
+        seen = set()
+        for key in (logical_table.lower(), table.lower()):
+            entry = self.ef.get(key)
+            if entry and id(entry) not in seen:
+                seen.add(id(entry))
+                yield entry
+        for entry in self.ef.values():
+            if entry[0].lower() == table.lower() and id(entry) not in seen:
+                seen.add(id(entry))
+                yield entry
+
+    def enum(self, enum_name, member):
+        """Integer value of a C# enum member"""
+        try:
+            return self.enums[enum_name][member]
+        except KeyError:
+            raise SchemaError(f"Unknown enum value '{enum_name}.{member}'") from None
+
+    def sql(self, query):
+        """Rewrite {Table}, {Table.Column} and {Enum.Member} placeholders"""
+        def replace(match):
+            first, second = match.group(1), match.group(2)
+            if second is None:
+                return quote_ident(self.table(first))
+            if first in self.enums and second in self.enums[first]:
+                return str(self.enums[first][second])
+            return quote_ident(self.column(first, second))
+        return PLACEHOLDER.sub(replace, query)
+
+
+def fetch_schema_version(conn):
+    """Cheap fingerprint of the schema: latest EF migration, table and column counts, md5 of the names"""
+    cur = conn.cursor()
+    # قاعدة بدون جدول __EFMigrationsHistory - السؤال أولاً بدلاً من rollback لمعاملة المستدعي
+    cur.execute("""SELECT to_regclass('public."__EFMigrationsHistory"') IS NOT NULL""")
+    cur.execute(VERSION_QUERY if cur.fetchone()[0] else VERSION_QUERY_NO_EF)
+    migration, table_count, column_count, names = cur.fetchone()
+    cur.close()
+    return f"{migration or '-'}:{table_count}:{column_count}:{names}"
+
+
+def fetch_catalog(conn):
+    """Introspect every public table's columns in one query"""
+    cur = conn.cursor()
+    cur.execute(CATALOG_QUERY)
+    tables = {}
+    for table, column in cur.fetchall():
+        tables.setdefault(table, []).append(column)
+    cur.close()
+    return tables
+
+
+_resolver = None
+
+
+def get_resolver(conn=None, offline=False):
+    """Process-wide resolver (loaded once)"""
+    global _resolver
+    if _resolver is None:
+        _resolver = SchemaResolver.load(conn, offline=offline)
+    return _resolver
+
+
+def resolve_sql(conn, query):
+    """Rewrite a logical query using the process-wide resolver"""
+    return get_resolver(conn).sql(query)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resolve logical table/column names to real identifiers")
+    parser.add_argument('query', nargs='?', help="logical query to rewrite")
+    parser.add_argument('--show', help="list the real columns of a table (logical name accepted)")
+    parser.add_argument('--refresh', action='store_true', help="ignore the cache and introspect again")
+    parser.add_argument('--offline', action='store_true', help="use the cache without connecting")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    if args.offline:
+        resolver = SchemaResolver.load(offline=True)
+    else:
+        from db_pool import close_pool, connection
+        try:
+            with connection() as conn:
+                resolver = SchemaResolver.load(conn, refresh=args.refresh)
+        finally:
+            close_pool()
+
+    print(f"Schema version: {resolver.version}  ({len(resolver.tables)} tables)")
+    if args.show:
+        table = resolver.table(args.show)
+        print(f"\n{table}:")
+        for column in resolver.tables[table]:
+            print(f"  - {column}")
+    if args.query:
+        print("\n" + resolver.sql(args.query))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Schema Snapshot & Diff
+لقطة كاملة لبنية قاعدة البيانات ومقارنتها بلقطة أخرى أو بالـ EF Migrations
+
+Replaces check_db_schema.py / check_pg_schema.py / check_schema.py /
+check_columns.py / check_trips_columns.py: instead of one information_schema
+query per table, the whole catalog (tables, columns, types, defaults,
+indexes, constraints and foreign keys) is read with four pg_catalog queries
+and stored as a compact JSON snapshot (gzip when the name ends in .gz).
+
+Usage:
+    python schema_snapshot.py take schema.json.gz
+    python schema_snapshot.py diff old.json.gz new.json.gz
+    python schema_snapshot.py ef schema.json.gz        # snapshot vs EF migrations
+    python schema_snapshot.py ef                       # live database vs EF migrations
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(SCRIPT_DIR, 'Infrastructure', 'Migrations')
+MODEL_SNAPSHOT_PATH = os.path.join(MIGRATIONS_DIR, 'AppDbContextModelSnapshot.cs')
+
+SNAPSHOT_VERSION = 1
+
+# جداول لا تتبع الـ EF model
+IGNORED_TABLES = {'__EFMigrationsHistory'}
+
+TABLES_QUERY = """
+    SELECT c.oid, c.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+"""
+
+COLUMNS_QUERY = """
+    SELECT a.attrelid, a.attname, format_type(a.atttypid, a.atttypmod),
+           a.attnotnull, pg_get_expr(d.adbin, d.adrelid), a.attnum
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+      AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attrelid, a.attnum
+"""
+
+INDEXES_QUERY = """
+    SELECT i.indrelid, ic.relname, i.indisunique, i.indisprimary,
+           ARRAY(SELECT a.attname
+                 FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                 JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                 ORDER BY k.ord),
+           pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_class c ON c.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public'
+"""
+
+CONSTRAINTS_QUERY = """
+    SELECT con.conrelid, con.conname, con.contype, pg_get_constraintdef(con.oid),
+           ref.relname
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_class ref ON ref.oid = con.confrelid
+    WHERE n.nspname = 'public'
+"""
+
+CONSTRAINT_TYPES = {'p': 'primary key', 'f': 'foreign key', 'u': 'unique', 'c': 'check', 'x': 'exclude'}
+
+
+# ============================================
+# Taking / storing snapshots
+# ============================================
+
+def take_snapshot(conn):
+    """Read the whole public schema in four catalog queries"""
+    cur = conn.cursor()
+    cur.execute(TABLES_QUERY)
+    names = dict(cur.fetchall())
+    tables = {name: {'columns': {}, 'indexes': {}, 'constraints': {}} for name in names.values()}
+
+    cur.execute(COLUMNS_QUERY)
+    for relid, column, col_type, not_null, default, position in cur.fetchall():
+        tables[names[relid]]['columns'][column] = {
+            'type': col_type,
+            'nullable': not not_null,
+            'default': default,
+            'position': position,
+        }
+
+    cur.execute(INDEXES_QUERY)
+    for relid, index, unique, primary, columns, definition in cur.fetchall():
+        if relid in names:
+            tables[names[relid]]['indexes'][index] = {
+                'columns': list(columns),
+                'unique': unique,
+                'primary': primary,
+                'definition': definition,
+            }
+
+    cur.execute(CONSTRAINTS_QUERY)
+    for relid, name, con_type, definition, references in cur.fetchall():
+        if relid in names:
+            tables[names[relid]]['constraints'][name] = {
+                'type': CONSTRAINT_TYPES.get(con_type, con_type),
+                'definition': definition,
+                'references': references,
+            }
+    cur.close()
+
+    return {
+        'version': SNAPSHOT_VERSION,
+        'taken_at': datetime.now().isoformat(timespec='seconds'),
+        'source': 'database',
+        'tables': tables,
+    }
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def save_snapshot(snapshot, path):
+    """Write a snapshot as compact JSON"""
+    with _open(path, 'w') as f:
+        json.dump(snapshot, f, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def load_snapshot(path):
+    with _open(path, 'r') as f:
+        return json.load(f)
+
+
+# ============================================
+# EF migrations as a snapshot
+# ============================================
+
+def _split_entity_blocks(source):
+    """Yield the body of every modelBuilder.Entity("...", b => { ... }) block"""
+    for match in re.finditer(r'modelBuilder\.Entity\("[\w.]+", b =>\s*\{', source):
+        depth = 1
+        i = match.end()
+        while depth and i < len(source):
+            if source[i] == '{':
+                depth += 1
+            elif source[i] == '}':
+                depth -= 1
+            i += 1
+        yield source[match.end():i - 1]
+
+
+def ef_snapshot(model_path=MODEL_SNAPSHOT_PATH, migrations_dir=MIGRATIONS_DIR):
+    """
+    Build the expected schema from AppDbContextModelSnapshot.cs, plus columns
+    added with raw "ALTER TABLE ... ADD COLUMN" SQL in hand-written migrations
+    (those never reach the model snapshot).
+    """
+    with open(model_path, encoding='utf-8-sig') as f:
+        source = f.read()
+
+    tables = {}
+    for block in _split_entity_blocks(source):
+        table = re.search(r'b\.ToTable\("([^"]+)"', block)
+        if not table:
+            continue
+        columns = {}
+        properties = {}
+        for clr_type, prop, chain in re.findall(r'^\s*b\.Property<([\w?]+)>\("(\w+)"\)([^;]*);', block, re.M):
+            column = re.search(r'HasColumnName\("([^"]+)"\)', chain)
+            column = column.group(1) if column else prop
+            if column == 'xmin':
+                continue
+            col_type = re.search(r'HasColumnType\("([^"]+)"\)', chain)
+            nullable = clr_type.endswith('?') or (clr_type == 'string' and '.IsRequired()' not in chain)
+            columns[column] = {'type': col_type.group(1) if col_type else None, 'nullable': nullable}
+            properties[prop] = column
+        indexes = {}
+        for index_props, chain in re.findall(r'b\.HasIndex\(([^)]*)\)([^;]*);', block):
+            cols = [properties.get(p, p) for p in re.findall(r'"(\w+)"', index_props)]
+            name = re.search(r'HasDatabaseName\("([^"]+)"\)', chain)
+            name = name.group(1) if name else f"IX_{table.group(1)}_{'_'.join(cols)}"
+            indexes[name] = {'columns': cols, 'unique': '.IsUnique()' in chain, 'primary': False}
+        tables[table.group(1)] = {'columns': columns, 'indexes': indexes, 'constraints': {}}
+
+    for path in sorted(glob.glob(os.path.join(migrations_dir, '*.cs'))):
+        if path.endswith('.Designer.cs') or path == model_path:
+            continue
+        with open(path, encoding='utf-8-sig') as f:
+            up = f.read().split('void Down(')[0]
+        for table, column, col_type in re.findall(
+                r'ALTER TABLE\s+"?(\w+)"?\s+ADD COLUMN\s+(?:IF NOT EXISTS\s+)?"?(\w+)"?\s+([^;,\n]+?)\s*;', up, re.I):
+            if table in tables and column not in tables[table]['columns']:
+                tables[table]['columns'][column] = {'type': col_type.strip(), 'nullable': 'NOT NULL' not in col_type.upper()}
+
+    return {'version': SNAPSHOT_VERSION, 'source': 'ef', 'tables': tables}
+
+
+# ============================================
+# Diff
+# ============================================
+
+def _normalize_type(col_type):
+    if col_type is None:
+        return None
+    col_type = col_type.lower().strip()
+    aliases = {'int': 'integer', 'int4': 'integer', 'int8': 'bigint', 'bool': 'boolean',
+               'varchar': 'character varying', 'timestamptz': 'timestamp with time zone'}
+    for short, full in aliases.items():
+        col_type = re.sub(rf'^{short}\b', full, col_type)
+    return col_type
+
+
+def diff_snapshots(old, new, compare_defaults=True):
+    """
+    Return a list of (kind, object, detail) describing how `new` differs from
+    `old`. Index comparison is by column list, so differently named but
+    equivalent indexes (EF's IX_* vs hand-written ix_*) are not reported.
+    """
+    changes = []
+    old_tables = {t: v for t, v in old['tables'].items() if t not in IGNORED_TABLES}
+    new_tables = {t: v for t, v in new['tables'].items() if t not in IGNORED_TABLES}
+
+    for table in sorted(set(old_tables) - set(new_tables)):
+        changes.append(('table removed', table, ''))
+    for table in sorted(set(new_tables) - set(old_tables)):
+        changes.append(('table added', table, ''))
+
+    for table in sorted(set(old_tables) & set(new_tables)):
+        old_cols = old_tables[table]['columns']
+        new_cols = new_tables[table]['columns']
+        for column in sorted(set(old_cols) - set(new_cols)):
+            changes.append(('column removed', f"{table}.{column}", old_cols[column].get('type') or ''))
+        for column in sorted(set(new_cols) - set(old_cols)):
+            changes.append(('column added', f"{table}.{column}", new_cols[column].get('type') or ''))
+        for column in sorted(set(old_cols) & set(new_cols)):
+            a, b = old_cols[column], new_cols[column]
+            type_a, type_b = _normalize_type(a.get('type')), _normalize_type(b.get('type'))
+            if type_a and type_b and type_a != type_b:
+                changes.append(('type changed', f"{table}.{column}", f"{a['type']} -> {b['type']}"))
+            if a.get('nullable') != b.get('nullable'):
+                changes.append(('nullability changed', f"{table}.{column}",
+                                f"{'NULL' if a.get('nullable') else 'NOT NULL'} -> "
+                                f"{'NULL' if b.get('nullable') else 'NOT NULL'}"))
+            if compare_defaults and 'default' in a and 'default' in b and a['default'] != b['default']:
+                changes.append(('default changed', f"{table}.{column}", f"{a['default']} -> {b['default']}"))
+
+        old_idx = {tuple(i['columns']): name for name, i in old_tables[table]['indexes'].items() if not i.get('primary')}
+        new_idx = {tuple(i['columns']): name for name, i in new_tables[table]['indexes'].items() if not i.get('primary')}
+        for cols in sorted(set(old_idx) - set(new_idx)):
+            changes.append(('index removed', f"{table}.{old_idx[cols]}", ', '.join(cols)))
+        for cols in sorted(set(new_idx) - set(old_idx)):
+            changes.append(('index added', f"{table}.{new_idx[cols]}", ', '.join(cols)))
+
+        old_con = old_tables[table]['constraints']
+        new_con = new_tables[table]['constraints']
+        if old_con and new_con:
+            for name in sorted(set(old_con) - set(new_con)):
+                changes.append(('constraint removed', f"{table}.{name}", old_con[name]['definition']))
+            for name in sorted(set(new_con) - set(old_con)):
+                changes.append(('constraint added', f"{table}.{name}", new_con[name]['definition']))
+            for name in sorted(set(old_con) & set(new_con)):
+                if old_con[name]['definition'] != new_con[name]['definition']:
+                    changes.append(('constraint changed', f"{table}.{name}",
+                                    f"{old_con[name]['definition']} -> {new_con[name]['definition']}"))
+    return changes
+
+
+def print_changes(changes, title):
+    print("=" * 80)
+    print(title)
+    print("=" * 80)
+    if not changes:
+        print("✅ No differences")
+        return
+    for kind, obj, detail in changes:
+        print(f"  {kind:<22} {obj:<50} {detail}")
+    print(f"\n⚠️  {len(changes)} difference(s)")
+
+
+def _live_snapshot():
+    from db_pool import close_pool, connection
+    started = time.perf_counter()
+    try:
+        with connection() as conn:
+            snapshot = take_snapshot(conn)
+    finally:
+        close_pool()
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"📸 Snapshot: {len(snapshot['tables'])} tables in {elapsed:.0f} ms", file=sys.stderr)
+    return snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schema snapshot and diff tool")
+    sub = parser.add_subparsers(dest='command', required=True)
+    take = sub.add_parser('take', help="snapshot the live database")
+    take.add_argument('path')
+    diff = sub.add_parser('diff', help="compare two snapshot files")
+    diff.add_argument('old')
+    diff.add_argument('new')
+    ef = sub.add_parser('ef', help="compare a snapshot (or the live database) with the EF migrations")
+    ef.add_argument('path', nargs='?')
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    if args.command == 'take':
+        save_snapshot(_live_snapshot(), args.path)
+        print(f"✅ Saved {args.path} ({os.path.getsize(args.path)} bytes)")
+        return 0
+
+    if args.command == 'diff':
+        changes = diff_snapshots(load_snapshot(args.old), load_snapshot(args.new))
+        print_changes(changes, f"{args.old} -> {args.new}")
+        return 1 if changes else 0
+
+    actual = load_snapshot(args.path) if args.path else _live_snapshot()
+    changes = diff_snapshots(ef_snapshot(), actual, compare_defaults=False)
+    print_changes(changes, "EF migrations -> " + (args.path or "database"))
+    return 1 if changes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
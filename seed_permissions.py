@@ -0,0 +1,221 @@
+"""
+Permission Seeder
+مزامنة الصلاحيات والأدوار مع ملف permissions_seed.json بدون حذف وإعادة إدخال
+
+permissions_seed.json holds the permission catalog (PermissionType member,
+name, category, module, system flag) and the permissions of each role.
+Role entries may list PermissionType member names, plain numbers,
+"module:<Module>" for a whole module, or "*" for everything.
+
+The seeder applies only the difference, with one statement per table,
+inside a single transaction:
+
+    permissions      INSERT ... ON CONFLICT ("PermissionType") DO UPDATE,
+                     only for rows whose name/category/module/flag changed;
+                     permissions missing from the catalog are deleted
+    roles            INSERT ... ON CONFLICT (rolename) DO UPDATE description
+    rolepermissions  DELETE ... WHERE (roleid, permissionid) NOT IN (desired)
+                     INSERT ... ON CONFLICT DO NOTHING
+
+Unchanged rows are never touched, so re-seeding an up-to-date database
+writes nothing, and logged-in users never see a role without its
+permissions the way they did with reset_permissions.py. Roles that are not
+in the file (and their permissions) are left alone.
+
+Needs the unique keys from migration 20260301_permission_natural_keys
+(python migrate.py).
+
+Usage:
+    python seed_permissions.py
+    python seed_permissions.py --dry-run
+    python seed_permissions.py --file other_seed.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from db_pool import close_pool, connection
+from schema_resolver import parse_enums
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SEED_PATH = os.path.join(SCRIPT_DIR, 'permissions_seed.json')
+
+REQUIRED_INDEXES = ('ux_permissions_permissiontype', 'ux_roles_rolename', 'ux_rolepermissions_roleid_permissionid')
+
+UPSERT_PERMISSIONS_SQL = """
+    INSERT INTO permissions ("PermissionType", permissionname, "Category", "Module", "IsSystemPermission")
+    SELECT * FROM unnest(%s::int[], %s::text[], %s::text[], %s::text[], %s::boolean[])
+    ON CONFLICT ("PermissionType") DO UPDATE
+    SET permissionname = EXCLUDED.permissionname,
+        "Category" = EXCLUDED."Category",
+        "Module" = EXCLUDED."Module",
+        "IsSystemPermission" = EXCLUDED."IsSystemPermission"
+    WHERE (permissions.permissionname, permissions."Category", permissions."Module", permissions."IsSystemPermission")
+          IS DISTINCT FROM
+          (EXCLUDED.permissionname, EXCLUDED."Category", EXCLUDED."Module", EXCLUDED."IsSystemPermission")
+"""
+
+UPSERT_ROLES_SQL = """
+    INSERT INTO roles (rolename, description)
+    SELECT * FROM unnest(%s::text[], %s::text[])
+    ON CONFLICT (rolename) DO UPDATE
+    SET description = EXCLUDED.description
+    WHERE roles.description IS DISTINCT FROM EXCLUDED.description
+"""
+
+# (rolename, permissiontype) pairs -> (roleid, permissionid)
+DESIRED_SQL = """
+    SELECT r.roleid, p.permissionid
+    FROM unnest(%s::text[], %s::int[]) AS d(rolename, permissiontype)
+    JOIN roles r ON r.rolename = d.rolename
+    JOIN permissions p ON p."PermissionType" = d.permissiontype
+"""
+
+DELETE_ROLE_PERMISSIONS_SQL = f"""
+    DELETE FROM rolepermissions
+    WHERE (roleid IN (SELECT roleid FROM roles WHERE rolename = ANY(%s))
+           OR permissionid IN (SELECT permissionid FROM permissions WHERE "PermissionType" <> ALL(%s)))
+      AND (roleid, permissionid) NOT IN ({DESIRED_SQL})
+"""
+
+INSERT_ROLE_PERMISSIONS_SQL = f"""
+    INSERT INTO rolepermissions (roleid, permissionid)
+    {DESIRED_SQL}
+    ON CONFLICT (roleid, permissionid) DO NOTHING
+"""
+
+DELETE_PERMISSIONS_SQL = 'DELETE FROM permissions WHERE "PermissionType" <> ALL(%s)'
+
+
+class SeedError(Exception):
+    pass
+
+
+def load_seed(path=DEFAULT_SEED_PATH, enum=None):
+    """
+    Read the seed file and return (permissions, roles):
+    permissions = [(type, name, category, module, system)],
+    roles = {rolename: (description, set of permission types)}
+    """
+    with open(path, encoding='utf-8-sig') as f:
+        seed = json.load(f)
+    if enum is None:
+        enum = parse_enums().get('PermissionType', {})
+
+    def type_value(ref):
+        if isinstance(ref, int):
+            return ref
+        if ref not in enum:
+            raise SeedError(f"unknown PermissionType '{ref}'")
+        return enum[ref]
+
+    permissions = []
+    for entry in seed['permissions']:
+        permissions.append((type_value(entry['type']), entry['name'], entry['category'],
+                            entry['module'], bool(entry.get('system', False))))
+    types = [p[0] for p in permissions]
+    if len(set(types)) != len(types):
+        raise SeedError("duplicate permission type in catalog")
+    known = set(types)
+
+    roles = {}
+    for role_name, role in seed['roles'].items():
+        granted = set()
+        for ref in role['permissions']:
+            if ref == '*':
+                granted |= known
+            elif isinstance(ref, str) and ref.startswith('module:'):
+                module = ref.split(':', 1)[1]
+                matched = {p[0] for p in permissions if p[3] == module}
+                if not matched:
+                    raise SeedError(f"role '{role_name}': no permissions in module '{module}'")
+                granted |= matched
+            else:
+                value = type_value(ref)
+                if value not in known:
+                    raise SeedError(f"role '{role_name}': permission {ref} is not in the catalog")
+                granted.add(value)
+        roles[role_name] = (role.get('description'), granted)
+    return permissions, roles
+
+
+def missing_indexes(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT relname FROM pg_class WHERE relkind = 'i' AND relname = ANY(%s)", (list(REQUIRED_INDEXES),))
+    found = {row[0] for row in cur.fetchall()}
+    cur.close()
+    return [name for name in REQUIRED_INDEXES if name not in found]
+
+
+def seed(conn, permissions, roles):
+    """Apply the difference in the caller's transaction; returns {change: row count}"""
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('seed_permissions'))")
+
+    types = [p[0] for p in permissions]
+    cur.execute(UPSERT_PERMISSIONS_SQL, [list(column) for column in zip(*permissions)])
+    changes = {'permissions upserted': cur.rowcount}
+
+    role_names = list(roles)
+    cur.execute(UPSERT_ROLES_SQL, (role_names, [roles[name][0] for name in role_names]))
+    changes['roles upserted'] = cur.rowcount
+
+    pairs = [(name, t) for name in role_names for t in sorted(roles[name][1])]
+    pair_names = [name for name, _ in pairs]
+    pair_types = [t for _, t in pairs]
+    cur.execute(DELETE_ROLE_PERMISSIONS_SQL, (role_names, types, pair_names, pair_types))
+    changes['role permissions revoked'] = cur.rowcount
+    cur.execute(INSERT_ROLE_PERMISSIONS_SQL, (pair_names, pair_types))
+    changes['role permissions granted'] = cur.rowcount
+
+    cur.execute(DELETE_PERMISSIONS_SQL, (types,))
+    changes['permissions removed'] = cur.rowcount
+    cur.close()
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync permissions and roles with the seed file")
+    parser.add_argument('--file', default=DEFAULT_SEED_PATH, help="seed file (default: permissions_seed.json)")
+    parser.add_argument('--dry-run', action='store_true', help="show the changes and roll back")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    try:
+        permissions, roles = load_seed(args.file)
+    except (OSError, ValueError, KeyError, SeedError) as e:
+        print(f"❌ {args.file}: {e}")
+        return 1
+
+    started = time.perf_counter()
+    try:
+        with connection() as conn:
+            missing = missing_indexes(conn)
+            if missing:
+                print(f"❌ Missing unique indexes {', '.join(missing)} - run: python migrate.py")
+                return 1
+            changes = seed(conn, permissions, roles)
+            if args.dry_run:
+                conn.rollback()
+    finally:
+        close_pool()
+
+    elapsed = (time.perf_counter() - started) * 1000
+    for change, count in changes.items():
+        print(f"  {change:<26} {count}")
+    if not any(changes.values()):
+        print(f"✅ Already up to date ({elapsed:.0f} ms)")
+    elif args.dry_run:
+        print(f"🔍 Dry run - nothing written ({elapsed:.0f} ms)")
+    else:
+        print(f"✅ Permissions synced ({elapsed:.0f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
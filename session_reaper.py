@@ -0,0 +1,208 @@
+"""
+Stale Session Reaper
+إنهاء الجلسات المعلقة من البرامج التي أُغلقت بشكل مفاجئ
+
+MainForm sends a heartbeat (last_activity_time) every minute, and
+SessionManager only cleans up after a crash when the same machine starts the
+app again. This reaper expires every active session whose heartbeat is
+older than --minutes. It works in UPDATE batches of --batch rows, each in a
+transaction of its own. Every batch selects with "is_active = TRUE", so it
+reads the partial index idx_active_sessions_is_active instead of the table,
+and uses SKIP LOCKED so it never waits on a heartbeat in flight.
+
+With --terminate it also ends the PostgreSQL backends left behind by those
+clients. It only touches backends that are 'idle' (never in a transaction)
+for longer than --minutes, coming from an address that no longer has an
+active session (loopback counts as --server-machine, as in
+session_telemetry.py). Backends of the ops tools that set an
+application_name (pg_proxy, session_telemetry, lock_monitor, this script)
+are never touched: pg_proxy keeps pooled server connections idle on
+purpose, usually from the database host itself. Clients that connect
+through pg_proxy show the proxy's address, not their own, so their
+sessions cannot be matched to backends here - --terminate only helps for
+clients that connect directly.
+
+A pg_try_advisory_lock keeps overlapping runs from racing. With nothing
+stale, a run is one index probe, so it is fine to schedule every minute
+(Task Scheduler / cron) or to run with --every 60.
+
+Usage:
+    python session_reaper.py                       # expire sessions silent for 10+ minutes
+    python session_reaper.py --minutes 30 --terminate
+    python session_reaper.py --dry-run --terminate
+    python session_reaper.py --every 60            # keep running, one pass a minute
+"""
+
+import argparse
+import socket
+import sys
+import time
+
+import psycopg2
+
+from db_pool import get_connection
+from session_telemetry import LOCAL_ADDRESSES
+
+ADVISORY_LOCK_KEY = 'session_reaper'
+
+# application_name of the long-running ops tools; their idle backends are not leftovers
+TOOL_APPLICATIONS = ['pg_proxy', 'session_telemetry', 'lock_monitor', 'session_reaper']
+
+# is_active = TRUE matches the predicate of idx_active_sessions_is_active
+EXPIRE_BATCH_SQL = """
+    WITH stale AS (
+        SELECT id FROM active_sessions
+        WHERE is_active = TRUE
+          AND last_activity_time < now() - make_interval(mins => %s)
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE active_sessions s
+    SET is_active = FALSE, logout_time = NOW()
+    FROM stale
+    WHERE s.id = stale.id
+    RETURNING s.username, s.machine_name, s.ip_address, s.last_activity_time
+"""
+
+STALE_SQL = """
+    SELECT username, machine_name, ip_address, last_activity_time
+    FROM active_sessions
+    WHERE is_active = TRUE
+      AND last_activity_time < now() - make_interval(mins => %s)
+"""
+
+LIVE_ADDRESSES_SQL = """
+    SELECT machine_name, ip_address FROM active_sessions
+    WHERE is_active = TRUE
+      AND last_activity_time >= now() - make_interval(mins => %s)
+"""
+
+IDLE_BACKENDS_SQL = """
+    SELECT pid, host(client_addr), usename, application_name,
+           EXTRACT(EPOCH FROM now() - state_change)
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+      AND backend_type = 'client backend'
+      AND pid <> pg_backend_pid()
+      AND state = 'idle'
+      AND state_change < now() - make_interval(mins => %s)
+      AND application_name <> ALL(%s)
+"""
+
+
+def _address(machine, ip, server_machine):
+    return 'local' if (machine or '').lower() == server_machine.lower() else ip
+
+
+def expire_sessions(conn, minutes, batch, max_batches, dry_run):
+    """Expire stale sessions batch by batch; returns the rows expired (or that would be)"""
+    cur = conn.cursor()
+    if dry_run:
+        cur.execute(STALE_SQL, (minutes,))
+        return cur.fetchall()
+    expired = []
+    for _ in range(max_batches):
+        cur.execute(EXPIRE_BATCH_SQL, (minutes, batch))
+        rows = cur.fetchall()
+        conn.commit()
+        expired.extend(rows)
+        if len(rows) < batch:
+            break
+    return expired
+
+
+def terminate_backends(conn, expired, minutes, server_machine, dry_run):
+    """End idle backends from the addresses of the expired sessions; returns (pid, address, user, idle s)"""
+    cur = conn.cursor()
+    candidates = {_address(machine, ip, server_machine) for _, machine, ip, _ in expired}
+    cur.execute(LIVE_ADDRESSES_SQL, (minutes,))
+    candidates -= {_address(machine, ip, server_machine) for machine, ip in cur.fetchall()}
+    if not candidates:
+        return []
+
+    cur.execute(IDLE_BACKENDS_SQL, (minutes, TOOL_APPLICATIONS))
+    ended = []
+    for pid, client_addr, user, application, idle_s in cur.fetchall():
+        address = 'local' if client_addr in LOCAL_ADDRESSES else client_addr
+        if address not in candidates:
+            continue
+        if not dry_run:
+            # the backend may have woken up since the SELECT - only end it if still idle
+            cur.execute("SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE pid = %s AND state = 'idle'",
+                        (pid,))
+            row = cur.fetchone()
+            if not (row and row[0]):
+                continue
+        ended.append((pid, client_addr or 'local socket', user, round(float(idle_s))))
+    conn.commit()
+    return ended
+
+
+def reap(conn, args):
+    """One pass; returns False when another run holds the advisory lock"""
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (ADVISORY_LOCK_KEY,))
+    if not cur.fetchone()[0]:
+        conn.commit()
+        return False
+    try:
+        expired = expire_sessions(conn, args.minutes, args.batch, args.max_batches, args.dry_run)
+        ended = []
+        if args.terminate and expired:
+            ended = terminate_backends(conn, expired, args.minutes, args.server_machine, args.dry_run)
+    finally:
+        conn.rollback()
+        cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (ADVISORY_LOCK_KEY,))
+        conn.commit()
+
+    verb = 'would expire' if args.dry_run else 'expired'
+    if expired or not args.every:
+        print(f"{time.strftime('%H:%M:%S')}  {len(expired)} session(s) {verb}")
+    for username, machine, ip, last_activity in expired:
+        print(f"   {username} @ {machine} ({ip}), last heartbeat {last_activity:%Y-%m-%d %H:%M}")
+    for pid, address, user, idle_s in ended:
+        print(f"   {'would end' if args.dry_run else 'ended'} backend {pid} from {address} ({user}, idle {idle_s}s)")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Expire active_sessions rows whose client stopped sending heartbeats")
+    parser.add_argument('--minutes', type=int, default=10, help="heartbeat age that counts as stale (default: 10)")
+    parser.add_argument('--batch', type=int, default=200, help="rows per UPDATE (default: 200)")
+    parser.add_argument('--max-batches', type=int, default=50, help="UPDATEs per pass (default: 50)")
+    parser.add_argument('--terminate', action='store_true', help="also end idle backends left by those clients")
+    parser.add_argument('--server-machine', default=socket.gethostname(),
+                        help="machine_name whose backends connect over loopback (default: this host)")
+    parser.add_argument('--dry-run', action='store_true', help="show what would be expired and ended")
+    parser.add_argument('--every', type=float, default=0, help="repeat every N seconds until Ctrl+C")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    try:
+        conn = get_connection()
+    except psycopg2.Error as e:
+        print(f"❌ {str(e).strip()}")
+        return 1
+    try:
+        conn.cursor().execute("SET application_name = 'session_reaper'")
+        conn.commit()
+        while True:
+            if not reap(conn, args):
+                print("⚠️  Another reaper run holds the lock - skipped")
+            if not args.every:
+                break
+            time.sleep(args.every)
+    except KeyboardInterrupt:
+        pass
+    except psycopg2.Error as e:
+        print(f"❌ {str(e).strip()}")
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""
+Session Telemetry Sampler
+ربط جلسات البرنامج (active_sessions) باتصالات PostgreSQL وتسجيلها على فترات
+
+Every --interval seconds the sampler reads the active app sessions
+(active_sessions: user, machine_name, ip_address, last_activity_time) and
+every client backend in pg_stat_activity. It then matches them by client
+address. SessionManager records the machine's LAN address, so backends from
+127.0.0.1 / ::1 / a unix socket are matched to --server-machine instead.
+Backends from an address where several users are logged in (a terminal
+server) can't be told apart and are counted as "shared"; backends with no
+app session at all are "unmatched" - other tools, or connections a crashed
+client never closed.
+
+Each sample appends one fixed-size record per user to a ring-buffer file
+(RECORD, 30 bytes), plus one server-wide record. Once the file holds
+--capacity records, the oldest are overwritten:
+
+    connections, active, idle, idle in transaction, app sessions,
+    longest idle-in-transaction, longest running query, oldest heartbeat
+
+--report reads the ring and prints p50/p95/p99/max per user, sizing hints
+for max_connections, and clients whose connection count keeps growing or
+is high for the number of app sessions they have open.
+
+Usage:
+    python session_telemetry.py                        # sample until Ctrl+C
+    python session_telemetry.py --interval 10 --capacity 500000
+    python session_telemetry.py --report --since 480   # last 8 hours
+"""
+
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+
+from db_pool import get_connection
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE = os.path.join(SCRIPT_DIR, 'session_telemetry.ring')
+
+STORE_VERSION = 1
+HEADER = struct.Struct('<4sHHIII')      # magic, version, record size, capacity, next slot, count
+MAGIC = b'GWRB'
+# ts, user_id, connections, active, idle, idle_in_tx, app_sessions,
+# max idle-in-transaction ms, max active query ms, max heartbeat age s
+RECORD = struct.Struct('<IiHHHHHIII')
+
+# Pseudo user ids
+SERVER_TOTAL = -1
+SHARED = -2
+UNMATCHED = 0
+
+LOCAL_ADDRESSES = {None, '127.0.0.1', '::1'}
+
+BACKENDS_SQL = """
+    SELECT host(client_addr), state,
+           EXTRACT(EPOCH FROM now() - state_change),
+           EXTRACT(EPOCH FROM now() - query_start)
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+      AND backend_type = 'client backend'
+      AND pid <> pg_backend_pid()
+"""
+
+# is_active = TRUE keeps this on idx_active_sessions_is_active
+APP_SESSIONS_SQL = """
+    SELECT user_id, username, machine_name, ip_address,
+           EXTRACT(EPOCH FROM now() - last_activity_time)
+    FROM active_sessions
+    WHERE is_active = TRUE
+"""
+
+
+# ============================================
+# Ring-buffer store
+# ============================================
+
+class RingStore:
+    """Fixed-size records in one preallocated file; the oldest are overwritten when full"""
+
+    def __init__(self, path, capacity=200000):
+        self.path = path
+        self.names_path = path + '.names.json'
+        exists = os.path.exists(path)
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            magic, version, size, self.capacity, self.next, self.count = HEADER.unpack(self.file.read(HEADER.size))
+            if magic != MAGIC or version != STORE_VERSION or size != RECORD.size:
+                self.file.close()
+                raise ValueError(f"{path} is not a version {STORE_VERSION} telemetry store")
+        else:
+            self.capacity, self.next, self.count = capacity, 0, 0
+            self.file.truncate(HEADER.size + capacity * RECORD.size)
+            self._write_header()
+        self.names = self._load_names()
+
+    def _write_header(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, STORE_VERSION, RECORD.size, self.capacity, self.next, self.count))
+
+    def _load_names(self):
+        if not os.path.exists(self.names_path):
+            return {}
+        with open(self.names_path, encoding='utf-8') as f:
+            return {int(k): v for k, v in json.load(f).get('users', {}).items()}
+
+    def remember(self, names):
+        """Keep user id -> name for the report; written only when something new shows up"""
+        if all(self.names.get(k) == v for k, v in names.items()):
+            return
+        self.names.update(names)
+        tmp = self.names_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': STORE_VERSION, 'users': self.names}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.names_path)
+
+    def append(self, records):
+        for record in records:
+            self.file.seek(HEADER.size + self.next * RECORD.size)
+            self.file.write(RECORD.pack(*record))
+            self.next = (self.next + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+        # header last: a crash mid-batch loses the batch, not the ring
+        self._write_header()
+        self.file.flush()
+
+    def records(self):
+        """Oldest first"""
+        start = self.next if self.count == self.capacity else 0
+        self.file.seek(HEADER.size)
+        data = self.file.read(self.capacity * RECORD.size)
+        for n in range(self.count):
+            slot = (start + n) % self.capacity
+            yield RECORD.unpack_from(data, slot * RECORD.size)
+
+    def close(self):
+        self.file.close()
+
+
+# ============================================
+# Sampling
+# ============================================
+
+class UserSample:
+    def __init__(self):
+        self.connections = self.active = self.idle = self.idle_in_tx = self.app_sessions = 0
+        self.max_idle_in_tx = self.max_active = self.max_heartbeat = 0.0
+
+    def add_backend(self, state, state_s, query_s):
+        self.connections += 1
+        if state == 'active':
+            self.active += 1
+            self.max_active = max(self.max_active, query_s or 0.0)
+        elif state == 'idle':
+            self.idle += 1
+        elif state in ('idle in transaction', 'idle in transaction (aborted)'):
+            self.idle_in_tx += 1
+            self.max_idle_in_tx = max(self.max_idle_in_tx, state_s or 0.0)
+
+    def record(self, ts, user_id):
+        cap = 0xFFFF
+        return (ts, user_id, min(self.connections, cap), min(self.active, cap), min(self.idle, cap),
+                min(self.idle_in_tx, cap), min(self.app_sessions, cap),
+                int(self.max_idle_in_tx * 1000), int(self.max_active * 1000), int(self.max_heartbeat))
+
+
+def take_sample(cur, server_machine):
+    """Return ({user_id: UserSample}, {user_id: username}) for this instant"""
+    cur.execute(APP_SESSIONS_SQL)
+    app_sessions = cur.fetchall()
+    cur.execute(BACKENDS_SQL)
+    backends = cur.fetchall()
+
+    users = {SERVER_TOTAL: UserSample()}
+    names = {}
+    users_at = {}   # client address -> app user ids logged in from it
+    for user_id, username, machine, ip, heartbeat_s in app_sessions:
+        names[user_id] = username
+        user = users.setdefault(user_id, UserSample())
+        user.app_sessions += 1
+        user.max_heartbeat = max(user.max_heartbeat, float(heartbeat_s or 0))
+        address = 'local' if (machine or '').lower() == server_machine.lower() else ip
+        users_at.setdefault(address, set()).add(user_id)
+
+    for client_addr, state, state_s, query_s in backends:
+        address = 'local' if client_addr in LOCAL_ADDRESSES else client_addr
+        owners = users_at.get(address, set())
+        owner = next(iter(owners)) if len(owners) == 1 else (SHARED if owners else UNMATCHED)
+        args = (state, float(state_s) if state_s is not None else None, float(query_s) if query_s is not None else None)
+        users.setdefault(owner, UserSample()).add_backend(*args)
+        users[SERVER_TOTAL].add_backend(*args)
+    users[SERVER_TOTAL].app_sessions = len(app_sessions)
+    return users, names
+
+
+def open_sampler_connection():
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SET application_name = 'session_telemetry'")
+    cur.execute("SHOW max_connections")
+    return conn, cur, int(cur.fetchone()[0])
+
+
+def run_sampler(store, interval, server_machine):
+    conn, cur, max_connections = open_sampler_connection()
+    store.remember({SERVER_TOTAL: f"max_connections={max_connections}"})
+    print(f"Sampling every {interval}s into {store.path} "
+          f"({store.count}/{store.capacity} records used, Ctrl+C to stop)")
+    next_sample = time.monotonic()
+    try:
+        while True:
+            try:
+                users, names = take_sample(cur, server_machine)
+            except psycopg2.OperationalError as e:
+                print(f"⚠️  {str(e).strip()} - reconnecting")
+                time.sleep(max(interval, 1))
+                conn.close()
+                conn, cur, _ = open_sampler_connection()
+                continue
+            ts = int(time.time())
+            store.remember(names)
+            store.append(user.record(ts, user_id) for user_id, user in users.items())
+            next_sample += interval
+            time.sleep(max(0, next_sample - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+    return 0
+
+
+# ============================================
+# Report
+# ============================================
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    rank = max(1, round(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def label(store, user_id):
+    if user_id == SERVER_TOTAL:
+        return '(server total)'
+    if user_id == SHARED:
+        return '(shared machine)'
+    if user_id == UNMATCHED:
+        return '(no app session)'
+    return store.names.get(user_id, f"user {user_id}")
+
+
+def leak_suspects(series, per_session_limit):
+    """Users whose connections keep growing, or are high for their open app sessions"""
+    suspects = []
+    for user_id, rows in series.items():
+        if user_id in (SERVER_TOTAL, SHARED) or len(rows) < 8:
+            continue
+        quarter = len(rows) // 4
+        early = sorted(r[2] for r in rows[:quarter])
+        late = sorted(r[2] for r in rows[-quarter:])
+        if percentile(late, 50) >= 2 * max(percentile(early, 50), 1) and percentile(late, 50) - percentile(early, 50) >= 3:
+            suspects.append((user_id, f"connections grew from ~{percentile(early, 50)} to ~{percentile(late, 50)}"))
+            continue
+        ratios = sorted(r[2] / max(r[6], 1) for r in rows)
+        if percentile(ratios, 95) > per_session_limit:
+            suspects.append((user_id, f"p95 {percentile(ratios, 95):.1f} connections per app session"))
+    return suspects
+
+
+def report(store, since_minutes, per_session_limit):
+    cutoff = int(time.time() - since_minutes * 60) if since_minutes else 0
+    series = {}
+    for record in store.records():
+        if record[0] >= cutoff:
+            series.setdefault(record[1], []).append(record)
+    if SERVER_TOTAL not in series:
+        print(f"❌ No samples in {store.path}" + (f" for the last {since_minutes} minutes" if since_minutes else ''))
+        return 1
+
+    total = series[SERVER_TOTAL]
+    first, last = (datetime.fromtimestamp(total[i][0]).isoformat(timespec='seconds') for i in (0, -1))
+    print(f"{len(total)} samples, {first} .. {last}\n")
+    print(f"{'user':<24} {'conn p50':>8} {'p95':>5} {'p99':>5} {'max':>5}  {'idle-in-tx p95 s':>16} {'max s':>7}  "
+          f"{'query p95 s':>11}  {'sessions':>8}")
+    print("-" * 104)
+    order = [SERVER_TOTAL] + sorted((u for u in series if u != SERVER_TOTAL),
+                                    key=lambda u: -max(r[2] for r in series[u]))
+    for user_id in order:
+        rows = series[user_id]
+        conns = sorted(r[2] for r in rows)
+        idle_tx = sorted(r[7] / 1000 for r in rows)
+        active = sorted(r[8] / 1000 for r in rows)
+        sessions = max(r[6] for r in rows)
+        print(f"{label(store, user_id):<24} {percentile(conns, 50):>8} {percentile(conns, 95):>5} "
+              f"{percentile(conns, 99):>5} {conns[-1]:>5}  {percentile(idle_tx, 95):>16.1f} {idle_tx[-1]:>7.1f}  "
+              f"{percentile(active, 95):>11.1f}  {sessions:>8}")
+
+    conns = sorted(r[2] for r in total)
+    configured = store.names.get(SERVER_TOTAL, '')
+    print(f"\nServer connections: p99 {percentile(conns, 99)}, peak {conns[-1]} ({configured or 'max_connections unknown'})")
+    sessions = max(r[6] for r in total)
+    if sessions:
+        print(f"Peak {conns[-1]} backends for up to {sessions} app sessions "
+              f"= {conns[-1] / sessions:.1f} per session; size max_connections for that times the seat count")
+
+    suspects = leak_suspects(series, per_session_limit)
+    for user_id, reason in suspects:
+        print(f"  ⚠️  {label(store, user_id)}: {reason}")
+    if not suspects:
+        print("✅ No connection leak suspects")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sample app sessions and PostgreSQL backends per user")
+    parser.add_argument('--interval', type=float, default=5, help="seconds between samples (default: 5)")
+    parser.add_argument('--store', default=DEFAULT_STORE, help="ring-buffer file")
+    parser.add_argument('--capacity', type=int, default=200000, help="records kept when creating the store")
+    parser.add_argument('--server-machine', default=socket.gethostname(),
+                        help="machine_name whose backends connect over loopback (default: this host)")
+    parser.add_argument('--report', action='store_true', help="print percentiles from the store")
+    parser.add_argument('--since', type=float, default=0, help="report only the last N minutes")
+    parser.add_argument('--per-session', type=float, default=10,
+                        help="flag users above this many connections per app session (default: 10)")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    if args.report and not os.path.exists(args.store):
+        print(f"❌ {args.store} not found - run the sampler first")
+        return 1
+    try:
+        store = RingStore(args.store, args.capacity)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    try:
+        if args.report:
+            return report(store, args.since, args.per_session)
+        return run_sampler(store, args.interval, args.server_machine)
+    except psycopg2.Error as e:
+        print(f"❌ {str(e).strip()}")
+        return 1
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+SQLite -> PostgreSQL Transfer
+نقل الجداول من accountant.db إلى graceway_accounting باستخدام COPY
+
+Streams each table out of SQLite in rowid order, converts values to the
+target column types (TEXT dates -> timestamptz/date, REAL -> numeric,
+0/1 -> boolean) and loads every chunk with COPY FROM STDIN (CSV). Progress
+is recorded in sqlite_transfer_progress inside the same transaction as the
+COPY, so an interrupted run resumes from the last committed chunk without
+duplicating rows.
+
+Only columns present in both databases (matched case-insensitively) are
+copied. With --merge, chunks go through a temp staging table and
+INSERT ... ON CONFLICT DO NOTHING, for targets that already hold some rows.
+
+Usage:
+    python sqlite_to_pg.py flightbookings umrahpilgrims
+    python sqlite_to_pg.py --all --chunk-size 20000
+    python sqlite_to_pg.py umrahpilgrims --merge
+    python sqlite_to_pg.py flightbookings --restart     # forget saved progress
+"""
+
+import argparse
+import io
+import re
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from db_pool import SQLITE_PATH, close_pool, connection, get_sqlite_connection
+from schema_resolver import quote_ident
+
+DEFAULT_CHUNK_SIZE = 10000
+
+PROGRESS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS sqlite_transfer_progress (
+        table_name VARCHAR(100) PRIMARY KEY,
+        last_rowid BIGINT NOT NULL DEFAULT 0,
+        rows_copied BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+    )
+"""
+
+TARGET_COLUMNS_QUERY = """
+    SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relname = %s
+      AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+"""
+
+# .NET writes up to 7 fractional digits; PostgreSQL accepts 6
+_FRACTION = re.compile(r'(\.\d{6})\d+')
+
+
+# ============================================
+# Type conversion
+# ============================================
+
+def to_timestamp(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        # Unix seconds
+        return datetime.utcfromtimestamp(value).isoformat() + '+00:00'
+    return _FRACTION.sub(r'\1', str(value).strip().replace('T', ' ', 1))
+
+
+def to_date(value):
+    if value is None or value == '':
+        return None
+    return str(value).strip()[:10]
+
+
+def to_numeric(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, float):
+        # repr() gives the shortest string that round-trips (0.1 -> '0.1')
+        return repr(value)
+    try:
+        return str(Decimal(str(value).strip()))
+    except InvalidOperation:
+        raise ValueError(f"not a number: {value!r}") from None
+
+
+def to_boolean(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return 'true' if value.strip().lower() in ('1', 'true', 't', 'yes') else 'false'
+    return 'true' if value else 'false'
+
+
+def to_integer(value):
+    if value is None or value == '':
+        return None
+    return str(int(value))
+
+
+def to_text(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def converter_for(pg_type):
+    """Pick a value converter for a PostgreSQL column type"""
+    pg_type = pg_type.lower()
+    if pg_type.startswith('timestamp'):
+        return to_timestamp
+    if pg_type == 'date':
+        return to_date
+    if pg_type.startswith(('numeric', 'decimal', 'real', 'double')):
+        return to_numeric
+    if pg_type == 'boolean':
+        return to_boolean
+    if pg_type in ('integer', 'bigint', 'smallint'):
+        return to_integer
+    return to_text
+
+
+def csv_line(values):
+    """
+    One CSV record for COPY: NULL is an unquoted empty field, every other
+    value is quoted so empty strings stay empty strings.
+    """
+    return ','.join(
+        '' if v is None else '"' + v.replace('"', '""') + '"'
+        for v in values
+    ) + '\n'
+
+
+# ============================================
+# Transfer
+# ============================================
+
+def sqlite_tables(sqlite_conn):
+    cur = sqlite_conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+    return [row[0] for row in cur.fetchall()]
+
+
+def plan_columns(sqlite_conn, pg_cur, table):
+    """
+    Match SQLite and PostgreSQL columns case-insensitively.
+    Returns (pg table name, [(sqlite column, pg column, converter)]).
+    """
+    pg_cur.execute("SELECT relname FROM pg_class WHERE lower(relname) = lower(%s) AND relkind = 'r'", (table,))
+    row = pg_cur.fetchone()
+    if not row:
+        raise LookupError(f"table '{table}' not found in PostgreSQL")
+    pg_table = row[0]
+    pg_cur.execute(TARGET_COLUMNS_QUERY, (pg_table,))
+    pg_columns = {name.lower(): (name, col_type) for name, col_type in pg_cur.fetchall()}
+
+    source_columns = [col[1] for col in sqlite_conn.execute(f"PRAGMA table_info({quote_ident(table)})")]
+    plan = []
+    for column in source_columns:
+        target = pg_columns.get(column.lower())
+        if target:
+            plan.append((column, target[0], converter_for(target[1])))
+    if not plan:
+        raise LookupError(f"table '{table}': no matching columns")
+    return pg_table, plan
+
+
+def _load_progress(pg_cur, table):
+    pg_cur.execute("SELECT last_rowid, rows_copied FROM sqlite_transfer_progress WHERE table_name = %s", (table,))
+    return pg_cur.fetchone() or (0, 0)
+
+
+def transfer_table(sqlite_conn, table, chunk_size=DEFAULT_CHUNK_SIZE, merge=False, restart=False):
+    """Copy one table chunk by chunk; each chunk commits together with its progress row"""
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(PROGRESS_TABLE_SQL)
+        if restart:
+            cur.execute("DELETE FROM sqlite_transfer_progress WHERE table_name = %s", (table,))
+        pg_table, plan = plan_columns(sqlite_conn, cur, table)
+        last_rowid, copied = _load_progress(cur, table)
+
+    source_cols = ', '.join(quote_ident(src) for src, _, _ in plan)
+    target_cols = ', '.join(quote_ident(dst) for _, dst, _ in plan)
+    select_sql = (f"SELECT rowid, {source_cols} FROM {quote_ident(table)} "
+                  f"WHERE rowid > ? ORDER BY rowid LIMIT ?")
+    converters = [conv for _, _, conv in plan]
+
+    started = time.perf_counter()
+    while True:
+        rows = sqlite_conn.execute(select_sql, (last_rowid, chunk_size)).fetchall()
+        if not rows:
+            break
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(csv_line([conv(v) for conv, v in zip(converters, row[1:])]))
+        buffer.seek(0)
+
+        with connection() as conn:
+            cur = conn.cursor()
+            if merge:
+                # only the copied columns: LIKE would carry NOT NULL without the defaults
+                # that fill the columns SQLite does not have
+                cur.execute(f"CREATE TEMP TABLE transfer_staging ON COMMIT DROP AS "
+                            f"SELECT {target_cols} FROM {quote_ident(pg_table)} WITH NO DATA")
+                cur.copy_expert(f"COPY transfer_staging ({target_cols}) FROM STDIN WITH (FORMAT csv)", buffer)
+                cur.execute(f"INSERT INTO {quote_ident(pg_table)} ({target_cols}) "
+                            f"SELECT {target_cols} FROM transfer_staging ON CONFLICT DO NOTHING")
+                inserted = cur.rowcount
+            else:
+                cur.copy_expert(f"COPY {quote_ident(pg_table)} ({target_cols}) FROM STDIN WITH (FORMAT csv)", buffer)
+                inserted = len(rows)
+            last_rowid = rows[-1][0]
+            copied += inserted
+            cur.execute("""
+                INSERT INTO sqlite_transfer_progress (table_name, last_rowid, rows_copied, updated_at)
+                VALUES (%s, %s, %s, NOW())
+                ON CONFLICT (table_name) DO UPDATE
+                SET last_rowid = EXCLUDED.last_rowid, rows_copied = EXCLUDED.rows_copied, updated_at = NOW()
+            """, (table, last_rowid, copied))
+
+        rate = copied / max(time.perf_counter() - started, 1e-6)
+        print(f"  {table}: {copied} rows (rowid {last_rowid}, {rate:.0f} rows/s)", end='\r')
+
+    _reset_sequences(pg_table, [dst for _, dst, _ in plan])
+    print()
+    return copied
+
+
+def _reset_sequences(pg_table, columns):
+    """Move serial/identity sequences past the copied ids"""
+    with connection() as conn:
+        cur = conn.cursor()
+        for column in columns:
+            cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (quote_ident(pg_table), column))
+            sequence = cur.fetchone()[0]
+            if sequence:
+                cur.execute(f"SELECT setval(%s, COALESCE((SELECT MAX({quote_ident(column)}) "
+                            f"FROM {quote_ident(pg_table)}), 0) + 1, false)", (sequence,))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-copy SQLite tables into PostgreSQL with COPY")
+    parser.add_argument('tables', nargs='*', help="tables to transfer")
+    parser.add_argument('--all', action='store_true', help="transfer every SQLite table")
+    parser.add_argument('--sqlite', default=SQLITE_PATH, help=f"SQLite file (default: {SQLITE_PATH})")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows per COPY chunk")
+    parser.add_argument('--merge', action='store_true', help="skip rows that already exist (ON CONFLICT DO NOTHING)")
+    parser.add_argument('--restart', action='store_true', help="ignore saved progress for these tables")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    sqlite_conn = get_sqlite_connection(args.sqlite)
+    tables = sqlite_tables(sqlite_conn) if args.all else args.tables
+    if not tables:
+        parser.error("no tables given (use --all for every table)")
+
+    print("=" * 60)
+    print(f"SQLite -> PostgreSQL: {args.sqlite}")
+    print("=" * 60)
+    failed = 0
+    try:
+        for table in tables:
+            started = time.perf_counter()
+            try:
+                copied = transfer_table(sqlite_conn, table, args.chunk_size, args.merge, args.restart)
+                print(f"✅ {table}: {copied} rows in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                failed += 1
+                print(f"\n❌ {table}: {e}")
+    finally:
+        sqlite_conn.close()
+        close_pool()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Table Inventory
+عدد الصفوف وحجم كل جدول في قاعدة البيانات
+
+Replaces the sequential SELECT COUNT(*) loop in list_tables_pg.py. By default
+row counts are the planner's estimates (pg_class.reltuples, falling back to
+pg_stat_user_tables.n_live_tup for tables never analyzed), read together
+with table, index and total sizes in a single catalog query. --exact adds
+real COUNT(*) values, run in parallel over the db_pool connections.
+
+Usage:
+    python table_inventory.py
+    python table_inventory.py --exact --workers 6
+    python table_inventory.py --json
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import POOL_MAX_SIZE, close_pool, connection
+from schema_resolver import quote_ident
+
+INVENTORY_QUERY = """
+    SELECT c.relname AS table_name,
+           CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint
+                ELSE COALESCE(s.n_live_tup, 0) END AS estimated_rows,
+           COALESCE(s.n_dead_tup, 0) AS dead_rows,
+           pg_relation_size(c.oid) AS table_bytes,
+           pg_indexes_size(c.oid) AS index_bytes,
+           pg_total_relation_size(c.oid) AS total_bytes,
+           GREATEST(s.last_analyze, s.last_autoanalyze) AS last_analyzed
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    ORDER BY pg_total_relation_size(c.oid) DESC
+"""
+
+
+def format_bytes(size):
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def fetch_inventory(conn):
+    """Estimated rows and sizes for every public table in one query"""
+    cur = conn.cursor()
+    cur.execute(INVENTORY_QUERY)
+    columns = [d[0] for d in cur.description]
+    tables = [dict(zip(columns, row)) for row in cur.fetchall()]
+    cur.close()
+    return tables
+
+
+def _exact_count(table_name):
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'SELECT COUNT(*) FROM {quote_ident(table_name)}')
+        return cur.fetchone()[0]
+
+
+def exact_counts(table_names, workers=4):
+    """COUNT(*) every table, several at a time on pooled connections"""
+    workers = max(1, min(workers, POOL_MAX_SIZE))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(table_names, executor.map(_exact_count, table_names)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Row counts and sizes for all tables")
+    parser.add_argument('--exact', action='store_true', help="also run exact COUNT(*) in parallel")
+    parser.add_argument('--workers', type=int, default=4, help="parallel exact counts (default: 4)")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    started = time.perf_counter()
+    try:
+        with connection() as conn:
+            tables = fetch_inventory(conn)
+        if args.exact:
+            counts = exact_counts([t['table_name'] for t in tables], args.workers)
+            for table in tables:
+                table['exact_rows'] = counts[table['table_name']]
+    finally:
+        close_pool()
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(tables, ensure_ascii=False, indent=2, default=str))
+        return 0
+
+    print("=" * 100)
+    print("TABLE INVENTORY" + (" (exact counts)" if args.exact else " (estimated counts)"))
+    print("=" * 100)
+    header = f"{'Table':<35} {'Rows':>12} "
+    if args.exact:
+        header += f"{'Exact':>12} "
+    header += f"{'Dead':>10} {'Table':>10} {'Indexes':>10} {'Total':>10}"
+    print(header)
+    print("-" * 100)
+    for t in tables:
+        line = f"{t['table_name']:<35} {t['estimated_rows']:>12} "
+        if args.exact:
+            line += f"{t['exact_rows']:>12} "
+        line += (f"{t['dead_rows']:>10} {format_bytes(t['table_bytes']):>10} "
+                 f"{format_bytes(t['index_bytes']):>10} {format_bytes(t['total_bytes']):>10}")
+        print(line)
+    print("-" * 100)
+    total = sum(t['total_bytes'] for t in tables)
+    print(f"{len(tables)} tables, {format_bytes(total)} total, {elapsed * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
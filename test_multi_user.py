@@ -8,18 +8,8 @@ import threading
 import time
 from datetime import datetime
 
-# Database connection settings
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'graceway_accounting',
-    'user': 'postgres',
-    'password': '123456'
-}
-
-def get_connection():
-    """Create a new database connection"""
-    return psycopg2.connect(**DB_CONFIG)
+# Database connection settings live in db_pool.py
+from db_pool import get_connection
 
 def test_concurrent_updates():
     """Test concurrent updates to the same cashbox"""
@@ -0,0 +1,446 @@
+"""
+Cash Ledger Verifier
+فحص تسلسل أرصدة الخزنة لكل الحركات (BalanceBefore / BalanceAfter)
+
+Streams cashtransactions through a server-side cursor ordered by
+(cashboxid, transactiondate, transactionid) and checks each chunk with
+NumPy column operations:
+
+  * chain      - BalanceBefore must equal the previous row's BalanceAfter
+  * arithmetic - BalanceAfter must equal BalanceBefore + Amount (income)
+                 or BalanceBefore - Amount - InstaPayCommission (expense)
+  * type       - TransactionType must be Income (1) or Expense (2)
+
+Money is compared as integer piastres (cents) computed in SQL, so the
+comparison is exact and memory stays bounded by the chunk size no matter
+how many rows the table holds.
+
+With --incremental a per-cashbox checkpoint (last verified transaction,
+its BalanceAfter, and per-month row checksums) is kept in a JSON file.
+Later runs only stream rows past the checkpoint. The month checksums of
+the verified history are recomputed server-side once per run, so a
+retroactive edit (e.g. fix_transaction_1501.py) changes a month's checksum
+and that month onward is verified again; the new checkpoint adds the
+checksums of the newly verified rows to them instead of scanning again.
+
+Usage:
+    python verify_cash_ledger.py
+    python verify_cash_ledger.py --cashbox 1 --cashbox 3 --output breaks.csv
+    python verify_cash_ledger.py --incremental
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from db_pool import close_pool, connection
+
+# TransactionType (Domain/Entities/CashTransaction.cs)
+INCOME = 1
+EXPENSE = 2
+# PaymentMethod.InstaPay
+INSTAPAY = 5
+
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ledger_checkpoint.json')
+CHECKPOINT_VERSION = 1
+
+LEDGER_QUERY = """
+    SELECT transactionid,
+           cashboxid,
+           COALESCE(transactiontype, 0),
+           COALESCE(paymentmethod, 0),
+           ROUND(COALESCE(amount, 0) * 100)::bigint,
+           ROUND(COALESCE(instapaycommission, 0) * 100)::bigint,
+           ROUND(COALESCE(balancebefore, 0) * 100)::bigint,
+           ROUND(COALESCE(balanceafter, 0) * 100)::bigint
+    FROM cashtransactions
+    WHERE isdeleted = false {filter}
+    ORDER BY cashboxid, transactiondate, transactionid
+"""
+
+# column positions in a fetched chunk
+ID, BOX, TYPE, METHOD, AMOUNT, COMMISSION, BEFORE, AFTER = range(8)
+
+# Per-month checksum of the verified rows: count + sum of a 60-bit slice of
+# md5(row).  Summing keeps it a single cheap aggregate with no ordering or
+# string building on the server, any edited, inserted or deleted row
+# changes the month's value, and the checksums of two row ranges add up.
+# Rows are taken from after (from_date, from_id) - from the start when NULL -
+# up to (last_date, last_id).
+BUCKET_QUERY = """
+    SELECT ct.cashboxid,
+           TO_CHAR(ct.transactiondate, 'YYYY-MM') AS bucket,
+           COUNT(*) AS rows,
+           SUM(('x' || SUBSTR(MD5(CONCAT_WS('|',
+               ct.transactionid, ct.transactiontype, ct.paymentmethod, ct.amount,
+               ct.instapaycommission, ct.balancebefore, ct.balanceafter,
+               ct.transactiondate)), 1, 15))::bit(60)::bigint)::text AS checksum
+    FROM cashtransactions ct
+    JOIN UNNEST(%s::int[], %s::timestamptz[], %s::int[], %s::timestamptz[], %s::int[])
+         AS cp(cashboxid, from_date, from_id, last_date, last_id)
+      ON cp.cashboxid = ct.cashboxid
+    WHERE ct.isdeleted = false
+      AND (cp.from_date IS NULL OR (ct.transactiondate, ct.transactionid) > (cp.from_date, cp.from_id))
+      AND (ct.transactiondate, ct.transactionid) <= (cp.last_date, cp.last_id)
+    GROUP BY ct.cashboxid, bucket
+"""
+
+BREAK_FIELDS = ['kind', 'cashbox_id', 'transaction_id', 'previous_transaction_id', 'expected', 'actual']
+
+
+def to_money(cents):
+    """Convert integer piastres back to a 2-decimal Decimal"""
+    return Decimal(int(cents)).scaleb(-2)
+
+
+class LedgerVerifier:
+    """
+    Checks the balance chain chunk by chunk.
+    `carry` holds, per cashbox, the (transactionid, balanceafter) of the last
+    row seen so the chain continues across chunk boundaries.
+    """
+
+    def __init__(self, tolerance=0):
+        self.tolerance = tolerance
+        self.carry = {}
+        self.rows = 0
+        self.breaks = 0
+        self.rows_per_cashbox = {}
+        self.breaks_per_cashbox = {}
+        # cashbox -> months whose checksum changed since the checkpoint
+        self.retroactive_changes = {}
+
+    def check_chunk(self, chunk):
+        """Verify one chunk (int64 array, one row per transaction) and return its breaks"""
+        ids = chunk[:, ID]
+        boxes = chunk[:, BOX]
+        types = chunk[:, TYPE]
+        before = chunk[:, BEFORE]
+        after = chunk[:, AFTER]
+        n = len(chunk)
+
+        # المصروف بإنستا باي يخصم المبلغ + العمولة
+        commission = np.where(chunk[:, METHOD] == INSTAPAY, chunk[:, COMMISSION], 0)
+        delta = np.where(types == INCOME, chunk[:, AMOUNT], -(chunk[:, AMOUNT] + commission))
+        expected_after = before + delta
+        arithmetic_bad = (np.abs(expected_after - after) > self.tolerance) & np.isin(types, (INCOME, EXPENSE))
+        type_bad = ~np.isin(types, (INCOME, EXPENSE))
+
+        prev_after = np.empty(n, dtype=np.int64)
+        prev_id = np.empty(n, dtype=np.int64)
+        has_prev = np.empty(n, dtype=bool)
+        prev_after[1:] = after[:-1]
+        prev_id[1:] = ids[:-1]
+        has_prev[1:] = boxes[1:] == boxes[:-1]
+
+        carried = self.carry.get(int(boxes[0]))
+        has_prev[0] = carried is not None
+        prev_id[0], prev_after[0] = carried if carried is not None else (0, 0)
+
+        chain_bad = has_prev & (np.abs(before - prev_after) > self.tolerance)
+
+        # آخر صف لكل خزنة في هذا الجزء
+        last_rows = np.flatnonzero(np.append(boxes[1:] != boxes[:-1], True))
+        for i in last_rows:
+            self.carry[int(boxes[i])] = (int(ids[i]), int(after[i]))
+        box_values, box_counts = np.unique(boxes, return_counts=True)
+        for box, count in zip(box_values.tolist(), box_counts.tolist()):
+            self.rows_per_cashbox[box] = self.rows_per_cashbox.get(box, 0) + count
+
+        found = []
+        for i in np.flatnonzero(chain_bad):
+            found.append({
+                'kind': 'chain',
+                'cashbox_id': int(boxes[i]),
+                'transaction_id': int(ids[i]),
+                'previous_transaction_id': int(prev_id[i]),
+                'expected': to_money(prev_after[i]),
+                'actual': to_money(before[i]),
+            })
+        for i in np.flatnonzero(arithmetic_bad):
+            found.append({
+                'kind': 'arithmetic',
+                'cashbox_id': int(boxes[i]),
+                'transaction_id': int(ids[i]),
+                'previous_transaction_id': None,
+                'expected': to_money(expected_after[i]),
+                'actual': to_money(after[i]),
+            })
+        for i in np.flatnonzero(type_bad):
+            found.append({
+                'kind': 'type',
+                'cashbox_id': int(boxes[i]),
+                'transaction_id': int(ids[i]),
+                'previous_transaction_id': None,
+                'expected': f"{INCOME} or {EXPENSE}",
+                'actual': int(types[i]),
+            })
+
+        self.rows += n
+        self.breaks += len(found)
+        for brk in found:
+            box = brk['cashbox_id']
+            self.breaks_per_cashbox[box] = self.breaks_per_cashbox.get(box, 0) + 1
+        found.sort(key=lambda b: (b['cashbox_id'], b['transaction_id']))
+        return found
+
+
+def iter_chunks(conn, cashbox_ids=None, chunk_size=DEFAULT_CHUNK_SIZE, after=None):
+    """
+    Stream the ledger through a named (server-side) cursor as int64 arrays.
+    `after` is an exclusive (transactiondate, transactionid) start position.
+    """
+    params = ()
+    row_filter = ''
+    if cashbox_ids:
+        row_filter = 'AND cashboxid = ANY(%s)'
+        params = (list(cashbox_ids),)
+    if after is not None:
+        row_filter += ' AND (transactiondate, transactionid) > (%s::timestamptz, %s)'
+        params += tuple(after)
+
+    cur = conn.cursor(name='ledger_verifier')
+    cur.itersize = chunk_size
+    try:
+        cur.execute(LEDGER_QUERY.format(filter=row_filter), params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield np.array(rows, dtype=np.int64)
+    finally:
+        cur.close()
+
+
+def verify_ledger(conn, cashbox_ids=None, chunk_size=DEFAULT_CHUNK_SIZE, tolerance=0, verifier=None):
+    """Yield every break in the balance chain; statistics accumulate on `verifier`"""
+    verifier = verifier or LedgerVerifier(tolerance)
+    for chunk in iter_chunks(conn, cashbox_ids, chunk_size):
+        yield from verifier.check_chunk(chunk)
+
+
+# ============================================
+# Incremental verification (checkpoints)
+# ============================================
+
+def load_checkpoints(path=DEFAULT_CHECKPOINT_PATH):
+    """Load the checkpoint file; a missing or outdated file means a full run"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != CHECKPOINT_VERSION:
+        return {}
+    return {int(box): cp for box, cp in data.get('cashboxes', {}).items()}
+
+
+def save_checkpoints(checkpoints, path=DEFAULT_CHECKPOINT_PATH):
+    """Write the checkpoint file atomically (temp file + rename)"""
+    data = {
+        'version': CHECKPOINT_VERSION,
+        'cashboxes': {str(box): cp for box, cp in sorted(checkpoints.items())},
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def fetch_buckets(conn, positions, since=None):
+    """
+    Server-side month checksums for rows up to each cashbox's (date, id)
+    position, counting only rows after its `since` position when it has one.
+    """
+    if not positions:
+        return {}
+    boxes = sorted(positions)
+    since = since or {}
+    cur = conn.cursor()
+    cur.execute(BUCKET_QUERY, (
+        boxes,
+        [since[box][0] if box in since else None for box in boxes],
+        [since[box][1] if box in since else None for box in boxes],
+        [positions[box][0] for box in boxes],
+        [positions[box][1] for box in boxes],
+    ))
+    buckets = {box: {} for box in boxes}
+    for box, bucket, rows, checksum in cur.fetchall():
+        buckets[box][bucket] = {'rows': rows, 'checksum': checksum}
+    cur.close()
+    return buckets
+
+
+def merge_buckets(base, delta):
+    """Month checksums of two disjoint row ranges combined"""
+    merged = {bucket: dict(value) for bucket, value in base.items()}
+    for bucket, value in delta.items():
+        if bucket in merged:
+            merged[bucket] = {'rows': merged[bucket]['rows'] + value['rows'],
+                              'checksum': str(int(merged[bucket]['checksum']) + int(value['checksum']))}
+        else:
+            merged[bucket] = dict(value)
+    return merged
+
+
+def _row_before(conn, cashbox_id, bucket):
+    """The last (transactionid, transactiondate, balanceafter) before a month bucket starts"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT transactionid, transactiondate, ROUND(balanceafter * 100)::bigint
+        FROM cashtransactions
+        WHERE cashboxid = %s AND isdeleted = false
+          AND transactiondate < %s::timestamptz
+        ORDER BY transactiondate DESC, transactionid DESC
+        LIMIT 1
+    """, (cashbox_id, bucket + '-01'))
+    row = cur.fetchone()
+    cur.close()
+    return row
+
+
+def _ledger_cashboxes(conn, cashbox_ids=None):
+    cur = conn.cursor()
+    if cashbox_ids:
+        cur.execute("SELECT cashboxid FROM cashboxes WHERE cashboxid = ANY(%s) ORDER BY cashboxid",
+                    (list(cashbox_ids),))
+    else:
+        cur.execute("SELECT cashboxid FROM cashboxes ORDER BY cashboxid")
+    boxes = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return boxes
+
+
+def verify_incremental(conn, checkpoints, cashbox_ids=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                       tolerance=0, verifier=None):
+    """
+    Yield breaks for rows that are new or sit in a month whose checksum
+    changed since the last run. `checkpoints` is updated in place for every
+    cashbox that verified cleanly; cashboxes with breaks keep their old
+    checkpoint so the break is reported again next run.
+    """
+    verifier = verifier or LedgerVerifier(tolerance)
+    boxes = _ledger_cashboxes(conn, cashbox_ids)
+
+    known = {box: (checkpoints[box]['last_date'], checkpoints[box]['last_id'])
+             for box in boxes if box in checkpoints}
+    current = fetch_buckets(conn, known)
+
+    verified = {}
+    for box in boxes:
+        cp = checkpoints.get(box)
+        start = None
+        if cp:
+            stored = cp.get('buckets', {})
+            changed = sorted(b for b in set(stored) | set(current[box])
+                             if stored.get(b) != current[box].get(b))
+            if changed:
+                verifier.retroactive_changes[box] = changed
+                previous = _row_before(conn, box, changed[0])
+                if previous:
+                    start = (previous[1], previous[0])
+                    verifier.carry[box] = (previous[0], previous[2])
+            else:
+                start = (cp['last_date'], cp['last_id'])
+                verifier.carry[box] = (cp['last_id'], cp['balance_after'])
+
+        if start is None:
+            verifier.carry.pop(box, None)
+        for chunk in iter_chunks(conn, [box], chunk_size, after=start):
+            yield from verifier.check_chunk(chunk)
+        if box in verifier.carry:
+            verified[box] = verifier.carry[box]
+
+    # تحديث نقاط الحفظ للخزن السليمة فقط
+    clean = {box: pos for box, pos in verified.items() if not verifier.breaks_per_cashbox.get(box)}
+    if not clean:
+        return
+    cur = conn.cursor()
+    cur.execute("SELECT transactionid, transactiondate FROM cashtransactions WHERE transactionid = ANY(%s)",
+                ([last_id for last_id, _ in clean.values()],))
+    dates = {tx_id: tx_date.isoformat() for tx_id, tx_date in cur.fetchall()}
+    cur.close()
+    # a last row hard-deleted since it was verified: keep that cashbox's old checkpoint
+    clean = {box: pos for box, pos in clean.items() if pos[0] in dates}
+    if not clean:
+        return
+    positions = {box: (dates[last_id], last_id) for box, (last_id, _) in clean.items()}
+    # the start-of-run checksums already cover everything up to the old
+    # checkpoint; only the rows verified past it are aggregated again
+    delta = fetch_buckets(conn, positions, since={box: known[box] for box in clean if box in known})
+    for box, (last_id, balance_after) in clean.items():
+        new_buckets = merge_buckets(current.get(box, {}), delta[box])
+        checkpoints[box] = {
+            'last_id': last_id,
+            'last_date': positions[box][0],
+            'balance_after': balance_after,
+            'rows': sum(b['rows'] for b in new_buckets.values()),
+            'buckets': new_buckets,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify the CashTransactions balance chain")
+    parser.add_argument('--cashbox', type=int, action='append', help="cashbox id (repeatable, default: all)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows fetched per round trip")
+    parser.add_argument('--tolerance', type=int, default=0, help="allowed difference in piastres (default: 0)")
+    parser.add_argument('--output', help="write every break to this CSV file")
+    parser.add_argument('--incremental', action='store_true', help="verify only rows past the saved checkpoints")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH, help="checkpoint file for --incremental")
+    args = parser.parse_args(argv)
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    print("=" * 80)
+    print("فحص تسلسل أرصدة الخزنة")
+    print("=" * 80)
+
+    started = time.perf_counter()
+    verifier = LedgerVerifier(args.tolerance)
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else None
+    try:
+        writer = csv.DictWriter(out, fieldnames=BREAK_FIELDS) if out else None
+        if writer:
+            writer.writeheader()
+        checkpoints = load_checkpoints(args.checkpoint) if args.incremental else None
+        with connection() as conn:
+            if args.incremental:
+                breaks = verify_incremental(conn, checkpoints, args.cashbox, args.chunk_size, verifier=verifier)
+            else:
+                breaks = verify_ledger(conn, args.cashbox, args.chunk_size, verifier=verifier)
+            for brk in breaks:
+                if writer:
+                    writer.writerow(brk)
+                else:
+                    print(f"  ❌ [{brk['kind']:<10}] cashbox {brk['cashbox_id']:<5} "
+                          f"transaction {brk['transaction_id']:<8} expected {brk['expected']} got {brk['actual']}")
+        if args.incremental:
+            save_checkpoints(checkpoints, args.checkpoint)
+    finally:
+        if out:
+            out.close()
+        close_pool()
+
+    elapsed = time.perf_counter() - started
+    print("-" * 80)
+    for box, months in sorted(verifier.retroactive_changes.items()):
+        print(f"  ⚠️  خزنة {box}: تعديل في بيانات سبق فحصها ({', '.join(months)})")
+    for box, count in sorted(verifier.rows_per_cashbox.items()):
+        print(f"  خزنة {box:<6} {count:>10} حركة")
+    print(f"\nRows: {verifier.rows}  Breaks: {verifier.breaks}  Time: {elapsed:.2f}s")
+    if verifier.breaks:
+        print("❌ Found breaks in the balance chain!")
+        return 1
+    print("✅ All transactions are consistent!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())